@@ -0,0 +1,67 @@
+"""
+Compares per-post compression codecs for post contents on synthetic review and
+comment text: stored size and compression/decompression throughput.
+
+Usage: python -m benchmarks.compression_benchmark [posts]
+"""
+import random
+import sys
+import time
+
+from util.compression import TextCodec, train_dictionary, zstandard
+
+OPENINGS = ['I ordered', 'We bought', 'Just got', 'Been using', 'My wife ordered', 'Tried', 'Honestly,',
+            'Update:', 'Edit: ', 'Not sure why people complain about']
+SUBJECTS = ['the new phone', 'their customer service', 'this laptop', 'the delivery', 'the app', 'my refund',
+            'the subscription', 'the headphones', 'the replacement', 'the support chat']
+OPINIONS = ['and it arrived two days late', 'and it works perfectly', 'but the battery dies by noon',
+            'and I would recommend them to anyone', 'and it broke after a week', 'but nobody answered my emails',
+            'and the quality is great for the price', 'but the update made everything slower',
+            'and they refunded me without questions', 'and I will never buy from them again']
+ENDINGS = ['5 stars.', '1 star, avoid.', 'Thanks for nothing.', 'Very happy!', 'Would buy again.',
+           'lol', 'Just my two cents.', 'YMMV.', '', 'Anyone else having this issue?']
+
+
+def synthetic_post(rng):
+    sentences = [f'{rng.choice(OPENINGS)} {rng.choice(SUBJECTS)} {rng.choice(OPINIONS)}.'
+                 for _ in range(rng.choice([1, 1, 2, 3, 5, 8]))]
+    sentences.append(rng.choice(ENDINGS))
+    if rng.random() < 0.2:
+        sentences.append(f'Order #{rng.randrange(10 ** 8)} on {rng.randint(1, 28)}/{rng.randint(1, 12)}.')
+
+    return ' '.join(sentences).strip()
+
+
+def measure(name, codec, texts):
+    raw = sum(len(text.encode('utf8')) for text in texts)
+
+    start = time.perf_counter()
+    compressed = [codec.compress(text) for text in texts]
+    compress_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for value in compressed:
+        codec.decompress(value)
+    decompress_time = time.perf_counter() - start
+
+    stored = sum(len(value) for value in compressed)
+    print(f'{name:18s} {stored / raw:6.1%} of raw size, compress {raw / compress_time / 1e6:7.1f} MB/s, '
+          f'decompress {raw / decompress_time / 1e6:7.1f} MB/s')
+
+
+if __name__ == '__main__':
+    posts = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    rng = random.Random(0)
+    texts = [synthetic_post(rng) for _ in range(posts)]
+    print(f'{posts} posts, {sum(map(len, texts)) / posts:.0f} characters on average')
+
+    measure('zlib level 1', TextCodec('zlib', level=1), texts)
+    measure('zlib level 6', TextCodec('zlib', level=6), texts)
+
+    if zstandard is None:
+        print('zstandard is not installed, skipping zstd')
+    else:
+        measure('zstd level 3', TextCodec('zstd', level=3), texts)
+        # The dictionary is trained on different posts than the ones measured
+        dictionary = train_dictionary([synthetic_post(rng) for _ in range(20000)])
+        measure('zstd + dictionary', TextCodec('zstd', level=3, dictionary=dictionary), texts)
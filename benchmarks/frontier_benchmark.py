@@ -0,0 +1,69 @@
+"""
+Compares memory use and operation speed of the crawl frontier's FrontierQueue with
+the OrderedSet-backed queue it replaced, and times an SQLite checkpoint round trip.
+
+Usage: python -m benchmarks.frontier_benchmark [urls] [synonyms]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from util.frontier import CrawlFrontier, FrontierQueue
+from util.orderedset import OrderedSet
+
+
+def measure(name, factory, put, get, urls):
+    tracemalloc.start()
+    queue = factory()
+
+    start = time.perf_counter()
+    for url in urls:
+        put(queue, url)
+    put_time = time.perf_counter() - start
+
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in urls:
+        get(queue)
+    get_time = time.perf_counter() - start
+
+    # The URL strings themselves are allocated before tracing starts, so only the structure is measured
+    print(f'{name:14s} {memory / len(urls):6.1f} bytes/URL, '
+          f'put {len(urls) / put_time / 1e6:5.2f} M/s, get {len(urls) / get_time / 1e6:5.2f} M/s')
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    synonyms = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    urls = [f'https://www.trustpilot.com/review/www.company{i % synonyms}.com?page={i // synonyms}'
+            for i in range(count)]
+
+    measure('OrderedSet', OrderedSet, OrderedSet.add, lambda queue: queue.pop(last=False), urls)
+    measure('FrontierQueue', FrontierQueue, FrontierQueue.put, FrontierQueue.get, urls)
+
+    frontier = CrawlFrontier()
+    for i in range(synonyms):
+        frontier.add_synonym(f'company{i}', priority=1 + i % 3)
+    for i, url in enumerate(urls):
+        frontier.put(f'company{i % synonyms}', url)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'frontier.sqlite')
+
+        start = time.perf_counter()
+        frontier.save(path)
+        save_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        restored = CrawlFrontier.load(path)
+        load_time = time.perf_counter() - start
+
+        size = os.path.getsize(path)
+
+    restored_urls = sum(len(queue) for queue in restored.queues.values())
+    print(f'checkpoint of {restored_urls} URLs: save {save_time:.2f}s, load {load_time:.2f}s, '
+          f'{size / 1e6:.0f} MB on disk')
@@ -0,0 +1,76 @@
+"""
+Measures near-duplicate collapsing on a synthetic duplicate-heavy stream: bot and
+copy-pasta templates reposted with small edits, mixed with unique posts.
+
+Usage: python -m benchmarks.near_duplicate_benchmark [posts] [duplicate_ratio] [max_distance]
+"""
+import random
+import sys
+import time
+
+from util.simhash import SimHashIndex, simhash
+
+WORDS = ['the', 'a', 'phone', 'battery', 'is', 'great', 'terrible', 'screen', 'really', 'support', 'price', 'love',
+         'hate', 'store', 'delivery', 'broke', 'after', 'two', 'days', 'recommend', 'never', 'again', 'buy', 'this',
+         'company', 'service', 'quality', 'cheap', 'fast', 'slow', 'refund', 'order', 'app', 'update', 'crash']
+
+
+def random_text(rng, length):
+    return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+
+def perturb(rng, text):
+    """ Copy-pasta edits: change the case or punctuation of a word, or append a short tail. """
+    words = text.split()
+    edit = rng.random()
+    if edit < 0.3:
+        index = rng.randrange(len(words))
+        words[index] = words[index].upper()
+    elif edit < 0.6:
+        words[-1] += rng.choice(['!', '!!', '.', ' :)'])
+    elif edit < 0.8:
+        words.append(rng.choice(WORDS))
+
+    return ' '.join(words)
+
+
+def synthetic_stream(posts, duplicate_ratio, templates=200, seed=0):
+    """ Yields (cluster, text) pairs, unique posts get a cluster of their own. """
+    rng = random.Random(seed)
+    bases = [random_text(rng, rng.randint(25, 80)) for _ in range(templates)]
+
+    for i in range(posts):
+        if rng.random() < duplicate_ratio:
+            template = rng.randrange(templates)
+            yield template, perturb(rng, bases[template])
+        else:
+            yield templates + i, random_text(rng, rng.randint(25, 80))
+
+
+if __name__ == '__main__':
+    posts = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    duplicate_ratio = float(sys.argv[2]) if len(sys.argv) > 2 else 0.6
+    max_distance = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    stream = list(synthetic_stream(posts, duplicate_ratio))
+    index = SimHashIndex(max_distance=max_distance)
+    representatives = {}  # post number --> cluster
+    collapsed = false_merges = 0
+
+    start = time.perf_counter()
+    for number, (cluster, text) in enumerate(stream):
+        fingerprint = simhash(text)
+        representative = index.find(fingerprint)
+
+        if representative is None:
+            index.add(fingerprint, number)
+            representatives[number] = cluster
+        else:
+            collapsed += 1
+            false_merges += representatives[representative] != cluster
+    elapsed = time.perf_counter() - start
+
+    clusters = len({cluster for cluster, _ in stream})
+    print(f'{posts} posts, {clusters} true clusters, {len(representatives)} representatives')
+    print(f'SA/KWE workload reduced by {collapsed / posts:.1%} ({false_merges} false merges)')
+    print(f'{posts / elapsed:.0f} posts/s ({elapsed / posts * 1e6:.1f} us/post)')
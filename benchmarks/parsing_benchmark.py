@@ -0,0 +1,79 @@
+"""
+Measures Reddit parsing throughput on a synthetic firehose, in-thread and with
+a ParsingPool of an increasing number of workers.
+
+Usage: python -m benchmarks.parsing_benchmark [entries] [batch_size]
+"""
+import os
+import random
+import sys
+import time
+from threading import Event
+
+from scrapers.parsing import ParsingPool, parse_reddit_batch
+
+WORDS = ['the', 'a', 'phone', 'battery', 'is', 'great', 'terrible', 'screen', 'really', 'support', 'price', 'love',
+         'hate', 'store', 'delivery', 'broke', 'after', 'two', 'days', 'recommend']
+SYNONYMS = {f'brand{i}': i for i in range(500)}
+
+
+def synthetic_firehose(entries, seed=0):
+    rng = random.Random(seed)
+    synonyms = sorted(SYNONYMS)
+
+    for i in range(entries):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(20, 120))]
+        if rng.random() < 0.2:
+            words[rng.randrange(len(words))] = rng.choice(synonyms)
+
+        body = '<div class="md"><p>' + ' '.join(words) + '</p><p><a href="https://example.com">link</a></p></div>'
+        yield {'id': f't1_{i:x}', 'created_utc': 1548201600 + i, 'subreddit': 'all', 'author': f'user{i % 1000}',
+               'body': body}
+
+
+def run_in_thread(raws, batch_size):
+    matched = 0
+    for start in range(0, len(raws), batch_size):
+        matched += len(parse_reddit_batch(raws[start:start + batch_size], SYNONYMS))
+
+    return matched
+
+
+def run_pooled(raws, batch_size, workers):
+    pool = ParsingPool(workers=workers, batch_size=batch_size)
+    results = []
+    batches = range(0, len(raws), batch_size)
+    done = Event()
+
+    def collect(records):
+        results.append(len(records))
+        if len(results) == len(batches):
+            done.set()
+
+    for start in batches:
+        pool.submit_reddit_batch(raws[start:start + batch_size], SYNONYMS, collect)
+
+    done.wait()
+    pool.shutdown()
+
+    return sum(results)
+
+
+if __name__ == '__main__':
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    raws = list(synthetic_firehose(entries))
+
+    start = time.perf_counter()
+    matched = run_in_thread(raws, batch_size)
+    baseline = time.perf_counter() - start
+    print(f'in-thread: {entries / baseline:10.0f} entries/s ({matched} matched)')
+
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        start = time.perf_counter()
+        matched = run_pooled(raws, batch_size, workers)
+        elapsed = time.perf_counter() - start
+        print(f'{workers:3d} workers: {entries / elapsed:10.0f} entries/s ({matched} matched, '
+              f'{baseline / elapsed:.2f}x)')
+        workers *= 2
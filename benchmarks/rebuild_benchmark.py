@@ -0,0 +1,56 @@
+"""
+Times the offline snapshot rebuild on a synthetic year of scored posts: the vectorized
+bucketing of all synonym-hours against computing the same statistics one bucket at a
+time, the way Scheduler.create_snapshot does.
+
+Usage: python -m benchmarks.rebuild_benchmark [posts] [synonyms]
+"""
+import datetime
+import random
+import sys
+import time
+
+from snapshots.categories import SENTIMENT_CATEGORIES
+from snapshots.rebuild import bucket_statistics, extract_arrays
+
+YEAR = 365 * 24 * 3600
+
+
+def synthetic_rows(rng, posts, synonyms, start):
+    for i in range(posts):
+        yield (rng.randrange(synonyms), start + datetime.timedelta(seconds=rng.randrange(YEAR)), rng.random(),
+               f'{rng.getrandbits(128):032x}', rng.random() > 0.1)
+
+
+def per_bucket(rows, start):
+    buckets = {}
+    for synonym_id, date, sentiment, _, _ in rows:
+        buckets.setdefault((synonym_id, int((date - start).total_seconds()) // 3600), []).append(sentiment)
+
+    for sentiments in buckets.values():
+        mean = sum(sentiments) / len(sentiments)
+        counts = {sc['category']: sum(1 for s in sentiments if sc['upper_limit'] >= s >= sc['lower_limit'])
+                  for sc in SENTIMENT_CATEGORIES}
+
+    return len(buckets)
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    synonyms = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    start = datetime.datetime(2019, 1, 1)
+    rows = list(synthetic_rows(random.Random(0), count, synonyms, start))
+
+    started = time.perf_counter()
+    buckets = per_bucket(rows, start)
+    print(f'per bucket: {buckets} synonym-hours in {time.perf_counter() - started:.2f}s')
+
+    started = time.perf_counter()
+    arrays = extract_arrays(rows, start)
+    extract_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    statistics = bucket_statistics(arrays, SENTIMENT_CATEGORIES, 3600)
+    print(f'vectorized: {len(statistics["posts"])} synonym-hours in {time.perf_counter() - started:.2f}s '
+          f'(+{extract_time:.2f}s to build the arrays)')
@@ -0,0 +1,69 @@
+"""
+Measures the memory used per buffered post by the scraper buffers: the dicts with a set of
+synonym names they used to hold, against the slotted records with a tuple of synonym ids.
+
+Usage: python -m benchmarks.records_benchmark [posts]
+"""
+import datetime
+import random
+import sys
+import tracemalloc
+
+from util.records import RedditRecord, TrustpilotRecord
+
+SYNONYMS = {f'brand{i}': i for i in range(500)}
+
+
+def synthetic_fields(rng, count):
+    names = sorted(SYNONYMS)
+    for i in range(count):
+        yield (f't1_{i:x}', rng.sample(names, rng.choice([1, 1, 1, 2, 3])), 'x' * rng.randint(40, 400),
+               f'user{i % 1000}', datetime.datetime(2019, 1, 23) + datetime.timedelta(seconds=i), 'all',
+               datetime.datetime.utcnow())
+
+
+def as_dicts(fields):
+    return [{'id': id, 'synonyms': set(synonyms), 'text': text, 'author': author, 'date': date,
+             'subreddit': subreddit, 'scraped_at': scraped_at}
+            for id, synonyms, text, author, date, subreddit, scraped_at in fields]
+
+
+def as_records(fields):
+    return [RedditRecord(id, tuple(sorted(SYNONYMS[synonym] for synonym in synonyms)), text, author, date, subreddit,
+                         scraped_at)
+            for id, synonyms, text, author, date, subreddit, scraped_at in fields]
+
+
+def as_trustpilot_dicts(fields):
+    return [{'id': id, 'synonym': synonyms[0], 'text': text, 'author': author, 'date': date, 'num_ratings': '12',
+             'scraped_at': scraped_at}
+            for id, synonyms, text, author, date, _, scraped_at in fields]
+
+
+def as_trustpilot_records(fields):
+    return [TrustpilotRecord(id, (SYNONYMS[synonyms[0]],), text, author, date, '12', scraped_at)
+            for id, synonyms, text, author, date, _, scraped_at in fields]
+
+
+def measure(name, build, fields, baseline=None):
+    tracemalloc.start()
+    buffer = build(fields)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'{name:28s} {size / len(buffer):8.0f} bytes per post'
+          + (f' ({1 - size / baseline:.0%} less)' if baseline else ''))
+
+    return size
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    # Field values are shared by both buffers, so only the per-post containers are measured
+    fields = list(synthetic_fields(random.Random(0), count))
+
+    baseline = measure('reddit dict + set of names', as_dicts, fields)
+    measure('RedditRecord + id tuple', as_records, fields, baseline)
+    baseline = measure('trustpilot dict', as_trustpilot_dicts, fields)
+    measure('TrustpilotRecord', as_trustpilot_records, fields, baseline)
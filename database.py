@@ -1,18 +1,64 @@
 import os
 from contextlib import contextmanager
 
-from sqlalchemy import Column, ForeignKey, Integer, Text, String, create_engine, DateTime, Float
+from sqlalchemy import Column, ForeignKey, Integer, Text, String, create_engine, DateTime, Float, LargeBinary, Index, \
+    Boolean
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.types import TypeDecorator
+
+from util.compression import TextCodec
 
 Base = declarative_base()
 
+# Post and author ids are MD5 digests of the source identifiers, stored either as 32 hex
+# characters or, with POST_ID_FORMAT=binary, as the raw 16 bytes (see migrations/binary_post_ids.py)
+POST_ID_FORMAT = os.environ.get('POST_ID_FORMAT', 'hex')
+
+
+def PostId():
+    return LargeBinary(16) if POST_ID_FORMAT == 'binary' else String(32)
+
+
+# Post contents are stored as text or, with POST_CONTENTS_COMPRESSION=zlib or zstd, compressed
+# (see migrations/compress_post_contents.py). POST_CONTENTS_DICTIONARY optionally names a trained zstd dictionary.
+POST_CONTENTS_COMPRESSION = os.environ.get('POST_CONTENTS_COMPRESSION')
+POST_CONTENTS_DICTIONARY = os.environ.get('POST_CONTENTS_DICTIONARY')
+
+
+class CompressedText(TypeDecorator):
+    """ Text column stored as compressed binary, compressed and decompressed transparently. """
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, codec):
+        super().__init__()
+        self.codec = codec
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else self.codec.compress(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else self.codec.decompress(bytes(value))
+
+
+def PostContents():
+    if not POST_CONTENTS_COMPRESSION:
+        return Text
+
+    dictionary = None
+    if POST_CONTENTS_DICTIONARY:
+        with open(POST_CONTENTS_DICTIONARY, 'rb') as f:
+            dictionary = f.read()
+
+    return CompressedText(TextCodec(POST_CONTENTS_COMPRESSION, dictionary=dictionary))
+
 
 class SynonymPostAssociation(Base):
     __tablename__ = 'synonym_post_association'
 
     synonym_id = Column(Integer, ForeignKey('synonym.id'), primary_key=True)
-    post_id = Column(String(32), ForeignKey('post.id'), primary_key=True)
+    post_id = Column(PostId(), ForeignKey('post.id'), primary_key=True)
 
 
 class Synonym(Base):
@@ -20,6 +66,8 @@ class Synonym(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String, unique=True)
+    # Synonyms removed from the gateway are deactivated, their posts and snapshots are kept
+    active = Column(Boolean, nullable=False, default=True, server_default='true')
     posts = relationship('Post', secondary=SynonymPostAssociation.__tablename__, back_populates='synonyms')
 
     def __repr__(self):
@@ -29,23 +77,35 @@ class Synonym(Base):
 class Post(Base):
     __tablename__ = 'post'
 
-    id = Column(String(32), primary_key=True)
-    contents = Column(Text, nullable=True)
+    id = Column(PostId(), primary_key=True)
+    contents = Column(PostContents(), nullable=True)
     synonyms = relationship('Synonym', secondary=SynonymPostAssociation.__tablename__, back_populates='posts')
     date = Column(DateTime, nullable=False)
-    author_id = Column(String(32), nullable=False)
+    author_id = Column(PostId(), nullable=False)
     source = Column(String(50))
     sentiment = Column(Float, nullable=True, index=True)
+    # Lifecycle timestamps (UTC) for latency reporting, see latency_report.py
+    scraped_at = Column(DateTime, nullable=True)
+    committed_at = Column(DateTime, nullable=True)
+    scored_at = Column(DateTime, nullable=True, index=True)
+    # Near-duplicates point to their cluster representative, the representative counts its cluster size
+    representative_id = Column(PostId(), ForeignKey('post.id'), nullable=True, index=True)
+    multiplicity = Column(Integer, nullable=False, default=1, server_default='1')
+    # Sentiment workers lease unscored posts, expired leases can be claimed by other workers
+    lease_owner = Column(String(64), nullable=True)
+    lease_expires = Column(DateTime, nullable=True)
     __mapper_args__ = {
         'polymorphic_identity': 'post',
         'polymorphic_on': source
     }
+    # Keyset pagination over historical posts, see rescore.py
+    __table_args__ = (Index('ix_post_date_id', 'date', 'id'),)
 
 
 class RedditPost(Post):
     __tablename__ = 'redditpost'
 
-    id = Column(String(32), ForeignKey('post.id'), primary_key=True)
+    id = Column(PostId(), ForeignKey('post.id'), primary_key=True)
     subreddit = Column(String(64), nullable=False)
 
     def __repr__(self):
@@ -59,7 +119,7 @@ class RedditPost(Post):
 class TrustpilotPost(Post):
     __tablename__ = 'trustpilotpost'
 
-    id = Column(String(32), ForeignKey('post.id'), primary_key=True)
+    id = Column(PostId(), ForeignKey('post.id'), primary_key=True)
     user_ratings = Column(Integer, nullable=False)
 
     def __repr__(self):
@@ -70,6 +130,73 @@ class TrustpilotPost(Post):
     }
 
 
+class SentimentRollup(Base):
+    """
+    Sentiment statistics of the posts related to a synonym, per sentiment category and
+    hour, day or week bucket. Maintained in the same transaction as sentiment write-back.
+    """
+    __tablename__ = 'sentiment_rollup'
+
+    synonym_id = Column(Integer, ForeignKey('synonym.id'), primary_key=True)
+    granularity = Column(String(8), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    category = Column(String(16), primary_key=True)
+    count = Column(Integer, nullable=False)
+    sentiment_sum = Column(Float, nullable=False)
+    sentiment_min = Column(Float, nullable=False)
+    sentiment_max = Column(Float, nullable=False)
+
+    def __repr__(self):
+        return f'<SentimentRollup {self.synonym_id} {self.granularity} {self.bucket} {self.category}>'
+
+
+class SnapshotCheckpoint(Base):
+    __tablename__ = 'snapshot_checkpoint'
+
+    synonym_id = Column(Integer, ForeignKey('synonym.id'), primary_key=True)
+    latest = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<SnapshotCheckpoint {self.synonym_id} {self.latest}>'
+
+
+class PublishedSnapshot(Base):
+    """ Snapshot intervals closed by the scheduler, used to report posts scored after their snapshot. """
+    __tablename__ = 'published_snapshot'
+
+    synonym_id = Column(Integer, ForeignKey('synonym.id'), primary_key=True)
+    spans_from = Column(DateTime, primary_key=True)
+    spans_to = Column(DateTime, nullable=False)
+    published_at = Column(DateTime, nullable=False)
+    # Posts in the interval that were still unscored when it was published
+    unscored = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<PublishedSnapshot {self.synonym_id} {self.spans_from}>'
+
+
+class RescoreCheckpoint(Base):
+    __tablename__ = 'rescore_checkpoint'
+
+    job = Column(String(64), primary_key=True)
+    last_date = Column(DateTime, nullable=False)
+    last_id = Column(PostId(), nullable=False)
+    rescored = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<RescoreCheckpoint {self.job} {self.last_date}>'
+
+
+class SchedulerReplica(Base):
+    __tablename__ = 'scheduler_replica'
+
+    id = Column(String(64), primary_key=True)
+    heartbeat = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<SchedulerReplica {self.id}>'
+
+
 engine = create_engine(f'postgresql://{os.environ["DB_USERNAME"]}:{os.environ["DB_PASSWORD"]}@{os.environ["DB_HOST"]}/{os.environ["DB_DATABASE"]}')
 Base.metadata.bind = engine
 
@@ -1,45 +1,195 @@
 import datetime
 import hashlib
+import os
 
+from sqlalchemy import or_, and_, func, tuple_, update, bindparam, distinct, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
 
-from database import Synonym, Post, SynonymPostAssociation, TrustpilotPost, session_scope, RedditPost
+from database import Synonym, Post, SynonymPostAssociation, TrustpilotPost, session_scope, RedditPost, POST_ID_FORMAT, \
+    SnapshotCheckpoint, SchedulerReplica, SentimentRollup, RescoreCheckpoint, PublishedSnapshot
+from snapshots.categories import ROLLUP_GRANULARITIES, bucket_start, categories_of, rollup_spans
+from util.bloomfilter import BloomFilter
+from util.records import KwePost
 
 
 class DBHandler:
     def __init__(self):
-        pass
+        # Probabilistic set of stored post ids, see load_seen_posts
+        self.seen_posts = None
+
+    def load_seen_posts(self, path, capacity=10000000, error_rate=0.001):
+        """
+        Loads the seen-post filter snapshot from disk, or rebuilds it from the
+        database if there is no usable snapshot.
+        """
+        if os.path.isfile(path):
+            try:
+                self.seen_posts = BloomFilter.load(path)
+            except (OSError, ValueError) as e:
+                print(f'DBHandler.load_seen_posts: Could not load {path}, rebuilding: {e}')
+
+        if self.seen_posts is None or self.seen_posts.is_full():
+            self.seen_posts = self.build_seen_posts(max(capacity, 2 * len(self.seen_posts or [])), error_rate)
+
+    def build_seen_posts(self, capacity, error_rate):
+        """ Builds a filter containing the ids of every post in the database. """
+        seen_posts = BloomFilter(capacity, error_rate)
 
-    def get_new_posts(self, synonym=None, with_sentiment=False, limit=None):
         with session_scope() as session:
-            query = session.query(Post).filter(Post.sentiment.is_(None))
-            if limit:
-                query = query.order_by(Post.date).limit(limit)
+            for post_id, in session.query(Post.id).yield_per(10000):
+                seen_posts.add(post_id)
+
+        return seen_posts
+
+    def save_seen_posts(self, path):
+        if self.seen_posts is not None:
+            self.seen_posts.save(path)
 
-            posts = query.all()
+    def is_known_post(self, identifier):
+        """
+        Checks the seen-post filter without a database round-trip.
+        A False result is certain, a True result is wrong with a probability of the filter's error rate.
+        """
+        return self.seen_posts is not None and self.hash_identifier(identifier) in self.seen_posts
 
-            return {post.id: post.contents for post in posts}
+    def _mark_seen(self, post_id):
+        if self.seen_posts is not None:
+            self.seen_posts.add(post_id)
 
-    def get_kwe_posts(self, syn, from_time=datetime.datetime.min , to_time=datetime.datetime.now()):
+    def get_kwe_posts(self, syn, from_time=datetime.datetime.min, to_time=None):
+        """ Returns the sentimented posts related to a synonym within the time span as KwePost records. """
+        return [KwePost(*row) for row in self.iter_kwe_posts(syn, from_time, to_time)]
+
+    def _snapshot_deadline_order(self, query):
+        """
+        Splits a query for unscored posts by the deadline of their snapshots: posts in an interval that
+        has not been snapshotted yet for one of their synonyms come first, followed by the posts whose
+        snapshots have all been published already. Synonyms without a checkpoint have no snapshots yet,
+        so their posts are due. Both parts are ordered by (date, id), oldest (closing soonest) first,
+        so they are read along ix_post_date_id rather than sorted.
+        """
+        association = SynonymPostAssociation.__table__
+        checkpoint = SnapshotCheckpoint.__table__
+        pending = select(association.c.post_id).\
+            select_from(association.outerjoin(checkpoint, checkpoint.c.synonym_id == association.c.synonym_id)).\
+            where(association.c.post_id == Post.id,
+                  or_(checkpoint.c.latest.is_(None), Post.date >= checkpoint.c.latest)).\
+            exists()
+
+        return [query.filter(pending).order_by(Post.date, Post.id),
+                query.filter(~pending).order_by(Post.date, Post.id)]
+
+    def iter_new_posts(self, limit=None, batch_size=1000):
+        """
+        Streams (id, contents) of unsentimented posts through a server-side cursor,
+        in the order of their snapshot deadlines.
+        Only the posts are returned, so memory use does not depend on the number of posts.
+        Near-duplicates are skipped, they inherit the sentiment of their representative.
+        """
+        remaining = limit
+        now = datetime.datetime.utcnow()
         with session_scope() as session:
+            # Posts leased by sentiment workers are left to them
+            query = session.query(Post.id, Post.contents).\
+                filter(Post.sentiment.is_(None), Post.representative_id.is_(None),
+                       or_(Post.lease_expires.is_(None), Post.lease_expires < now))
 
-            posts = session.query(Post).\
-                filter(Post.sentiment.isnot(None), Post.contents.isnot(None), Post.date >= from_time, Post.date < to_time).\
-                join(Post.synonyms).\
-                filter(Synonym.name == syn).\
-                all()
+            for part in self._snapshot_deadline_order(query):
+                if limit:
+                    part = part.limit(remaining)
 
-            return [{"id": post.id, "content": post.contents, "sentiment": post.sentiment} for post in posts]
+                for post_id, contents in part.execution_options(stream_results=True).yield_per(batch_size):
+                    yield post_id, contents
+                    if limit:
+                        remaining -= 1
 
-    def commit_trustpilot(self, synonym, contents, date, identifier, num_user_ratings, user, verbose=False):
+                if limit and remaining <= 0:
+                    return
+
+    def iter_kwe_posts(self, syn, from_time=datetime.datetime.min, to_time=None, batch_size=1000):
+        """
+        Streams (id, contents, sentiment) of the sentimented posts related to a synonym
+        within the time span through a server-side cursor.
+        Only cluster representatives are returned, not their near-duplicates.
+        """
+        to_time = to_time or datetime.datetime.now()
+
+        with session_scope() as session:
+            query = session.query(Post.id, Post.contents, Post.sentiment).\
+                join(SynonymPostAssociation, SynonymPostAssociation.post_id == Post.id).\
+                join(Synonym, Synonym.id == SynonymPostAssociation.synonym_id).\
+                filter(Post.sentiment.isnot(None), Post.contents.isnot(None), Post.representative_id.is_(None),
+                       Post.date >= from_time, Post.date < to_time, Synonym.name == syn)
+
+            for row in query.execution_options(stream_results=True).yield_per(batch_size):
+                yield tuple(row)
+
+    def claim_new_posts(self, worker, limit, lease=datetime.timedelta(minutes=5)):
+        """
+        Leases up to limit unscored posts to the worker, in the order of their snapshot deadlines.
+        Rows locked by other workers are skipped, and posts whose lease has expired are reclaimed.
+        Returns a list of (id, contents) tuples.
+        """
+        now = datetime.datetime.utcnow()
+
+        with session_scope() as session:
+            query = session.query(Post.id, Post.contents).\
+                filter(Post.sentiment.is_(None), Post.representative_id.is_(None),
+                       or_(Post.lease_expires.is_(None), Post.lease_expires < now))
+
+            posts = []
+            for part in self._snapshot_deadline_order(query):
+                if len(posts) < limit:
+                    posts += part.limit(limit - len(posts)).with_for_update(skip_locked=True, of=Post).all()
+
+            if posts:
+                session.query(Post).filter(Post.id.in_([post_id for post_id, _ in posts])).\
+                    update({'lease_owner': worker, 'lease_expires': now + lease}, synchronize_session=False)
+
+            return [(post_id, contents) for post_id, contents in posts]
+
+    def release_claimed_posts(self, worker, post_ids):
+        """ Hands the posts still leased by the worker back, so any worker can claim them again right away. """
+        with session_scope() as session:
+            session.query(Post).filter(Post.id.in_(list(post_ids)), Post.lease_owner == worker).\
+                update({'lease_owner': None, 'lease_expires': None}, synchronize_session=False)
+
+    def complete_claimed_posts(self, worker, sentiments):
+        """
+        Stores sentiments for posts still leased by the worker and releases them in one transaction.
+        Posts whose lease was taken over by another worker are left untouched.
+        Returns the number of posts updated.
+        """
+        with session_scope() as session:
+            unscored = self._get_unscored_synonyms(session, [item["id"] for item in sentiments],
+                                                   Post.lease_owner == worker)
+
+            completed = []
+            for item in sentiments:
+                if session.query(Post).filter(Post.id == item["id"], Post.lease_owner == worker).\
+                        update({'sentiment': item["sentiment"], 'scored_at': datetime.datetime.utcnow(),
+                                'lease_owner': None, 'lease_expires': None}, synchronize_session=False):
+                    completed.append(item)
+
+            self._add_to_rollups(session, unscored, completed)
+            self._propagate_to_duplicates(session, completed)
+
+        return len(completed)
+
+    def commit_trustpilot(self, synonym_id, contents, date, identifier, num_user_ratings, user, verbose=False,
+                          representative=None, scraped_at=None):
         """
         Input:
-                synonym          : string
+                synonym_id       : integer
                 contents         : string
                 date             : UTC datetime object
                 identifier       : string
                 num_user_ratings : integer
                 verbose          : boolean
+                representative   : post id of the near-duplicate cluster representative, if any
+                scraped_at       : UTC datetime object
 
         Commits a synonym <-> post relation to the database.
         """
@@ -48,17 +198,20 @@ class DBHandler:
             hashed_user = self.hash_identifier(user)
 
             if self.post_exists(session, identifier):
+                self._mark_seen(post_id)
                 return False
 
             new_post = TrustpilotPost(date=date, contents=contents, id=post_id, user_ratings=num_user_ratings,
-                                      author_id=hashed_user)
+                                      author_id=hashed_user, scraped_at=scraped_at,
+                                      committed_at=datetime.datetime.utcnow())
 
-            # Fetch synonym id from DB
-            synonym_inst = self.get_synonym(session, synonym)
-            new_post.synonyms = [synonym_inst]
+            new_post.synonyms = self._get_synonyms_by_id(session, [synonym_id])
 
             session.add(new_post)
+            if representative is not None:
+                self._attach_to_representative(session, new_post, representative)
             session.commit()
+            self._mark_seen(post_id)
 
             return True
 
@@ -98,7 +251,9 @@ class DBHandler:
             session.commit()
 
     def hash_identifier(self, identifier):
-        return hashlib.md5(identifier.encode('utf8')).hexdigest()
+        digest = hashlib.md5(identifier.encode('utf8'))
+
+        return digest.digest() if POST_ID_FORMAT == 'binary' else digest.hexdigest()
 
     def post_exists(self, session, identifier):
         hashed = self.hash_identifier(identifier)
@@ -108,19 +263,42 @@ class DBHandler:
     def get_synonym(self, session, synonym):
         return session.query(Synonym).filter_by(name=synonym).first()
 
+    def _get_synonyms_by_id(self, session, synonym_ids):
+        synonyms = session.query(Synonym).filter(Synonym.id.in_(list(synonym_ids))).all()
+        if len(synonyms) != len(set(synonym_ids)):
+            raise RuntimeError("Synonyms missing from the database.")
+
+        return synonyms
+
+    def get_synonym_ids(self, synonyms):
+        """ Returns a dict of synonym name -> synonym id for the given synonym names that exist. """
+        with session_scope() as session:
+            return {name: synonym_id for synonym_id, name in
+                    session.query(Synonym.id, Synonym.name).filter(Synonym.name.in_(list(synonyms)))}
+
     def commit_synonyms(self, synonyms):
+        """ Adds the synonyms that do not exist yet and reactivates those that were deactivated. """
         with session_scope() as session:
             for synonym in synonyms:
-                if self.get_synonym(session, synonym):
+                existing = self.get_synonym(session, synonym)
+                if existing:
+                    existing.active = True
                     continue
 
                 session.add(Synonym(name=synonym))
 
             session.commit()
 
+    def deactivate_synonyms(self, synonyms):
+        with session_scope() as session:
+            session.query(Synonym).filter(Synonym.name.in_(list(synonyms))).\
+                update({Synonym.active: False}, synchronize_session=False)
+
     def update_sentiments(self, sentiments):
         """
         Updates sentiment for posts.
+        Posts scored for the first time are added to the sentiment rollups in the same transaction,
+        rollups of re-scored posts must be recomputed with rebuild_rollups.
         :param sentiments:
         {
             id        : string,
@@ -128,27 +306,418 @@ class DBHandler:
         }
         """
         with session_scope() as session:
+            unscored = self._get_unscored_synonyms(session, [item["id"] for item in sentiments])
+
             for item in sentiments:
-                session.query(Post).filter(Post.id == item["id"]).update({"sentiment": item["sentiment"]})
+                session.query(Post).filter(Post.id == item["id"]).\
+                    update({"sentiment": item["sentiment"], "scored_at": datetime.datetime.utcnow()})
+
+            self._add_to_rollups(session, unscored, sentiments)
+            self._propagate_to_duplicates(session, sentiments)
 
             session.commit()
 
-    def commit_reddit(self, unique_id, synonyms, text, author, subreddit, date):
+    def _get_unscored_synonyms(self, session, post_ids, *criteria):
+        """
+        Returns the date and synonym ids of the posts that do not have a sentiment yet:
+        { post id : (datetime, [synonym id]) }
+        """
+        unscored = {}
+        if not post_ids:
+            return unscored
+
+        # The posts stay locked until the transaction ends, so concurrent schedulers and workers scoring
+        # the same posts wait for each other and only the first one adds them to the rollups.
+        # Locks are taken in id order, so two transactions cannot deadlock on them.
+        rows = session.query(Post.id, Post.date, SynonymPostAssociation.synonym_id).\
+            join(SynonymPostAssociation, SynonymPostAssociation.post_id == Post.id).\
+            filter(Post.id.in_(post_ids), Post.sentiment.is_(None), Post.contents.isnot(None), *criteria).\
+            order_by(Post.id).\
+            with_for_update(of=Post)
+
+        for post_id, date, synonym_id in rows:
+            unscored.setdefault(post_id, (date, []))[1].append(synonym_id)
+
+        return unscored
+
+    def _propagate_to_duplicates(self, session, sentiments):
+        """ Gives unscored near-duplicates the sentiment of their newly scored representative. """
+        representatives = {item["id"]: item["sentiment"] for item in sentiments}
+        if not representatives:
+            return
+
+        duplicates = session.query(Post.id, Post.representative_id).\
+            filter(Post.representative_id.in_(list(representatives)), Post.sentiment.is_(None)).all()
+        if not duplicates:
+            return
+
+        duplicate_sentiments = [{"id": post_id, "sentiment": representatives[representative_id]}
+                                for post_id, representative_id in duplicates]
+        unscored = self._get_unscored_synonyms(session, [post_id for post_id, _ in duplicates])
+
+        for item in duplicate_sentiments:
+            session.query(Post).filter(Post.id == item["id"]).\
+                update({"sentiment": item["sentiment"], "scored_at": datetime.datetime.utcnow()},
+                       synchronize_session=False)
+
+        self._add_to_rollups(session, unscored, duplicate_sentiments)
+
+    def _attach_to_representative(self, session, post, representative):
+        """
+        Marks a new post as a near-duplicate of the representative post id.
+        If the representative is scored already, the post inherits its sentiment right away.
+        """
+        representative_sentiment = session.query(Post.sentiment).filter(Post.id == representative).first()
+        if representative_sentiment is None:
+            return
+
+        post.representative_id = representative
+        session.query(Post).filter(Post.id == representative).\
+            update({'multiplicity': Post.multiplicity + 1}, synchronize_session=False)
+
+        sentiment = representative_sentiment[0]
+        if sentiment is not None:
+            post.sentiment = sentiment
+            post.scored_at = datetime.datetime.utcnow()
+            session.flush()
+            self._add_to_rollups(session, {post.id: (post.date, [synonym.id for synonym in post.synonyms])},
+                                 [{"id": post.id, "sentiment": sentiment}])
+
+    def _add_to_rollups(self, session, unscored, sentiments):
+        """ Adds newly scored posts to the hourly, daily and weekly rollups of their synonyms. """
+        rollups = {}
+        for item in sentiments:
+            if item["id"] not in unscored:
+                continue
+
+            date, synonym_ids = unscored[item["id"]]
+            for synonym_id in synonym_ids:
+                for granularity in ROLLUP_GRANULARITIES:
+                    self._accumulate_post(rollups, synonym_id, granularity, date, item["sentiment"])
+
+        if not rollups:
+            return
+
+        statement = insert(SentimentRollup).values(self._rollup_mappings(rollups))
+        statement = statement.on_conflict_do_update(
+            index_elements=['synonym_id', 'granularity', 'bucket', 'category'],
+            set_={'count': SentimentRollup.count + statement.excluded.count,
+                  'sentiment_sum': SentimentRollup.sentiment_sum + statement.excluded.sentiment_sum,
+                  'sentiment_min': func.least(SentimentRollup.sentiment_min, statement.excluded.sentiment_min),
+                  'sentiment_max': func.greatest(SentimentRollup.sentiment_max, statement.excluded.sentiment_max)})
+
+        session.execute(statement)
+
+    def get_rollup(self, synonym, from_time, to_time):
+        """
+        Returns the sentiment statistics of a synonym in the time span from the rollups, using daily
+        and weekly buckets where they fit in the span and hourly buckets for its edges, see rollup_spans:
+        { category : {count : integer, sum : float, min : float, max : float} }
+        """
+        spans = [and_(SentimentRollup.granularity == granularity, SentimentRollup.bucket >= start,
+                      SentimentRollup.bucket < end)
+                 for granularity, start, end in rollup_spans(from_time, to_time)]
+        if not spans:
+            return {}
+
+        with session_scope() as session:
+            rows = session.query(SentimentRollup.category, func.sum(SentimentRollup.count),
+                                 func.sum(SentimentRollup.sentiment_sum), func.min(SentimentRollup.sentiment_min),
+                                 func.max(SentimentRollup.sentiment_max)).\
+                join(Synonym, Synonym.id == SentimentRollup.synonym_id).\
+                filter(Synonym.name == synonym, or_(*spans)).\
+                group_by(SentimentRollup.category)
+
+            return {category: {'count': count, 'sum': total, 'min': low, 'max': high}
+                    for category, count, total, low, high in rows}
+
+    def rebuild_rollups(self, from_time, to_time):
+        """
+        Recomputes the hourly rollups from the scored posts in the time span, and the daily
+        and weekly rollups overlapping the span from the hourly ones.
+        from_time and to_time should be aligned to whole weeks to keep all rollups complete.
+        """
+        with session_scope() as session:
+            session.query(SentimentRollup).\
+                filter(SentimentRollup.bucket >= from_time, SentimentRollup.bucket < to_time).\
+                delete(synchronize_session=False)
+
+            rows = session.query(Post.date, Post.sentiment, SynonymPostAssociation.synonym_id).\
+                join(SynonymPostAssociation, SynonymPostAssociation.post_id == Post.id).\
+                filter(Post.sentiment.isnot(None), Post.contents.isnot(None), Post.date >= from_time,
+                       Post.date < to_time).\
+                execution_options(stream_results=True).yield_per(10000)
+
+            hourly = {}
+            for date, sentiment, synonym_id in rows:
+                self._accumulate_post(hourly, synonym_id, 'hour', date, sentiment)
+
+            # Daily and weekly rollups are folded from the hourly ones
+            rollups = dict(hourly)
+            for (synonym_id, _, bucket, category), stats in hourly.items():
+                for granularity in ROLLUP_GRANULARITIES[1:]:
+                    self._accumulate(rollups, (synonym_id, granularity, bucket_start(bucket, granularity), category),
+                                     *stats)
+
+            session.bulk_insert_mappings(SentimentRollup, self._rollup_mappings(rollups))
+
+    def _accumulate(self, rollups, key, count, total, low, high):
+        if key in rollups:
+            old_count, old_total, old_low, old_high = rollups[key]
+            rollups[key] = (old_count + count, old_total + total, min(old_low, low), max(old_high, high))
+        else:
+            rollups[key] = (count, total, low, high)
+
+    def _accumulate_post(self, rollups, synonym_id, granularity, date, sentiment):
+        for category in categories_of(sentiment):
+            self._accumulate(rollups, (synonym_id, granularity, bucket_start(date, granularity), category),
+                             1, sentiment, sentiment, sentiment)
+
+    def _rollup_mappings(self, rollups):
+        return [{'synonym_id': synonym_id, 'granularity': granularity, 'bucket': bucket, 'category': category,
+                 'count': count, 'sentiment_sum': total, 'sentiment_min': low, 'sentiment_max': high}
+                for (synonym_id, granularity, bucket, category), (count, total, low, high) in rollups.items()]
+
+    def commit_reddit(self, unique_id, synonym_ids, text, author, subreddit, date, representative=None,
+                      scraped_at=None):
         with session_scope() as session:
             if self.post_exists(session, unique_id):
+                self._mark_seen(self.hash_identifier(unique_id))
                 return False
 
-            synonyms = [self.get_synonym(session, synonym) for synonym in synonyms]
-            if None in synonyms:
-                raise RuntimeError("Synonyms missing from the database.")
+            synonyms = self._get_synonyms_by_id(session, synonym_ids)
 
             hashed_author = self.hash_identifier(author)
             hashed_id = self.hash_identifier(unique_id)
 
             reddit_post = RedditPost(author_id=hashed_author, subreddit=subreddit, synonyms=synonyms, date=date,
-                                     contents=text, id=hashed_id)
+                                     contents=text, id=hashed_id, scraped_at=scraped_at,
+                                     committed_at=datetime.datetime.utcnow())
 
             session.add(reddit_post)
+            if representative is not None:
+                self._attach_to_representative(session, reddit_post, representative)
             session.commit()
+            self._mark_seen(hashed_id)
 
             return True
+
+    def heartbeat_replica(self, replica):
+        """ Registers the scheduler replica as alive. """
+        with session_scope() as session:
+            session.merge(SchedulerReplica(id=replica, heartbeat=datetime.datetime.utcnow()))
+
+    def remove_replica(self, replica):
+        with session_scope() as session:
+            session.query(SchedulerReplica).filter_by(id=replica).delete()
+
+    def get_live_replicas(self, ttl):
+        """ Returns the ids of the scheduler replicas with a heartbeat within the ttl timedelta. """
+        with session_scope() as session:
+            since = datetime.datetime.utcnow() - ttl
+            return [replica for replica, in session.query(SchedulerReplica.id).
+                    filter(SchedulerReplica.heartbeat >= since)]
+
+    def get_snapshot_checkpoints(self, default):
+        """
+        Returns the start of the next snapshot interval for every active synonym:
+        { synonym : datetime }
+        Synonyms without a checkpoint start from default.
+        """
+        with session_scope() as session:
+            rows = session.query(Synonym.name, SnapshotCheckpoint.latest).\
+                outerjoin(SnapshotCheckpoint, SnapshotCheckpoint.synonym_id == Synonym.id).\
+                filter(Synonym.active)
+
+            return {name: latest or default for name, latest in rows}
+
+    def create_snapshot_checkpoints(self, synonyms, latest):
+        """ Starts the snapshots of the synonyms at latest, unless they already have a checkpoint. """
+        with session_scope() as session:
+            synonym_ids = [synonym_id for synonym_id, in
+                           session.query(Synonym.id).filter(Synonym.name.in_(list(synonyms)))]
+            if synonym_ids:
+                session.execute(insert(SnapshotCheckpoint).
+                                values([{'synonym_id': synonym_id, 'latest': latest} for synonym_id in synonym_ids]).
+                                on_conflict_do_nothing(index_elements=['synonym_id']))
+
+    def count_unscored_between(self, synonym, from_time, to_time):
+        """ Counts the unscored posts related to the synonym within the time span. """
+        with session_scope() as session:
+            return session.query(Post.id).\
+                join(SynonymPostAssociation, SynonymPostAssociation.post_id == Post.id).\
+                join(Synonym, Synonym.id == SynonymPostAssociation.synonym_id).\
+                filter(Post.sentiment.is_(None), Post.representative_id.is_(None), Post.date >= from_time,
+                       Post.date < to_time, Synonym.name == synonym).\
+                count()
+
+    def advance_snapshot_checkpoint(self, synonym, spans_from, spans_to, published=True, unscored=0):
+        """
+        Moves the checkpoint of the synonym from spans_from to spans_to, and records the interval
+        as published along with its number of unscored posts if its snapshot was saved.
+        Returns False if another replica has already moved it.
+        """
+        try:
+            with session_scope() as session:
+                synonym_inst = self.get_synonym(session, synonym)
+                checkpoint = session.query(SnapshotCheckpoint).filter_by(synonym_id=synonym_inst.id).\
+                    with_for_update().first()
+
+                if checkpoint is None:
+                    session.add(SnapshotCheckpoint(synonym_id=synonym_inst.id, latest=spans_to))
+                elif checkpoint.latest == spans_from:
+                    checkpoint.latest = spans_to
+                else:
+                    return False
+
+                # A replica may have published the interval before a rebalance, which must not undo the advance
+                if published:
+                    session.execute(insert(PublishedSnapshot).
+                                    values(synonym_id=synonym_inst.id, spans_from=spans_from, spans_to=spans_to,
+                                           published_at=datetime.datetime.utcnow(), unscored=unscored).
+                                    on_conflict_do_nothing(index_elements=['synonym_id', 'spans_from']))
+        except IntegrityError:
+            return False
+
+        return True
+
+    def get_latency_percentiles(self, from_time, to_time, percentiles=(0.5, 0.9, 0.99)):
+        """
+        Computes latency percentiles in seconds, per source and stage, for the posts dated within the time span.
+        Stages are posted -> scraped, scraped -> committed, committed -> scored and posted -> scored.
+        Returns:
+        { source : { stage : {count : integer, seconds : [float per percentile]} } }
+        """
+        stages = {'posted_to_scraped': (Post.date, Post.scraped_at),
+                  'scraped_to_committed': (Post.scraped_at, Post.committed_at),
+                  'committed_to_scored': (Post.committed_at, Post.scored_at),
+                  'posted_to_scored': (Post.date, Post.scored_at)}
+
+        report = {}
+        with session_scope() as session:
+            for stage, (start, end) in stages.items():
+                seconds = func.extract('epoch', end - start)
+                rows = session.query(Post.source, func.count(seconds),
+                                     *[func.percentile_cont(p).within_group(seconds) for p in percentiles]).\
+                    filter(Post.date >= from_time, Post.date < to_time, start.isnot(None), end.isnot(None)).\
+                    group_by(Post.source)
+
+                for source, count, *values in rows:
+                    report.setdefault(source, {})[stage] = {'count': count, 'seconds': values}
+
+        return report
+
+    def get_late_scored(self, from_time, to_time):
+        """
+        Counts, per source, the scored posts dated within the time span and those of them that were
+        scored after the snapshot of their interval had been published, for any of their synonyms.
+        Returns:
+        { source : {scored : integer, late : integer} }
+        """
+        with session_scope() as session:
+            scored = session.query(Post.source, func.count(Post.id)).\
+                filter(Post.date >= from_time, Post.date < to_time, Post.scored_at.isnot(None)).\
+                group_by(Post.source)
+            report = {source: {'scored': count, 'late': 0} for source, count in scored}
+
+            late = session.query(Post.source, func.count(distinct(Post.id))).\
+                join(SynonymPostAssociation, SynonymPostAssociation.post_id == Post.id).\
+                join(PublishedSnapshot, and_(PublishedSnapshot.synonym_id == SynonymPostAssociation.synonym_id,
+                                             PublishedSnapshot.spans_from <= Post.date,
+                                             PublishedSnapshot.spans_to > Post.date)).\
+                filter(Post.date >= from_time, Post.date < to_time, Post.scored_at > PublishedSnapshot.published_at).\
+                group_by(Post.source)
+            for source, count in late:
+                report.setdefault(source, {'scored': 0, 'late': 0})['late'] = count
+
+        return report
+
+    def get_late_snapshots(self, scored_since):
+        """
+        Returns the published snapshot intervals that posts scored since scored_since were scored too late
+        for, as a list of (synonym, spans_from, spans_to). Posts are found through the scored_at index.
+        """
+        with session_scope() as session:
+            rows = session.query(Synonym.name, PublishedSnapshot.spans_from, PublishedSnapshot.spans_to).\
+                join(PublishedSnapshot, PublishedSnapshot.synonym_id == Synonym.id).\
+                join(SynonymPostAssociation, SynonymPostAssociation.synonym_id == Synonym.id).\
+                join(Post, and_(Post.id == SynonymPostAssociation.post_id, PublishedSnapshot.spans_from <= Post.date,
+                                PublishedSnapshot.spans_to > Post.date)).\
+                filter(Post.scored_at >= scored_since, Post.scored_at > PublishedSnapshot.published_at).\
+                distinct()
+
+            return [tuple(row) for row in rows]
+
+    def count_unscored(self, limit):
+        """ Counts unscored posts, stopping at limit. """
+        with session_scope() as session:
+            return session.query(Post.id).filter(Post.sentiment.is_(None)).limit(limit).count()
+
+    def get_rescore_checkpoint(self, job):
+        """ Returns the (date, id) of the last post re-scored by the job and the number of posts re-scored. """
+        with session_scope() as session:
+            checkpoint = session.query(RescoreCheckpoint).filter_by(job=job).first()
+            if checkpoint is None:
+                return None, 0
+
+            return (checkpoint.last_date, checkpoint.last_id), checkpoint.rescored
+
+    def get_rescore_chunk(self, from_time, to_time, after=None, limit=1000):
+        """
+        Returns up to limit scored representative posts in the time span as (id, date, contents),
+        ordered by (date, id) and starting after the (date, id) key.
+        """
+        with session_scope() as session:
+            query = session.query(Post.id, Post.date, Post.contents).\
+                filter(Post.sentiment.isnot(None), Post.contents.isnot(None), Post.representative_id.is_(None),
+                       Post.date >= from_time, Post.date < to_time)
+            if after is not None:
+                query = query.filter(tuple_(Post.date, Post.id) > tuple_(*after))
+
+            return [tuple(row) for row in query.order_by(Post.date, Post.id).limit(limit)]
+
+    def rescore_sentiments(self, job, sentiments, last_key):
+        """
+        Overwrites the sentiment of already scored posts and their near-duplicates in bulk,
+        and moves the job's checkpoint to the (date, id) last_key in the same transaction.
+        scored_at keeps the time of the first scoring, which the latency and late post reports rely on.
+        Rollups are not updated, see rebuild_rollups.
+        """
+        parameters = [{'post_id': item["id"], 'new_sentiment': item["sentiment"]} for item in sentiments]
+
+        with session_scope() as session:
+            if parameters:
+                session.execute(update(Post.__table__).where(Post.__table__.c.id == bindparam('post_id')).
+                                values(sentiment=bindparam('new_sentiment')), parameters)
+                session.execute(update(Post.__table__).
+                                where(Post.__table__.c.representative_id == bindparam('post_id')).
+                                values(sentiment=bindparam('new_sentiment')), parameters)
+
+            checkpoint = session.query(RescoreCheckpoint).filter_by(job=job).first()
+            if checkpoint is None:
+                checkpoint = RescoreCheckpoint(job=job, rescored=0)
+                session.add(checkpoint)
+
+            checkpoint.last_date, checkpoint.last_id = last_key
+            checkpoint.rescored += len(sentiments)
+
+    def get_synonym_names(self):
+        """ Returns a dict of synonym id -> synonym name. """
+        with session_scope() as session:
+            return {synonym_id: name for synonym_id, name in session.query(Synonym.id, Synonym.name)}
+
+    def iter_snapshot_rows(self, from_time, to_time, batch_size=10000):
+        """
+        Streams (synonym_id, date, sentiment, id, is_representative) of every scored post in the
+        time span through a server-side cursor, for the offline snapshot rebuild.
+        Near-duplicates are included, as they are in the rollups.
+        """
+        with session_scope() as session:
+            query = session.query(SynonymPostAssociation.synonym_id, Post.date, Post.sentiment, Post.id,
+                                  Post.representative_id.is_(None)).\
+                join(SynonymPostAssociation, SynonymPostAssociation.post_id == Post.id).\
+                filter(Post.sentiment.isnot(None), Post.contents.isnot(None), Post.date >= from_time,
+                       Post.date < to_time)
+
+            for row in query.execution_options(stream_results=True).yield_per(batch_size):
+                yield tuple(row)
@@ -0,0 +1,42 @@
+import argparse
+from datetime import datetime, timedelta
+
+from dbhandler import DBHandler
+
+DATE_FORMAT = '%Y-%m-%d %H'
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+def print_report(report):
+    header = ' '.join(f'{f"p{round(p * 100)}":>10s}' for p in PERCENTILES)
+    print(f'{"source":16s} {"stage":22s} {"posts":>9s} {header}')
+
+    for source, stages in sorted(report.items()):
+        for stage, stats in stages.items():
+            values = ' '.join(f'{seconds:9.1f}s' for seconds in stats['seconds'])
+            print(f'{source:16s} {stage:22s} {stats["count"]:9d} {values}')
+
+
+def print_late_report(report):
+    print(f'{"source":16s} {"scored":>9s} {"late":>9s} {"late %":>9s}')
+
+    for source, stats in sorted(report.items()):
+        share = stats['late'] / stats['scored'] if stats['scored'] else 0
+        print(f'{source:16s} {stats["scored"]:9d} {stats["late"]:9d} {share:9.2%}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report per-source and per-stage post latency percentiles.')
+    parser.add_argument('--from', dest='from_time', type=lambda value: datetime.strptime(value, DATE_FORMAT),
+                        default=datetime.utcnow() - timedelta(days=1), help=f'UTC start, formatted as {DATE_FORMAT}')
+    parser.add_argument('--to', dest='to_time', type=lambda value: datetime.strptime(value, DATE_FORMAT),
+                        default=datetime.utcnow(), help=f'UTC end, formatted as {DATE_FORMAT}')
+    args = parser.parse_args()
+
+    db = DBHandler()
+    print(f'Post latencies from {args.from_time} to {args.to_time}')
+    print_report(db.get_latency_percentiles(args.from_time, args.to_time, PERCENTILES))
+
+    print()
+    print('Posts scored after their snapshot was published')
+    print_late_report(db.get_late_scored(args.from_time, args.to_time))
@@ -0,0 +1,72 @@
+"""
+Converts the post and author ids between 32 character hex strings and 16 byte binary digests.
+Run with POST_ID_FORMAT=binary afterwards (or unset it after --reverse).
+
+Usage: python -m migrations.binary_post_ids [--reverse]
+"""
+import os
+import sys
+
+from sqlalchemy import inspect, text
+
+from database import engine
+
+ID_COLUMNS = [('post', 'id'), ('post', 'author_id'), ('post', 'representative_id'), ('redditpost', 'id'),
+              ('trustpilotpost', 'id'), ('synonym_post_association', 'post_id'), ('rescore_checkpoint', 'last_id')]
+
+# The seen-post filter is keyed on the ids, so it is rebuilt from the database on the next start
+SEEN_POSTS_FILE = 'seen_posts.bloom'
+
+
+def id_columns(connection):
+    """ The ID_COLUMNS that exist, the tables and columns of migrations that did not run yet are skipped. """
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    existing = {table: {column['name'] for column in inspector.get_columns(table)}
+                for table in {table for table, _ in ID_COLUMNS} & tables}
+
+    return [(table, column) for table, column in ID_COLUMNS if column in existing.get(table, ())]
+
+
+def post_foreign_keys(connection, columns):
+    """ The foreign keys referencing post, including those of post itself, e.g. the representative_id. """
+    inspector = inspect(connection)
+    tables = dict.fromkeys(table for table, _ in columns)
+
+    return [(table, foreign_key) for table in tables
+            for foreign_key in inspector.get_foreign_keys(table) if foreign_key['referred_table'] == 'post']
+
+
+def migrate(reverse=False):
+    if reverse:
+        new_type, conversion = 'VARCHAR(32)', "encode({column}, 'hex')"
+    else:
+        new_type, conversion = 'BYTEA', "decode({column}, 'hex')"
+
+    with engine.begin() as connection:
+        columns = id_columns(connection)
+        foreign_keys = post_foreign_keys(connection, columns)
+
+        # Foreign keys must be dropped while the referenced and referencing columns change type
+        for table, foreign_key in foreign_keys:
+            connection.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT {foreign_key["name"]}'))
+
+        for table, column in columns:
+            connection.execute(text(f'ALTER TABLE {table} ALTER COLUMN {column} TYPE {new_type} '
+                                    f'USING {conversion.format(column=column)}'))
+
+        for table, foreign_key in foreign_keys:
+            columns = ', '.join(foreign_key['constrained_columns'])
+            referred_columns = ', '.join(foreign_key['referred_columns'])
+            connection.execute(text(f'ALTER TABLE {table} ADD CONSTRAINT {foreign_key["name"]} '
+                                    f'FOREIGN KEY ({columns}) REFERENCES post ({referred_columns})'))
+
+    if os.path.isfile(SEEN_POSTS_FILE):
+        os.remove(SEEN_POSTS_FILE)
+
+
+if __name__ == '__main__':
+    reverse = '--reverse' in sys.argv
+    migrate(reverse)
+
+    print(f'Post ids converted to {"hex strings" if reverse else "binary digests"}')
@@ -0,0 +1,65 @@
+"""
+Converts post contents from text to compressed binary using the codec named by
+POST_CONTENTS_COMPRESSION (and the dictionary in POST_CONTENTS_DICTIONARY, if set).
+Keep POST_CONTENTS_COMPRESSION set afterwards.
+
+Usage: python -m migrations.compress_post_contents
+       python -m migrations.compress_post_contents --train-dictionary PATH [samples]
+"""
+import sys
+
+from sqlalchemy import text
+
+from database import engine, POST_CONTENTS_COMPRESSION, PostContents
+from util.compression import train_dictionary
+
+BATCH_SIZE = 5000
+
+
+def write_dictionary(path, samples):
+    with engine.connect() as connection:
+        texts = [contents for contents, in connection.execute(
+            text('SELECT contents FROM post WHERE contents IS NOT NULL ORDER BY random() LIMIT :samples'),
+            {'samples': samples})]
+
+    with open(path, 'wb') as f:
+        f.write(train_dictionary(texts))
+
+
+def compress_contents():
+    codec = PostContents().codec
+
+    with engine.begin() as connection:
+        connection.execute(text('ALTER TABLE post ADD COLUMN IF NOT EXISTS contents_compressed BYTEA'))
+
+    # Convert in batches, keyset paginated on the id, so the migration can be interrupted and resumed
+    last_id = None
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(text(
+                'SELECT id, contents FROM post WHERE contents IS NOT NULL AND contents_compressed IS NULL '
+                + ('AND id > :last_id ' if last_id is not None else '') + 'ORDER BY id LIMIT :limit'),
+                {'last_id': last_id, 'limit': BATCH_SIZE}).fetchall()
+
+            if not rows:
+                break
+
+            connection.execute(text('UPDATE post SET contents_compressed = :compressed WHERE id = :id'),
+                               [{'id': post_id, 'compressed': codec.compress(contents)} for post_id, contents in rows])
+            last_id = rows[-1][0]
+
+    with engine.begin() as connection:
+        connection.execute(text('ALTER TABLE post DROP COLUMN contents'))
+        connection.execute(text('ALTER TABLE post RENAME COLUMN contents_compressed TO contents'))
+
+
+if __name__ == '__main__':
+    if '--train-dictionary' in sys.argv:
+        arguments = sys.argv[sys.argv.index('--train-dictionary') + 1:]
+        write_dictionary(arguments[0], int(arguments[1]) if len(arguments) > 1 else 20000)
+        print(f'Dictionary written to {arguments[0]}')
+    elif not POST_CONTENTS_COMPRESSION:
+        print('Set POST_CONTENTS_COMPRESSION to the codec to compress with.')
+    else:
+        compress_contents()
+        print(f'Post contents compressed with {POST_CONTENTS_COMPRESSION}')
@@ -0,0 +1,19 @@
+"""
+Adds the columns used to collapse near-duplicate posts onto a cluster representative.
+
+Usage: python -m migrations.near_duplicates
+"""
+from sqlalchemy import text
+
+from database import engine, POST_ID_FORMAT
+
+if __name__ == '__main__':
+    id_type = 'BYTEA' if POST_ID_FORMAT == 'binary' else 'VARCHAR(32)'
+
+    with engine.begin() as connection:
+        connection.execute(text(f'ALTER TABLE post ADD COLUMN IF NOT EXISTS representative_id {id_type} '
+                                f'REFERENCES post (id)'))
+        connection.execute(text('ALTER TABLE post ADD COLUMN IF NOT EXISTS multiplicity INTEGER NOT NULL DEFAULT 1'))
+        connection.execute(text('CREATE INDEX IF NOT EXISTS ix_post_representative_id ON post (representative_id)'))
+
+    print('Near-duplicate columns added')
@@ -0,0 +1,15 @@
+"""
+Adds the lease columns used by sentiment workers to claim unscored posts.
+
+Usage: python -m migrations.post_leases
+"""
+from sqlalchemy import text
+
+from database import engine
+
+if __name__ == '__main__':
+    with engine.begin() as connection:
+        connection.execute(text('ALTER TABLE post ADD COLUMN IF NOT EXISTS lease_owner VARCHAR(64)'))
+        connection.execute(text('ALTER TABLE post ADD COLUMN IF NOT EXISTS lease_expires TIMESTAMP WITHOUT TIME ZONE'))
+
+    print('Lease columns added')
@@ -0,0 +1,16 @@
+"""
+Adds the lifecycle timestamp columns used for latency reporting.
+
+Usage: python -m migrations.post_lifecycle
+"""
+from sqlalchemy import text
+
+from database import engine
+
+if __name__ == '__main__':
+    with engine.begin() as connection:
+        for column in ['scraped_at', 'committed_at', 'scored_at']:
+            connection.execute(text(f'ALTER TABLE post ADD COLUMN IF NOT EXISTS {column} TIMESTAMP WITHOUT TIME ZONE'))
+        connection.execute(text('CREATE INDEX IF NOT EXISTS ix_post_scored_at ON post (scored_at)'))
+
+    print('Lifecycle columns added')
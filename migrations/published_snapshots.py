@@ -0,0 +1,11 @@
+"""
+Creates the table of published snapshot intervals used for the late-scored post report.
+
+Usage: python -m migrations.published_snapshots
+"""
+from database import Base, engine, PublishedSnapshot
+
+if __name__ == '__main__':
+    Base.metadata.create_all(engine, tables=[PublishedSnapshot.__table__])
+
+    print('Published snapshot table created')
@@ -0,0 +1,16 @@
+"""
+Creates the re-scoring checkpoint table and the (date, id) index it paginates over.
+
+Usage: python -m migrations.rescore
+"""
+from sqlalchemy import text
+
+from database import Base, engine, RescoreCheckpoint
+
+if __name__ == '__main__':
+    Base.metadata.create_all(engine, tables=[RescoreCheckpoint.__table__])
+
+    with engine.begin() as connection:
+        connection.execute(text('CREATE INDEX IF NOT EXISTS ix_post_date_id ON post (date, id)'))
+
+    print('Re-scoring checkpoint table and index created')
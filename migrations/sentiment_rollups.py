@@ -0,0 +1,18 @@
+"""
+Creates the sentiment rollup table and fills it from the already scored posts.
+
+Usage: python -m migrations.sentiment_rollups
+"""
+from datetime import datetime, timedelta
+
+from database import Base, engine, SentimentRollup
+from dbhandler import DBHandler
+from snapshots.categories import bucket_start
+
+if __name__ == '__main__':
+    Base.metadata.create_all(engine, tables=[SentimentRollup.__table__])
+
+    # Rebuild whole weeks, so that the weekly rollups are complete
+    DBHandler().rebuild_rollups(datetime(2019, 1, 21), bucket_start(datetime.utcnow(), 'week') + timedelta(weeks=1))
+
+    print('Sentiment rollups rebuilt')
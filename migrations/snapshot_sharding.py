@@ -0,0 +1,29 @@
+"""
+Creates the tables used to shard snapshot generation across scheduler replicas, and starts the
+snapshot checkpoints of the existing synonyms from the scheduler's kwe_date.txt, if there is one.
+New synonyms get their checkpoint when they are added.
+
+Usage: python -m migrations.snapshot_sharding [path to kwe_date.txt]
+"""
+import os
+import sys
+from datetime import datetime
+
+from database import Base, engine, SnapshotCheckpoint, SchedulerReplica
+from dbhandler import DBHandler
+
+KWE_DATE_FORMAT = "%Y-%m-%d %H"
+
+if __name__ == '__main__':
+    Base.metadata.create_all(engine, tables=[SnapshotCheckpoint.__table__, SchedulerReplica.__table__])
+
+    kwe_date_file = sys.argv[1] if len(sys.argv) > 1 else 'kwe_date.txt'
+    if os.path.isfile(kwe_date_file):
+        with open(kwe_date_file, 'r') as f:
+            latest = datetime.strptime(f.readline().strip(), KWE_DATE_FORMAT)
+
+        local_db = DBHandler()
+        local_db.create_snapshot_checkpoints(local_db.get_synonym_names().values(), latest)
+        print(f'Snapshot checkpoints of existing synonyms start from {latest}')
+
+    print('Snapshot sharding tables created')
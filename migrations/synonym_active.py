@@ -0,0 +1,14 @@
+"""
+Adds the active flag used to deactivate synonyms removed from the gateway.
+
+Usage: python -m migrations.synonym_active
+"""
+from sqlalchemy import text
+
+from database import engine
+
+if __name__ == '__main__':
+    with engine.begin() as connection:
+        connection.execute(text('ALTER TABLE synonym ADD COLUMN IF NOT EXISTS active BOOLEAN NOT NULL DEFAULT true'))
+
+    print('Synonym active flag added')
@@ -0,0 +1,124 @@
+import argparse
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from time import sleep, time
+
+from dbhandler import DBHandler
+from sentiment_worker import SentimentWorker
+from snapshots.categories import bucket_start
+
+
+class Rescorer:
+    """
+    Re-runs sentiment analysis over historical posts, e.g. after the SA model is updated.
+    Posts are walked by (date, id) in keyset-paginated chunks, scored with at most `concurrency`
+    SA requests in flight and written back in bulk. The progress of each job is checkpointed
+    in the database with every chunk, so an interrupted job resumes where it stopped.
+    The job yields to live ingestion: it pauses while the backlog of unscored posts exceeds
+    max_backlog, and never scores more than max_rate posts per second.
+    """
+
+    def __init__(self, job, from_time, to_time, chunk_size=1000, concurrency=4, max_rate=None, max_backlog=10000,
+                 retries=3):
+        self.local_db = DBHandler()
+        self.sentiment_worker = SentimentWorker(batch_size=chunk_size)
+        self.job = job
+        self.from_time = from_time
+        self.to_time = to_time
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.max_rate = max_rate
+        self.max_backlog = max_backlog
+        self.retries = retries
+
+        self.started = None
+        self.rescored = 0
+
+    def _throttle(self):
+        while self.local_db.count_unscored(self.max_backlog + 1) > self.max_backlog:
+            logging.getLogger().info(f'{self.job}: live backlog above {self.max_backlog} posts, pausing')
+            sleep(10)
+
+        if self.max_rate:
+            ahead = self.rescored / self.max_rate - (time() - self.started)
+            if ahead > 0:
+                sleep(ahead)
+
+    def _score(self, posts):
+        """ Scores a chunk of (id, date, contents), retrying until every post has a sentiment. """
+        for attempt in range(self.retries):
+            sentiments = self.sentiment_worker.calculate_sentiments({post_id: contents
+                                                                    for post_id, _, contents in posts})
+            if len(sentiments) == len(posts):
+                return sentiments
+
+            sleep(2 ** attempt)
+
+        raise RuntimeError(f'{self.job}: SA API failed to score a chunk of {len(posts)} posts')
+
+    def _complete(self, chunk):
+        future, last_key = chunk
+        sentiments = future.result()
+
+        self.local_db.rescore_sentiments(self.job, sentiments, last_key)
+        self.rescored += len(sentiments)
+        logging.getLogger().info(f'{self.job}: {self.rescored} posts re-scored, up to {last_key[0]}')
+
+    def run(self):
+        after, self.rescored = self.local_db.get_rescore_checkpoint(self.job)
+        if after is not None:
+            logging.getLogger().info(f'{self.job}: resuming after {after[0]} ({self.rescored} posts re-scored)')
+
+        self.started = time() - (self.rescored / self.max_rate if self.max_rate else 0)
+
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while True:
+                self._throttle()
+
+                posts = self.local_db.get_rescore_chunk(self.from_time, self.to_time, after, self.chunk_size)
+                if not posts:
+                    break
+
+                # Chunks are (id, date, contents), the keyset is (date, id)
+                after = (posts[-1][1], posts[-1][0])
+                in_flight.append((executor.submit(self._score, posts), after))
+
+                # Chunks are completed in order, so the checkpoint never skips an unfinished chunk
+                if len(in_flight) >= self.concurrency:
+                    self._complete(in_flight.popleft())
+
+            while in_flight:
+                self._complete(in_flight.popleft())
+
+        # Sentiments changed, so the rollups of every week touched are recomputed
+        last_week = bucket_start(self.to_time - timedelta(microseconds=1), 'week')
+        self.local_db.rebuild_rollups(bucket_start(self.from_time, 'week'), last_week + timedelta(weeks=1))
+
+        return self.rescored
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s:%(levelname)s:%(message)s', level=logging.INFO)
+
+    date = lambda value: datetime.strptime(value, '%Y-%m-%d')
+    parser = argparse.ArgumentParser(description='Re-score the sentiment of historical posts.')
+    parser.add_argument('job', help='name of the job, used to resume it')
+    parser.add_argument('--from', dest='from_time', type=date, required=True, help='UTC start date, YYYY-MM-DD')
+    parser.add_argument('--to', dest='to_time', type=date, required=True, help='UTC end date, YYYY-MM-DD')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=4, help='maximum concurrent SA requests')
+    parser.add_argument('--max-rate', type=float, default=None, help='maximum posts re-scored per second')
+    parser.add_argument('--max-backlog', type=int, default=10000,
+                        help='pause while more live posts than this are waiting to be scored')
+    args = parser.parse_args()
+
+    # Leave the CPU to the live scheduler and workers on the same host
+    os.nice(10)
+
+    rescored = Rescorer(args.job, args.from_time, args.to_time, args.chunk_size, args.concurrency, args.max_rate,
+                        args.max_backlog).run()
+    print(f'{args.job}: finished, {rescored} posts re-scored')
@@ -1,74 +1,123 @@
-import json
 import logging
 import os
+import socket
 import traceback
 from concurrent import futures
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from datetime import timedelta
-from statistics import mean
 from threading import Thread
-from time import sleep
+from time import sleep, time
 
-import requests
 from retry import retry
 
 from dbhandler import DBHandler
+from sentiment_worker import SentimentWorker
+from scrapers.parsing import ParsingPool
 from scrapers.reddit_scraper import RedditScraper
 from scrapers.trustpilot_crawler import TrustPilotCrawler
+from snapshots.categories import ALL_POSTS, SENTIMENT_CATEGORIES
+from snapshots.kwe import KWE_SAMPLE_SIZE, KeywordCache, KeywordExtractor, PostSetFingerprint, sample_seed
 from snapshots.snapshot import Snapshot
+from synonym_sync import SynonymSync
+from util.autotune import AIMDController, AdaptiveLimiter
+from util.rendezvous import rendezvous_owner
+from util.resilience import ResilienceError, dependency_metrics
+from util.simhash import SimHashIndex, simhash
+from util.streaming import HashSample
 
 
 class Scheduler:
-    KWE_DATE_FORMAT = "%Y-%m-%d %H"
-    KWE_DATE_FILE = 'kwe_date.txt'
-
-    def _read_kwe_date(self):
-        if os.path.isfile(self.KWE_DATE_FILE):
-            with open(self.KWE_DATE_FILE, 'r') as f:
-                return datetime.strptime(f.readline().strip(), self.KWE_DATE_FORMAT)
-
-        return datetime(2019, 1, 23, 0)
-
-    def _set_kwe_date(self, date):
-        self.kwe_latest = date
-
-        with open(self.KWE_DATE_FILE, 'w') as f:
-            f.write(date.strftime(self.KWE_DATE_FORMAT))
+    SEEN_POSTS_FILE = 'seen_posts.bloom'
+    SEEN_POSTS_SAVE_INTERVAL = 300
+    TRUSTPILOT_FRONTIER_FILE = 'trustpilot_frontier.sqlite'
+    SA_BATCH_SIZE = 1000
+    SNAPSHOT_WORKERS = 30
+    METRICS_LOG_INTERVAL = 60
+    # Published snapshots are checked this often for posts scored after publishing, within LATE_SNAPSHOT_WINDOW
+    LATE_SNAPSHOT_INTERVAL = 300
+    LATE_SNAPSHOT_WINDOW = timedelta(hours=1)
+    # Heartbeats are sent from their own thread, as one schedule iteration can take longer than the TTL
+    REPLICA_HEARTBEAT_INTERVAL = 15
+    REPLICA_TTL = timedelta(minutes=1)
+    KWE_CACHE_FILE = 'kwe_cache.sqlite'
 
     def __init__(self):
         self.continue_schedule = False
 
         self.local_db = DBHandler()
+        self.local_db.load_seen_posts(self.SEEN_POSTS_FILE,
+                                      capacity=int(os.environ.get('SEEN_POSTS_CAPACITY', 10000000)))
+        self.seen_posts_saved = time()
 
         self.all_synonyms = set()
 
-        self.trustpilot = TrustPilotCrawler()
-        self.reddit = RedditScraper()
+        # Near-duplicate posts are collapsed onto a representative within NEAR_DUPLICATE_DISTANCE bits
+        # of SimHash distance, so that only representatives are sent to SA and KWE
+        self.near_duplicates = SimHashIndex(max_distance=int(os.environ['NEAR_DUPLICATE_DISTANCE'])) \
+            if os.environ.get('NEAR_DUPLICATE_DISTANCE') else None
+
+        # HTML parsing is moved to a process pool if PARSER_WORKERS is set
+        self.parser = ParsingPool(int(os.environ['PARSER_WORKERS'])) if os.environ.get('PARSER_WORKERS') else None
+
+        self.trustpilot = TrustPilotCrawler(parser=self.parser, is_seen=self.local_db.is_known_post,
+                                            frontier_path=self.TRUSTPILOT_FRONTIER_FILE)
+        # Synonyms restored from the frontier checkpoint may have been deactivated since,
+        # they are reconciled with the first full synonym map
+        self.frontier_reconciled = False
+        self.reddit = RedditScraper(parser=self.parser, is_seen=self.local_db.is_known_post)
 
         self.scrapers = {'trustpilot': TrustPilotCrawler(), 'reddit': RedditScraper()}
 
+        # SA batch size, KWE concurrency and snapshot workers are adjusted at runtime to keep
+        # the latency of each call under its target (SA_LATENCY_TARGET etc., in seconds)
+        self.sa_batch_size = AIMDController('SA batch size', initial=self.SA_BATCH_SIZE, minimum=10, maximum=10000,
+                                            latency_target=float(os.environ.get('SA_LATENCY_TARGET', 10)),
+                                            increase=100, window=3)
+        self.kwe_concurrency = AIMDController('KWE concurrency', initial=self.SNAPSHOT_WORKERS, minimum=1, maximum=100,
+                                              latency_target=float(os.environ.get('KWE_LATENCY_TARGET', 30)))
+        self.snapshot_workers = AIMDController('Snapshot workers', initial=self.SNAPSHOT_WORKERS, minimum=1,
+                                               maximum=100,
+                                               latency_target=float(os.environ.get('SNAPSHOT_LATENCY_TARGET', 120)))
+        self.metrics_logged = time()
+        self.late_snapshots_checked = time()
+
         # TODO: Make Environment Variables for API info
-        self.kwe_api = f'http://{os.environ["KWE_API_HOST"]}/'
-        self.kwe_api_key = {'Authorization': os.environ['KWE_API_KEY']}
-        self.sa_api = f'http://{os.environ["SA_API_HOST"]}/prediction/'
-        self.sa_api_key = {'Authorization': os.environ['SA_API_KEY']}
+        # KWE responses are cached by post set, so reruns and backfills do not send the same posts again
+        self.kwe_cache = KeywordCache(self.KWE_CACHE_FILE, max_entries=int(os.environ.get('KWE_CACHE_SIZE', 100000)))
+        self.kwe = KeywordExtractor(limiter=AdaptiveLimiter(self.kwe_concurrency), cache=self.kwe_cache)
         self.synonym_api = f'http://{os.environ["GATEWAY_API_HOST"]}/api/synonyms'
         self.synonym_api_key = {'Authorization': os.environ['GATEWAY_API_KEY']}
+        # Only changes to the synonyms are fetched, polling slows down to SYNONYM_MAX_INTERVAL while nothing changes
+        self.synonym_sync = SynonymSync(self.synonym_api, self.synonym_api_key,
+                                        max_interval=float(os.environ.get('SYNONYM_MAX_INTERVAL', 300)))
 
-        self.sentiment_categories = [{'category': 'positive', 'upper_limit': 1, 'lower_limit': 0.55},
-                                     {'category': 'negative', 'upper_limit': 0.45, 'lower_limit': 0},
-                                     {'category': 'neutral', 'upper_limit': 0.55, 'lower_limit': 0.45}]
+        # With SA_CLAIM_WORK set, posts are leased before scoring, so that separate
+        # sentiment_worker.py processes can score posts alongside the scheduler
+        self.sentiment_worker = SentimentWorker(batch_size=self.SA_BATCH_SIZE, tuner=self.sa_batch_size)
+        self.claim_work = bool(os.environ.get('SA_CLAIM_WORK'))
+
+        self.sentiment_categories = SENTIMENT_CATEGORIES
 
         self.kwe_interval = timedelta(hours=1)
-        self.kwe_latest = self._read_kwe_date()
+        # Snapshots with unscored posts wait for them at most this long after becoming due
+        self.snapshot_max_wait = timedelta(seconds=float(os.environ.get('SNAPSHOT_MAX_WAIT', 600)))
+
+        # Snapshot work is partitioned by synonym across all live scheduler replicas
+        self.replica_id = os.environ.get('SCHEDULER_REPLICA_ID') or f'{socket.gethostname()}-{os.getpid()}'
 
         self.continue_schedule = True
         self.schedule_thread = Thread()
+        self.heartbeat_thread = Thread()
         self.crawler_schedule_thread = Thread()
         self.begin_schedule()
 
-        logging.info(f'Initiated scheduler, will create snapshots from {self.kwe_latest}')
+        logging.info(f'Initiated scheduler, new synonyms start from {self._interval_start()}')
+
+    def _interval_start(self):
+        """ Start of the current snapshot interval, where the snapshots of new synonyms start. """
+        now = datetime.utcnow()
+        return now - (now - datetime.min) % self.kwe_interval
 
     def begin_schedule(self):
         # TODO:
@@ -90,64 +139,198 @@ class Scheduler:
         for scraper in self.scrapers.keys():
             self.scrapers[scraper].begin_crawl()
         """
-        self.reddit.begin_crawl()
+        if os.environ.get('REDDIT_SHARDS'):
+            # Comma separated subreddit groups, e.g. "all,apple+iphone"
+            self.reddit.begin_async_crawl([group.split('+') for group in os.environ['REDDIT_SHARDS'].split(',')])
+        else:
+            self.reddit.begin_crawl()
         # self.trustpilot.begin_crawl()
 
         self.continue_schedule = True
         self.schedule_thread = Thread(target=self._threaded_schedule, name='Scheduler')
+        self.heartbeat_thread = Thread(target=self._threaded_heartbeat, name='Replica Heartbeat')
 
     def run(self):
+        self.heartbeat_thread.start()
         self.schedule_thread.start()
 
+    def _threaded_heartbeat(self):
+        """ Keeps this replica in the pool that snapshot work is partitioned over until the schedule stops. """
+        while self.continue_schedule:
+            try:
+                self.local_db.heartbeat_replica(self.replica_id)
+            except Exception as e:
+                print(f'Scheduler._threaded_heartbeat: Exception encountered while sending heartbeat: {e}')
+                traceback.print_exc()
+
+            sleep(self.REPLICA_HEARTBEAT_INTERVAL)
+
+        self.local_db.remove_replica(self.replica_id)
+
     def _save_snapshot(self, synonym, spans_from, spans_to):
+        """ Returns True if the snapshot was saved to the snapshot API. """
         snapshot = self.create_snapshot(synonym, spans_from, spans_to)
 
-        if snapshot:
-            snapshot.save_remotely()
+        return bool(snapshot) and snapshot.save_remotely()
+
+    def _save_shard_snapshot(self, synonym, spans_from):
+        """
+        Creates and saves the snapshot of the synonym starting at spans_from, unless the interval
+        still has unscored posts and has been due for less than snapshot_max_wait, in which case
+        the snapshot is left for a later round.
+        Returns True if the snapshot was published.
+        """
+        spans_to = spans_from + self.kwe_interval
+
+        try:
+            unscored = self.local_db.count_unscored_between(synonym, spans_from, spans_to)
+        except Exception as e:
+            print(f'Scheduler._save_shard_snapshot: Exception encountered while counting unscored posts: {e}')
+            traceback.print_exc()
+            return False
+
+        if unscored and datetime.utcnow() < spans_to + self.kwe_interval + self.snapshot_max_wait:
+            logger.info(f'Waiting for {unscored} unscored posts of {synonym} before snapshotting {spans_from}')
+            return False
+        if unscored:
+            logger.warning(f'Snapshotting {synonym} at {spans_from} with {unscored} posts still unscored')
+
+        with self.snapshot_workers.measure():
+            saved = self._save_snapshot(synonym, spans_from, spans_to)
+
+        try:
+            self.local_db.advance_snapshot_checkpoint(synonym, spans_from, spans_to, saved, unscored)
+        except Exception as e:
+            print(f'Scheduler._save_shard_snapshot: Exception encountered while advancing checkpoint: {e}')
+            traceback.print_exc()
+
+        return True
+
+    def create_due_snapshots(self):
+        """
+        Creates the next snapshot for every synonym owned by this replica whose
+        interval has passed. Synonyms are assigned to the live replicas by rendezvous
+        hashing, so work rebalances when a replica joins or stops sending heartbeats.
+        Returns True if any snapshots were published.
+        """
+        replicas = self.local_db.get_live_replicas(self.REPLICA_TTL)
+        # Synonyms whose checkpoint could not be created when they were added start now as well
+        checkpoints = self.local_db.get_snapshot_checkpoints(self._interval_start())
+
+        due = {synonym: latest for synonym, latest in checkpoints.items()
+               if synonym in self.all_synonyms and datetime.utcnow() > latest + (2 * self.kwe_interval)
+               and rendezvous_owner(synonym, replicas) == self.replica_id}
+        if not due:
+            return False
+
+        logger.info(f'{len(due)} of {len(checkpoints)} synonyms due for snapshots on {self.replica_id} '
+                    f'({len(replicas)} replicas)')
+
+        jobs = []
+        with ThreadPoolExecutor(max_workers=self.snapshot_workers.value) as executor:
+            for synonym, latest in due.items():
+                jobs.append(executor.submit(self._save_shard_snapshot, synonym, latest))
+
+        futures.wait(jobs)
+        published = sum(1 for job in jobs if job.exception() is None and job.result())
+        logger.info(f'Finished {len(jobs)} snapshot futures, {published} snapshots published')
+
+        return published > 0
+
+    def report_late_snapshots(self):
+        """
+        Logs the published snapshots that posts were scored for after publishing, within the last
+        LATE_SNAPSHOT_WINDOW. The snapshot API does not replace an existing interval, so these snapshots
+        miss the late posts, see latency_report.py for the share of late posts per source.
+        Returns the number of late snapshots.
+        """
+        self.late_snapshots_checked = time()
+        try:
+            late = self.local_db.get_late_snapshots(datetime.utcnow() - self.LATE_SNAPSHOT_WINDOW)
+        except Exception as e:
+            print(f'Scheduler.report_late_snapshots: Exception encountered while retrieving late snapshots: {e}')
+            traceback.print_exc()
+            return 0
+
+        if late:
+            logger.warning(f'{len(late)} published snapshots are missing posts scored after publishing, '
+                           f'e.g. {late[0][0]} from {late[0][1]}')
+
+        return len(late)
 
     @retry(delay=0.5, backoff=2, max_delay=60)
     def _threaded_schedule(self):
         while True:
             if not self.continue_schedule:
+                # Entries still waiting for the parsing pool are parsed and committed before stopping
+                self.reddit.stop()
+                self.commit_reviews(self.retrieve_posts())
                 return
 
-            # Retrieve active synonyms from gateway
-            logger.info('Updating synonyms')
-            self.update_synonyms(self.fetch_all_synonyms().keys())
+            # Retrieve changes to the active synonyms from gateway
+            self.sync_synonyms()
 
             # Get and commit new posts
             logger.info('Retrieving posts')
             self.commit_reviews(self.retrieve_posts())
 
+            if time() - self.seen_posts_saved > self.SEEN_POSTS_SAVE_INTERVAL:
+                self.save_seen_posts()
+
+            if time() - self.metrics_logged > self.METRICS_LOG_INTERVAL:
+                self.log_metrics()
+
             # Get and update sentiments for new posts
             logger.info('Fetching unsentimented posts')
-            posts = self.fetch_new_posts(limit=10000)
-            logger.info(f'{len(posts)} new posts fetched')
-            if posts:
-                sentiments = self.calculate_sentiments(posts)
-                try:
-                    self.local_db.update_sentiments(sentiments)
-                except Exception as e:
-                    print(f'Scheduler._threaded_schedule: Exception encountered with local_db.update_sentiments: {e}')
-                    traceback.print_exc()
-                    # TODO: Handle local_db.update_sentiments exceptions
+            num_posts = self.score_new_posts(limit=10000)
+            logger.info(f'{num_posts} new posts fetched')
 
-            # Perform keyword extraction and save snapshots from current interval
-            if datetime.utcnow() > self.kwe_latest + (2 * self.kwe_interval):
-                logger.info(f'Current snapshot date: {self.kwe_latest}')
+            if time() - self.late_snapshots_checked > self.LATE_SNAPSHOT_INTERVAL:
+                self.report_late_snapshots()
 
-                jobs = []
-                with ThreadPoolExecutor(max_workers=30) as executor:
-                    for synonym in self.all_synonyms:
-                        jobs.append(executor.submit(self._save_snapshot, synonym, self.kwe_latest,
-                                                    self.kwe_latest + self.kwe_interval))
+            # Perform keyword extraction and save snapshots for the synonyms owned by this replica
+            if not self.create_due_snapshots():
+                sleep(5)
 
-                futures.wait(jobs)
-                logger.info(f'Finished {len(jobs)} futures for date {self.kwe_latest}')
+    def score_new_posts(self, limit=None):
+        """
+        Calculates and stores sentiments for unsentimented posts in batches
+        of the current SA batch size, each read from the database in its own transaction.
+        In work-claiming mode, batches are leased so other workers can run concurrently.
+        Returns the number of posts fetched.
+        """
+        num_posts = 0
+        try:
+            if self.claim_work:
+                while not limit or num_posts < limit:
+                    claimed = self.sentiment_worker.score_batch()
+                    num_posts += claimed
+                    # Stop on an SA failure, the released posts are retried in the next round
+                    if not claimed or self.sentiment_worker.consecutive_failures:
+                        break
+
+                return num_posts
+
+            while not limit or num_posts < limit:
+                batch_size = self.sentiment_worker.current_batch_size()
+                # Each batch is read in full before SA is called, so no transaction is held open across SA calls
+                posts = list(self.local_db.iter_new_posts(limit=min(batch_size, limit - num_posts) if limit
+                                                          else batch_size))
+                if not posts:
+                    break
+
+                num_posts += len(posts)
+                sentiments = self.calculate_sentiments(dict(posts))
+                if sentiments:
+                    self.local_db.update_sentiments(sentiments)
+                # Posts left unscored would be read again right away, they are retried in the next round
+                if len(sentiments) < len(posts):
+                    break
+        except Exception as e:
+            logger.error(f'Exception encountered while scoring new posts: {e}')
+            traceback.print_exc()
 
-                self._set_kwe_date(self.kwe_latest + self.kwe_interval)
-            else:
-                sleep(5)
+        return num_posts
 
     def calculate_sentiments(self, posts):
         """
@@ -157,27 +340,7 @@ class Scheduler:
             text      : string,
         }
         """
-        # Extract the post contents
-        id_list = []
-        content_list = []
-        for id, content in posts.items():
-            id_list.append(id)
-            content_list.append(content)
-
-        # Call the SentimentAnalysis API
-        try:
-            predictions = json.loads(requests.post(self.sa_api, json=dict(data=content_list)).text)
-        except Exception as e:
-            print(f'Scheduler.calculate_sentiments: Exception encountered with SA API: {e}')
-            traceback.print_exc()
-            # TODO: Handle SA API exceptions
-            return []
-
-        # Combine predictions with posts
-        results = [{'id': id_list[i],
-                    'sentiment': predictions['predictions'][i]} for i in range(0, len(predictions['predictions']))]
-
-        return results
+        return self.sentiment_worker.calculate_sentiments(posts)
 
     def retrieve_posts(self):
         # Get posts from each scraper
@@ -194,9 +357,14 @@ class Scheduler:
         # Commit reviews to the database
         try:
             for review in tp_reviews:
-                self.local_db.commit_trustpilot(identifier=review['id'], synonym=review['synonym'],
-                                                contents=review['text'], user=review['author'], date=review['date'],
-                                                num_user_ratings=review['num_ratings'])
+                fingerprint, representative = self.find_representative(review.text, review.synonym_ids)
+                committed = self.local_db.commit_trustpilot(identifier=review.id, synonym_id=review.synonym_ids[0],
+                                                            contents=review.text, user=review.author,
+                                                            date=review.date, num_user_ratings=review.num_ratings,
+                                                            representative=representative,
+                                                            scraped_at=review.scraped_at)
+                if committed and representative is None:
+                    self.add_representative(fingerprint, review.id, review.synonym_ids)
         except Exception as e:
             print(f'Scheduler.commit_reviews: Exception encountered while commiting trustpilot posts to database: {e}')
             traceback.print_exc()
@@ -204,37 +372,82 @@ class Scheduler:
 
         try:
             for review in reddit_reviews:
-                self.local_db.commit_reddit(unique_id=review['id'], synonyms=review['synonyms'], text=review['text'],
-                                            author=review['author'], date=review['date'], subreddit=review['subreddit'])
+                fingerprint, representative = self.find_representative(review.text, review.synonym_ids)
+                committed = self.local_db.commit_reddit(unique_id=review.id, synonym_ids=review.synonym_ids,
+                                                        text=review.text, author=review.author,
+                                                        date=review.date, subreddit=review.subreddit,
+                                                        representative=representative,
+                                                        scraped_at=review.scraped_at)
+                if committed and representative is None:
+                    self.add_representative(fingerprint, review.id, review.synonym_ids)
         except Exception as e:
             print(f'Scheduler.commit_reviews: Exception encountered while commiting reddit posts to database: {e}')
             traceback.print_exc()
             # TODO: Handle [db_handler].commit_reddit exceptions
 
-    def fetch_all_synonyms(self):
-        try:
-            synonyms = requests.get(self.synonym_api, headers=self.synonym_api_key).json()
-            return synonyms
-        except Exception as e:
-            print(f'Scheduler.fetch_all_synonyms: Exception encountered with synonym api: {e}')
-            return {synonym: -1 for synonym in self.all_synonyms}
-
-    def fetch_new_posts(self, synonym=None, with_sentiment=False, limit=None):
+    def find_representative(self, text, synonym_ids):
         """
-        Returns all newly crawled posts from the crawler and scraper that
-        relate to this synonym.
-        :param synonym : string
-        :param with_sentiment : boolean - if set to false, only returns rows where sentiment = NULL.
-        :param limit : integer
+        Returns the SimHash fingerprint of the text and the post id of a recent
+        near-duplicate, if near-duplicate collapsing is enabled.
+        Only near-duplicates tagged with all the synonym ids are returned, as KWE reads
+        the representatives of a synonym.
         """
+        if self.near_duplicates is None:
+            return None, None
+
+        fingerprint = simhash(text)
+        if fingerprint is None:
+            return None, None
+
+        return fingerprint, self.near_duplicates.find(fingerprint, synonym_ids)
+
+    def add_representative(self, fingerprint, identifier, synonym_ids):
+        if self.near_duplicates is not None and fingerprint is not None:
+            self.near_duplicates.add(fingerprint, self.local_db.hash_identifier(identifier), synonym_ids)
+
+    def log_metrics(self):
+        for controller in [self.sa_batch_size, self.kwe_concurrency, self.snapshot_workers]:
+            logger.info(f'Autotune metrics: {controller.metrics()}')
+        for metrics in dependency_metrics():
+            logger.info(f'Dependency metrics: {metrics}')
+        logger.info(f'KWE cache metrics: {self.kwe_cache.metrics()}')
+
+        self.metrics_logged = time()
+
+    def save_seen_posts(self):
         try:
-            posts = self.local_db.get_new_posts(synonym, with_sentiment, limit)
-            return posts
+            self.local_db.save_seen_posts(self.SEEN_POSTS_FILE)
         except Exception as e:
-            logger.error(f'Exception encountered while retrieving posts from database: {e}')
+            print(f'Scheduler.save_seen_posts: Exception encountered while saving seen posts: {e}')
             traceback.print_exc()
-            # TODO: Handle [db_handler].get_new_posts exceptions
-            return {}
+
+        self.seen_posts_saved = time()
+
+    def sync_synonyms(self, force=False):
+        """ Applies the synonyms added and removed on the gateway since the last poll, if a poll is due. """
+        changes = self.synonym_sync.poll(force)
+        if changes is None:
+            return False
+
+        added, removed = changes
+        logger.info(f'Synonyms updated, {len(added)} added and {len(removed)} removed')
+        if self.apply_synonym_changes(added, removed) and not self.frontier_reconciled:
+            self.reconcile_frontier()
+
+        return True
+
+    def reconcile_frontier(self):
+        """
+        Stops crawling the synonyms restored from the Trustpilot frontier checkpoint that are no longer active.
+        Called once the first full synonym map has been applied, restored synonyms that are still active
+        were added again by it and got their ids.
+        """
+        stale = self.trustpilot.frontier.synonyms() - self.all_synonyms
+        if stale:
+            logger.info(f'Removing {len(stale)} inactive synonyms restored from the Trustpilot frontier')
+            self.trustpilot.remove_synonyms(stale)
+
+        self.frontier_reconciled = True
 
     def create_snapshot(self, synonym, from_time=datetime.min, to_time=datetime.now()):
         """
@@ -243,69 +456,107 @@ class Scheduler:
         :param to_time: datetime
         """
         statistics = dict()
-        posts = list()
         try:
-            posts = self.local_db.get_kwe_posts(synonym, from_time, to_time)
+            rollup = self.local_db.get_rollup(synonym, from_time, to_time)
+        except Exception as e:
+            print(f'Scheduler.create_snapshot: Exception encountered while retrieving rollups from database: {e}')
+            traceback.print_exc()
+            # TODO: Handle [db_handler].get_rollup exception
+            return None
+
+        if not rollup.get(ALL_POSTS):
+            return None
+
+        avg_sentiment = rollup[ALL_POSTS]['sum'] / rollup[ALL_POSTS]['count']
+
+        # Raw posts are only read for the texts sent to keyword extraction and the fingerprints of the post sets
+        seed = sample_seed(synonym, from_time)
+        samples = {sc['category']: HashSample(KWE_SAMPLE_SIZE, seed) for sc in self.sentiment_categories}
+        fingerprints = {sc['category']: PostSetFingerprint(sc['category'], KWE_SAMPLE_SIZE, seed)
+                        for sc in self.sentiment_categories}
+        try:
+            for post_id, content, sentiment in self.local_db.iter_kwe_posts(synonym, from_time, to_time):
+                for sc in self.sentiment_categories:
+                    if sc["upper_limit"] >= sentiment >= sc["lower_limit"]:
+                        samples[sc['category']].add(post_id, content)
+                        fingerprints[sc['category']].add(post_id)
         except Exception as e:
             print(f'Scheduler.create_snapshot: Exception encountered while retrieving posts from database: {e}')
             traceback.print_exc()
-            # TODO: Handle [db_handler].get_kwe_posts exception
-
-        if posts:
-            avg_sentiment = mean([p["sentiment"] for p in posts])
-            splits = [{"sentiment_category": sc["category"],
-                       "posts": [p["content"] for p in posts if sc["upper_limit"] >= p["sentiment"] >= sc["lower_limit"]]}
-                      for sc in self.sentiment_categories]
-
-            # For each split of posts, compute keywords and number of posts
-            for split in splits:
-                keywords = []
-                num_posts = len(split["posts"])
-
-                # Only requests keywords if there are posts
-                if num_posts:
-                    try:
-                        logger.info(f'Performing KWE on posts for {synonym}')
-
-                        response = requests.post(self.kwe_api, json=dict(posts=split["posts"]),
-                                                 headers=self.kwe_api_key).json()
-                        keywords = response.get('keywords', [])
-                    except Exception as e:
-                        print(f'Scheduler.create_snapshot: Exception encountered with KWE API: {e}')
-                        traceback.print_exc()
-
-                        return None
-
-                statistics[split['sentiment_category']] = {"keywords": keywords, "posts": num_posts}
-        else:
+            # TODO: Handle [db_handler].iter_kwe_posts exception
             return None
 
+        # For each split of posts, compute keywords and number of posts
+        for sc in self.sentiment_categories:
+            keywords = []
+            num_posts = rollup[sc['category']]['count'] if sc['category'] in rollup else 0
+            posts = samples[sc['category']].items
+
+            # Only requests keywords if there are posts
+            if posts:
+                try:
+                    logger.info(f'Performing KWE on posts for {synonym}')
+
+                    keywords = self.kwe.extract(posts, fingerprints[sc['category']].hexdigest())
+                except ResilienceError as e:
+                    logger.warning(f'KWE API unavailable, snapshot for {synonym} not created ({e})')
+
+                    return None
+                except Exception as e:
+                    print(f'Scheduler.create_snapshot: Exception encountered with KWE API: {e}')
+                    traceback.print_exc()
+
+                    return None
+
+            statistics[sc['category']] = {"keywords": keywords, "posts": num_posts}
+
         return Snapshot(spans_from=from_time, spans_to=to_time, sentiment=avg_sentiment, synonym=synonym,
                         statistics=statistics)
 
-    def update_synonyms(self, synonyms):
-        if set(synonyms) == self.all_synonyms:
-            return
+    def apply_synonym_changes(self, added, removed):
+        """
+        Adds and removes synonyms in the database, the scrapers and the Trustpilot frontier.
+        Removed synonyms are deactivated in the database, so their posts and snapshots are kept.
+        Returns whether the changes were applied.
+        """
+        added = set(added) - self.all_synonyms
+        removed = set(removed) & self.all_synonyms
+        if not added and not removed:
+            return True
 
         try:
-            self.local_db.commit_synonyms(synonyms)
+            if added:
+                self.local_db.commit_synonyms(added)
+                # Snapshot progress is checkpointed per synonym in the database, new synonyms start now
+                self.local_db.create_snapshot_checkpoints(added, self._interval_start())
+                # Scrapers tag posts with synonym ids rather than names
+                added = self.local_db.get_synonym_ids(added)
+            if removed:
+                self.local_db.deactivate_synonyms(removed)
         except Exception as e:
-            print(f'Scheduler.update_synonyms: Exception encountered while commiting synonyms to database: {e}')
+            print(f'Scheduler.apply_synonym_changes: Exception encountered while commiting synonyms to database: {e}')
             traceback.print_exc()
             # TODO: Handle [db_handler].commit_synonyms exceptions
-            return
+            # Fetch the full synonym map again, the changes not applied are found by comparing it
+            self.synonym_sync.reset(self.all_synonyms)
+            return False
 
-        self.all_synonyms = self.all_synonyms.union(synonyms)
+        # The set is replaced rather than changed in place, as it is read by other threads
+        self.all_synonyms = (self.all_synonyms | set(added)) - removed
 
         # Update scraper synonyms
-        self.reddit.use_synonyms(self.all_synonyms)
-        self.trustpilot.use_synonyms(self.all_synonyms)
+        self.reddit.add_synonyms(added)
+        self.reddit.remove_synonyms(removed)
+        self.trustpilot.add_synonyms(added)
+        self.trustpilot.remove_synonyms(removed)
+
+        return True
 
     def add_synonym(self, synonym):
         self.add_synonyms([synonym])
 
     def add_synonyms(self, synonyms):
-        self.update_synonyms(list(self.all_synonyms.union(synonyms)))
+        self.apply_synonym_changes(synonyms, ())
 
 
 logging.basicConfig(format='%(asctime)s:%(levelname)s:%(message)s')
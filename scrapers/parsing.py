@@ -0,0 +1,157 @@
+import datetime
+import os
+import string
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from bs4 import BeautifulSoup
+
+from util.records import RedditRecord, synonym_ids
+
+_remove_table = str.maketrans({key: None for key in string.punctuation})
+
+
+def normalize(token):
+    """ Normalize a word by converting it to lowercase and removing punctuation. """
+    return token.translate(_remove_table).lower()
+
+
+def match_synonyms(text, synonyms):
+    """ Returns the set of synonyms occurring as a token in the text. """
+    tokens = {normalize(token) for token in text.split()}
+
+    return {synonym for synonym in synonyms if synonym in tokens}
+
+
+def parse_reddit_entry(raw, synonyms):
+    """
+    Input:
+            raw      : dict with the keys id, created_utc, subreddit, author, body (HTML) and scraped_at
+            synonyms : dict of synonym name -> synonym id
+
+    Extracts the text of a Reddit entry and matches it against the synonyms.
+    Returns a RedditRecord, or None if no synonyms match the text.
+    """
+    # Remove HTML tags from body
+    body_text = BeautifulSoup(raw['body'], 'lxml').get_text()
+
+    matching_synonyms = match_synonyms(body_text, synonyms)
+
+    # If no synonyms match the text, skip the entry
+    if not matching_synonyms:
+        return None
+
+    return RedditRecord(raw['id'], tuple(sorted(synonyms[synonym] for synonym in matching_synonyms)), body_text,
+                        raw['author'], datetime.datetime.utcfromtimestamp(raw['created_utc']), raw['subreddit'],
+                        raw.get('scraped_at'))
+
+
+def parse_reddit_batch(raws, synonyms):
+    """ Parses a list of raw Reddit entries, returning the records that matched a synonym. """
+    records = (parse_reddit_entry(raw, synonyms) for raw in raws)
+
+    return [record for record in records if record is not None]
+
+
+def get_next_page(souped_review_page):
+    next_page = souped_review_page.find('a', {'class', 'pagination-page next-page'}, href=True)
+    if not next_page:
+        return None
+
+    return f'https://www.trustpilot.com{next_page["href"]}'
+
+
+def get_date(review):
+    date = review.find('div', {'class', 'header__verified__date'})
+    date = date.find('time')['datetime']
+    return date
+
+
+def parse_review_page(html):
+    """
+    Extracts all available review texts from a downloaded Trustpilot review page.
+    Returns the reviews along with the "Next page" link if it exists.
+    """
+    soup = BeautifulSoup(html, features='lxml')
+    cards = soup.findAll('section', {'class', 'review-card__content-section'})
+    reviews = soup.findAll('section', {'class': 'content-section__review-info'})
+    users_review_counts = zip(
+        [card.find('h3', {'class', 'consumer-info__details__name'}).get_text() for card in cards],
+        [card.find('span', {'class', 'consumer-info__details__review-count'}).get_text()
+             .strip().split(' ')[0] for card in cards]
+    )
+
+    next_page = get_next_page(soup)
+
+    return [{'title': review.find('h2', {'class', 'review-info__body__title'}).get_text().strip(),
+             'body': review.find('p', {'class', 'review-info__body__text'}).get_text().strip(),
+             'date': get_date(review),
+             'user': user.strip(),
+             'review_count': review_count
+             } for (review, (user, review_count)) in zip(reviews, users_review_counts)], next_page
+
+
+class ParsingPool:
+    """
+    Process pool that takes HTML parsing off the scraper threads.
+    Scrapers ship raw payloads to the workers and receive the extracted records
+    (with matched synonyms) back in batches.
+    The number of workers defaults to the PARSER_WORKERS environment variable,
+    or the number of available cores.
+    """
+
+    def __init__(self, workers=None, batch_size=64, retries=1):
+        self.workers = workers or int(os.environ.get('PARSER_WORKERS', os.cpu_count() or 1))
+        self.batch_size = batch_size
+        self.retries = retries
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def submit_reddit_batch(self, raws, synonyms, callback):
+        """
+        Parses the raw Reddit entries in a worker process.
+        The callback is called with the list of matching records once the batch is done.
+        A batch whose worker fails is retried up to retries times, and reported if it still fails.
+        Returns a future that is done once the callback has been called or the batch has been given up.
+        """
+        handled = Future()
+        self._submit_reddit_batch(raws, synonym_ids(synonyms), callback, handled, self.retries)
+
+        return handled
+
+    def _submit_reddit_batch(self, raws, synonyms, callback, handled, retries):
+        def done(future):
+            error = future.exception() if not future.cancelled() else RuntimeError('parsing cancelled')
+            if error is None:
+                try:
+                    callback(future.result())
+                    handled.set_result(len(raws))
+                except Exception as e:
+                    print(f'ParsingPool.submit_reddit_batch: Exception encountered in callback: {e}')
+                    traceback.print_exc()
+                    handled.set_exception(e)
+                return
+
+            if retries > 0:
+                print(f'ParsingPool.submit_reddit_batch: Exception encountered parsing {len(raws)} entries, '
+                      f'retrying: {error}')
+                self._submit_reddit_batch(raws, synonyms, callback, handled, retries - 1)
+                return
+
+            print(f'ParsingPool.submit_reddit_batch: Exception encountered parsing {len(raws)} entries, '
+                  f'batch dropped: {error}')
+            traceback.print_exception(type(error), error, error.__traceback__)
+            handled.set_exception(error)
+
+        try:
+            self.executor.submit(parse_reddit_batch, raws, synonyms).add_done_callback(done)
+        except Exception as e:
+            # The pool is shut down or broken
+            print(f'ParsingPool.submit_reddit_batch: Exception encountered submitting {len(raws)} entries: {e}')
+            handled.set_exception(e)
+
+    def parse_review_page(self, html):
+        """ Parses a Trustpilot review page in a worker process, blocking until it is done. """
+        return self.executor.submit(parse_review_page, html).result()
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
@@ -1,69 +1,124 @@
-import datetime
+import asyncio
 import os
-import string
-from threading import Thread
+from concurrent import futures
+from threading import Thread, Lock
+from time import time
 
 import praw
-from bs4 import BeautifulSoup
-from praw.models import Submission
 from retry import retry
 
+from scrapers.parsing import parse_reddit_entry
+from scrapers.reddit_stream import AsyncRedditIngestor, PrawStreamSource, raw_reddit_entry
+from util.records import synonym_ids
+
 
 class RedditScraper:
-    _remove_table = str.maketrans({key: None for key in string.punctuation})
+    # Raw entries waiting for a full batch are shipped to the parsing pool after at most this many seconds
+    PENDING_MAX_AGE = 5
 
-    def __init__(self):
+    def __init__(self, parser=None, is_seen=None):
+        # Synonym name -> synonym id
         self.synonyms = {}
+        # Records are added by the scraper and parsing pool threads, and taken by get_buffer_contents
         self.buffer = []
+        self.buffer_lock = Lock()
+
+        # Optional callable telling whether an entry id has already been stored
+        self.is_seen = is_seen
+
+        # Optional process pool for parsing, raw entries are batched before being shipped to it
+        self.parser = parser
+        self.pending = []
+        self.pending_since = None
+        self.pending_lock = Lock()
+
         self.comments_thread = Thread(target=self.scrape_comments, name='Reddit Comment Scraper')
         self.submissions_thread = Thread(target=self.scrape_submissions, name='Reddit Submission Scraper')
+        self.ingestor = None
+        self.ingestor_thread = None
 
         # Initialize reddit client
         self.client = praw.Reddit(client_id=os.environ["REDDIT_CLIENT_ID"],
                                   client_secret=os.environ["REDDIT_CLIENT_SECRET"],
                                   user_agent='Zididada Sunshine')
 
-    def _remove_punctuation(self, text):
-        return text.translate(self._remove_table)
-
     def use_synonyms(self, synonyms):
-        self.synonyms = synonyms
+        """ Matches entries against the synonyms, a dict of synonym name -> synonym id. """
+        self.synonyms = synonym_ids(synonyms)
+
+    def add_synonyms(self, synonyms):
+        # The dict is replaced rather than changed in place, as it may be iterated by the parsing threads
+        self.synonyms = {**self.synonyms, **synonym_ids(synonyms)}
 
-    def _normalize(self, token):
-        """ Normalize a word by converting it to lowercase and removing punctuation. """
-        return self._remove_punctuation(token).lower()
+    def remove_synonyms(self, synonyms):
+        self.synonyms = {synonym: synonym_id for synonym, synonym_id in self.synonyms.items()
+                         if synonym not in synonyms}
 
     def _process_entry(self, entry):
-        date = datetime.datetime.utcfromtimestamp(entry.created_utc)
-        subreddit = entry.subreddit.display_name
-        author = entry.author.name
-        body = entry.selftext_html if isinstance(entry, Submission) else entry.body_html
-        unique_id = str(entry)
-
-        # Remove HTML tags from body
-        soup = BeautifulSoup(body, 'lxml')
-        body_text = soup.get_text()
-
-        # Split the body into tokens
-        tokens = [self._normalize(token) for token in body_text.split()]
-
-        matching_synonyms = set()
-        for synonym in self.synonyms:
-            if synonym in tokens:
-                matching_synonyms.add(synonym)
-
-        # If no synonyms match the text, skip the entry
-        if not matching_synonyms:
+        self._process_raw(raw_reddit_entry(entry))
+
+    def _buffer_records(self, records):
+        with self.buffer_lock:
+            self.buffer.extend(records)
+
+    def _process_raw(self, raw):
+        # Skip entries that are already stored, e.g. replayed after a stream restart
+        if self.is_seen and self.is_seen(raw['id']):
+            return
+
+        if not self.parser:
+            record = parse_reddit_entry(raw, self.synonyms)
+            if record:
+                self._buffer_records([record])
+
             return
 
-        self.buffer.append({'id': unique_id, 'synonyms': matching_synonyms, 'text': body_text, 'author': author,
-                            'date': date, 'subreddit': subreddit})
+        with self.pending_lock:
+            if not self.pending:
+                self.pending_since = time()
+            self.pending.append(raw)
+            if len(self.pending) < self.parser.batch_size and time() - self.pending_since < self.PENDING_MAX_AGE:
+                return
+
+            batch = self.pending
+            self.pending = []
+
+        self.parser.submit_reddit_batch(batch, self.synonyms, self._buffer_records)
+
+    def flush_pending(self, max_age=0):
+        """
+        Ships the raw entries waiting for a full batch to the parsing pool if the oldest one
+        has waited at least max_age seconds, so that entries of a quiet stream are not held back.
+        Returns a future that is done once the records are in the buffer, or None if nothing was shipped.
+        """
+        with self.pending_lock:
+            if not self.pending or time() - self.pending_since < max_age:
+                return None
+
+            batch = self.pending
+            self.pending = []
+
+        return self.parser.submit_reddit_batch(batch, self.synonyms, self._buffer_records)
 
     def get_buffer_contents(self):
-        temp = self.buffer.copy()
-        self.buffer.clear()
+        self.flush_pending(self.PENDING_MAX_AGE)
+
+        # The buffer is swapped rather than copied and cleared, so no record added in between is lost
+        with self.buffer_lock:
+            temp = self.buffer
+            self.buffer = []
+
         return temp
 
+    def stop(self, timeout=30):
+        """ Stops the async ingestor, if running, and waits for the pending entries to be parsed into the buffer. """
+        if self.ingestor:
+            self.ingestor.stop()
+
+        flushed = self.flush_pending()
+        if flushed:
+            futures.wait([flushed], timeout)
+
     @retry(delay=0.5, backoff=2, max_delay=60)
     def scrape_submissions(self):
         for entry in self.client.subreddit('all').stream.submissions():
@@ -78,3 +133,19 @@ class RedditScraper:
     def begin_crawl(self):
         self.comments_thread.start()
         self.submissions_thread.start()
+
+    def begin_async_crawl(self, shards):
+        """
+        Alternative to begin_crawl, ingesting comments and submissions from several
+        subreddit groups concurrently on an asyncio event loop.
+        :param shards: list of subreddit groups, e.g. [['all'], ['apple', 'iphone']]
+        """
+        sources = {}
+        for group in shards:
+            name = '+'.join(group)
+            sources[f'{name}/comments'] = PrawStreamSource(self.client, group, 'comments')
+            sources[f'{name}/submissions'] = PrawStreamSource(self.client, group, 'submissions')
+
+        self.ingestor = AsyncRedditIngestor(sources, self._process_raw)
+        self.ingestor_thread = Thread(target=asyncio.run, args=[self.ingestor.run()], name='Reddit Async Ingestor')
+        self.ingestor_thread.start()
@@ -0,0 +1,129 @@
+import asyncio
+import datetime
+from collections import OrderedDict
+from logging import getLogger
+
+from praw.models import Submission
+
+
+def raw_reddit_entry(entry):
+    """ Extracts the fields of a praw comment or submission into a picklable dict. """
+    return {'id': str(entry), 'fullname': entry.fullname, 'created_utc': entry.created_utc,
+            'subreddit': entry.subreddit.display_name, 'author': entry.author.name,
+            'body': entry.selftext_html if isinstance(entry, Submission) else entry.body_html,
+            'scraped_at': datetime.datetime.utcnow()}
+
+
+class PrawStreamSource:
+    """
+    Polls the newest comments or submissions of a group of subreddits through praw.
+    Only entries newer than the given fullname are returned, oldest first, so that
+    a shard can resume where it left off after a reconnect.
+    """
+
+    def __init__(self, client, subreddits, kind='comments', limit=100):
+        self.client = client
+        self.subreddits = subreddits
+        self.kind = kind
+        self.limit = limit
+
+    def _fetch(self, before):
+        subreddit = self.client.subreddit('+'.join(self.subreddits))
+        listing = subreddit.comments if self.kind == 'comments' else subreddit.new
+        params = {'before': before} if before else {}
+
+        entries = reversed(list(listing(limit=self.limit, params=params)))
+
+        return [raw_reddit_entry(entry) for entry in entries
+                if self.kind == 'comments' or entry.selftext]
+
+    async def fetch(self, before):
+        # praw is blocking, so the request is done in the default executor
+        return await asyncio.get_running_loop().run_in_executor(None, self._fetch, before)
+
+
+class AsyncRedditIngestor:
+    """
+    Runs several Reddit stream shards concurrently on one event loop.
+    A shard is any source with a coroutine fetch(before) returning raw entries newer
+    than the fullname `before`, oldest first.
+    Entries are deduplicated by fullname across shards before being handed to `process`.
+    When a shard fails it is retried with exponential backoff, resuming from the
+    last fullname it saw.
+    """
+
+    def __init__(self, sources, process, seen_size=100000, poll_interval=2.0, max_delay=60.0, stale_polls=30):
+        """
+        :param sources: dict of shard name -> source
+        :param process: callable receiving every new raw entry
+        :param seen_size: number of fullnames remembered for deduplication
+        :param poll_interval: seconds to wait after a poll without new entries
+        :param max_delay: maximum backoff in seconds after a failed poll
+        :param stale_polls: number of empty polls after which a shard forgets its last fullname
+        """
+        self.sources = sources
+        self.process = process
+        self.seen_size = seen_size
+        self.poll_interval = poll_interval
+        self.max_delay = max_delay
+        self.stale_polls = stale_polls
+
+        self.seen = OrderedDict()
+        self.last_seen = {name: None for name in sources}
+        self.received = 0
+        self.duplicates = 0
+        self.running = False
+
+    def _is_new(self, fullname):
+        if fullname in self.seen:
+            self.seen.move_to_end(fullname)
+            return False
+
+        self.seen[fullname] = None
+        if len(self.seen) > self.seen_size:
+            self.seen.popitem(last=False)
+
+        return True
+
+    async def _run_shard(self, name, source):
+        delay = self.poll_interval
+        empty_polls = 0
+
+        while self.running:
+            try:
+                entries = await source.fetch(self.last_seen[name])
+            except Exception as e:
+                getLogger().warning(f'Reddit shard {name} failed, reconnecting in {delay}s: {e}')
+                await asyncio.sleep(delay)
+                delay = min(max(delay, 0.5) * 2, self.max_delay)
+                continue
+
+            delay = self.poll_interval
+
+            for raw in entries:
+                self.received += 1
+                self.last_seen[name] = raw['fullname']
+
+                if self._is_new(raw['fullname']):
+                    self.process(raw)
+                else:
+                    self.duplicates += 1
+
+            if entries:
+                empty_polls = 0
+                continue
+
+            # Reddit returns nothing if the `before` entry has been removed, so eventually start over
+            empty_polls += 1
+            if empty_polls >= self.stale_polls:
+                self.last_seen[name] = None
+                empty_polls = 0
+
+            await asyncio.sleep(self.poll_interval)
+
+    async def run(self):
+        self.running = True
+        await asyncio.gather(*(self._run_shard(name, source) for name, source in self.sources.items()))
+
+    def stop(self):
+        self.running = False
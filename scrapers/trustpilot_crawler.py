@@ -1,3 +1,5 @@
+import os
+import sqlite3
 import time
 from datetime import datetime
 from threading import Thread
@@ -7,7 +9,9 @@ from urllib.request import urlopen
 from bs4 import BeautifulSoup as bs
 from retry import retry
 
-from util.orderedsetqueue import OrderedSetQueue, UrlQueue
+from scrapers.parsing import get_date, get_next_page, parse_review_page
+from util.frontier import CrawlFrontier
+from util.records import TrustpilotRecord, synonym_ids
 
 
 class TrustPilotCrawler:
@@ -19,48 +23,78 @@ class TrustPilotCrawler:
     Reviews for a given synonym can be fetched at any time. When synonyms have been fetched
     successfully, they are removed from the database.
     """
+    FRONTIER_SAVE_INTERVAL = 60
 
-    def __init__(self):
-        # The synonym queue is a queue of dictionaries:
-        # { synonym : Queue(URL) }
-        # When a synonym is popped from the queue, the crawler
-        # pops a URL from the synonym's queue. All resulting URLs
+    def __init__(self, parser=None, is_seen=None, frontier_path=None):
+        # The frontier holds a queue of URLs for every synonym.
+        # The crawler visits the synonyms in proportion to their priority,
+        # popping a URL from the synonym's queue each time. All resulting URLs
         # from the URLs webpage are enqueued in the synonym's URL queue.
-        self.synonym_queue = OrderedSetQueue()
+        # If a frontier path is given, the frontier is restored from and checkpointed to it.
+        self.frontier_path = frontier_path
+        self.frontier = self._load_frontier()
+        self.frontier_saved = time.time()
         self.buffer = []
 
         self.host_timer = time.time()
         self.crawled_data = {}
-        self.synonyms = set()
+        self.synonyms = self.frontier.synonyms()
+        # Synonym name -> synonym id, restored frontier synonyms get their ids when they are added again
+        self.synonym_ids = {}
         self.seen_reviews = {}
         self.crawler_thread = None
 
+        # Optional process pool that review pages are parsed in
+        self.parser = parser
+        # Optional callable telling whether a review identifier has already been stored
+        self.is_seen = is_seen
+
+    def _load_frontier(self):
+        if self.frontier_path and os.path.isfile(self.frontier_path):
+            try:
+                return CrawlFrontier.load(self.frontier_path)
+            except sqlite3.Error as e:
+                print(f'TrustPilotCrawler._load_frontier: Could not restore {self.frontier_path}: {e}')
+
+        return CrawlFrontier()
+
+    def save_frontier(self):
+        if self.frontier_path:
+            self.frontier.save(self.frontier_path)
+
+        self.frontier_saved = time.time()
+
     def begin_crawl(self, synonyms=None, verbose=False):
         if synonyms is not None:
             self.use_synonyms(synonyms, verbose)
 
-        self.crawler_thread = Thread(target=self._threaded_crawl, args=[self.synonym_queue, verbose],
+        self.crawler_thread = Thread(target=self._threaded_crawl, args=[self.frontier, verbose],
                                      name='Trustpilot Crawler')
         self.crawler_thread.start()
 
     @retry(delay=0.5, backoff=2, max_delay=60)
-    def _threaded_crawl(self, queue, verbose=False):
+    def _threaded_crawl(self, frontier, verbose=False):
         while True:
-            # Get the next synonym dict in the queue
-            url_queue = queue.get()
-            if verbose:
-                print(f"TrustPilotCrawler._threaded_crawl: {url_queue.tag()} retrieved from synonym_queue")
+            if time.time() - self.frontier_saved > self.FRONTIER_SAVE_INTERVAL:
+                self.save_frontier()
+
+            # Get the next synonym to visit
+            synonym = frontier.next_synonym()
+            if synonym is None:
+                sleep(1)
+                continue
 
-            # Get the synonym of the URL queue
-            synonym = url_queue.tag()
+            if verbose:
+                print(f"TrustPilotCrawler._threaded_crawl: {synonym} retrieved from frontier")
 
-            if url_queue.empty():
+            url = frontier.get(synonym)
+            if url is None:
                 # The queue should be restarted from the initial Trustpilot search.
-                self.synonym_queue.put(self._get_url_queue(synonym))
+                for page in self._get_synonym_review_pages(synonym):
+                    frontier.put(synonym, page)
                 # Skip the rest of this loop
                 continue
 
-            url = url_queue.get()
             # Get reviews from this URL
             if verbose:
                 print(f'Processing: {url}')
@@ -72,68 +106,52 @@ class TrustPilotCrawler:
             for review in reviews:
                 self._process_entry(synonym, review)
 
-            # Requeue the synonym dict
+            # Continue with the next page of this synonym later
             if next_page is not None:
-                url_queue.put(next_page)
-
-            queue.put(url_queue)
-            # TODO: Dump data in local database every once in a while.
-            # Allow the database to be accessed from anywhere.
+                frontier.put(synonym, next_page)
 
-    def use_synonyms(self, synonyms, verbose=False):
+    def use_synonyms(self, synonyms, verbose=False, priorities=None):
+        """
+        Starts crawling the new synonyms and stops crawling those no longer given.
+        synonyms is a dict of synonym name -> synonym id, see util.records.synonym_ids.
+        Crawl priorities can be given as a dict of synonym name -> priority.
+        """
         if verbose:
             print(f"TrustPilotCrawler.use_synonyms: {len(synonyms)} synonyms retreived")
-        new = set(synonyms) - self.synonyms
-        url_queues = [self._get_url_queue(synonym) for synonym in new]
-        if verbose:
-            print(f"TrustPilotCrawler.use_synonyms: {len(url_queues)} url_queues retreived")
-            for url_queue in url_queues:
-                print(f"TrustPilotCrawler.use_synonyms: {url_queue.tag()}")
-        self.synonyms = synonyms
-        self._update_synonym_queue(url_queues)
 
-    def add_synonym(self, synonym):
-        self.add_synonyms([synonym])
+        synonyms = synonym_ids(synonyms)
+        self.add_synonyms(synonyms, verbose, priorities)
+        self.remove_synonyms(self.frontier.synonyms() - set(synonyms))
+
+    def set_priority(self, synonym, priority):
+        self.frontier.set_priority(synonym, priority)
 
-    def add_synonyms(self, synonyms):
-        self.use_synonyms(list(self.synonyms.union(synonyms)))
+    def add_synonym(self, synonym, synonym_id):
+        self.add_synonyms({synonym: synonym_id})
 
-    def _get_url_queue(self, synonym):
+    def add_synonyms(self, synonyms, verbose=False, priorities=None):
         """
-        Adds a synonym to the list of tracked synonyms.
-        Performs a Trustpilot search for the synonym.
-        All query result links are stored in the synonym's queue,
-        both of which are added to the synonym queue.
+        Starts crawling the given synonyms, a dict of synonym name -> synonym id.
+        New synonyms start with an empty queue, which makes the crawler search for them on their first visit.
         """
-        url_queue = UrlQueue(synonym)
-        review_pages = self._get_synonym_review_pages(synonym)
+        synonyms = synonym_ids(synonyms)
+        priorities = priorities or {}
+        for synonym in synonyms:
+            if self.frontier.add_synonym(synonym, priority=max(priorities.get(synonym, 1), 1)) and verbose:
+                print(f"TrustPilotCrawler.add_synonyms: {synonym} added to frontier")
 
-        if len(review_pages) == 0:
-            return url_queue
+        # The dict is replaced rather than changed in place, as it is read by the crawler thread
+        self.synonym_ids = {**self.synonym_ids, **synonyms}
+        self.synonyms = self.frontier.synonyms()
 
-        # Enqueue all pages for this synonym
-        for page in review_pages:
-            url_queue.put(page)
-        return url_queue
+    def remove_synonyms(self, synonyms):
+        """ Stops crawling the given synonyms and drops their queued pages. """
+        for synonym in synonyms:
+            self.frontier.remove_synonym(synonym)
 
-    def _update_synonym_queue(self, newurlqueues):
-        """
-        :param newurlqueues:
-        [
-            UrlQueue
-        ]
-        """
-        # Add new synonym urlqueues to synonym_queue
-        for url_queue in newurlqueues:
-            self.synonym_queue.put(url_queue)
-
-        # Filter the unused synonym urlqueues from synonym_queue
-        self.synonym_queue.put(None)
-        url_queue = self.synonym_queue.get()
-        while url_queue is not None:
-            if url_queue.tag() in self.synonyms:
-                self.synonym_queue.put(url_queue)
-            url_queue = self.synonym_queue.get()
+        self.synonym_ids = {synonym: synonym_id for synonym, synonym_id in self.synonym_ids.items()
+                            if synonym not in synonyms}
+        self.synonyms = self.frontier.synonyms()
 
     def can_ping_yet(self):
         now = time.time()
@@ -163,10 +181,9 @@ class TrustPilotCrawler:
 
         return '|' in link_text and (synonym == link_text.split('|')[0].lower().strip())
 
-    def _get_souped_page(self, url):
+    def _get_page(self, url):
         """
-        Gets the webpage pointed to by the URL as a parsed
-        BeatifulSoup object.
+        Downloads the webpage pointed to by the URL and returns the raw HTML.
         NOTE: Always use this method when downloading Trustpilot
         webpages, as it ensures (time) politeness.
         """
@@ -175,48 +192,38 @@ class TrustPilotCrawler:
         if not can_ping:
             sleep(remaining_time)
 
-        page = urlopen(url)
+        page = urlopen(url).read()
 
-        # Reset timer before returning the souped page
+        # Reset timer before returning the page
         self.host_timer = time.time()
-        return bs(page, features='lxml')
+        return page
+
+    def _get_souped_page(self, url):
+        """
+        Gets the webpage pointed to by the URL as a parsed
+        BeatifulSoup object.
+        """
+        return bs(self._get_page(url), features='lxml')
 
     def _get_reviews_from_url(self, review_page_url):
         """
         Takes a URL for a Trustpilot Review page and downloads it.
         After downloading, it extracts all available review texts and returns them.
         It also returns the "Next page" link if it exists.
+        If a parsing pool is used, the extraction happens in a worker process.
         """
+        page = self._get_page(review_page_url)
 
-        soup = self._get_souped_page(review_page_url)
-        cards = soup.findAll('section', {'class', 'review-card__content-section'})
-        reviews = soup.findAll('section', {'class': 'content-section__review-info'})
-        users_review_counts = zip(
-            [card.find('h3', {'class', 'consumer-info__details__name'}).get_text() for card in cards],
-            [card.find('span', {'class', 'consumer-info__details__review-count'}).get_text()
-                 .strip().split(' ')[0] for card in cards]
-        )
-
-        next_page = self._get_next_page(soup)
+        if self.parser:
+            return self.parser.parse_review_page(page)
 
-        return [{'title': review.find('h2', {'class', 'review-info__body__title'}).get_text().strip(),
-                 'body': review.find('p', {'class', 'review-info__body__text'}).get_text().strip(),
-                 'date': self._get_date(review),
-                 'user': user.strip(),
-                 'review_count': review_count
-                 } for (review, (user, review_count)) in zip(reviews, users_review_counts)], next_page
+        return parse_review_page(page)
 
     def _get_next_page(self, souped_review_page):
-        next_page = souped_review_page.find('a', {'class', 'pagination-page next-page'}, href=True)
-        if not next_page:
-            return None
-
-        return f'https://www.trustpilot.com{next_page["href"]}'
+        return get_next_page(souped_review_page)
 
     def _get_date(self, review):
-        date = review.find('div', {'class', 'header__verified__date'})
-        date = date.find('time')['datetime']
-        return date
+        return get_date(review)
 
     def _process_entry(self, synonym, review):
         """
@@ -233,8 +240,17 @@ class TrustPilotCrawler:
         review_count = review['review_count']
         identifier = f'trustpilot-{user}-{date}-{review_count}'
 
-        self.buffer.append({"id": identifier, "synonym": synonym, "text": body, "author": user,
-                            "date": the_datetime, "num_ratings": review_count})
+        # Recrawls re-emit every review, so skip those already stored
+        if self.is_seen and self.is_seen(identifier):
+            return
+
+        synonym_id = self.synonym_ids.get(synonym)
+        if synonym_id is None:
+            # Synonym removed while its page was being crawled
+            return
+
+        self.buffer.append(TrustpilotRecord(identifier, (synonym_id,), review['body'], user, the_datetime, review_count,
+                                            datetime.utcnow()))
 
     def get_buffer_contents(self):
         temp = self.buffer.copy()
@@ -0,0 +1,134 @@
+import argparse
+import json
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+from multiprocessing import Process
+from time import perf_counter, sleep
+
+from dbhandler import DBHandler
+from util.autotune import AIMDController
+from util.resilience import ResilienceError, dependency
+
+
+class SentimentWorker:
+    """
+    Scores unscored posts using the SentimentAnalysis API.
+    Several workers, on any number of nodes, can run against the same database:
+    each one leases its own batches of posts (see DBHandler.claim_new_posts), and a
+    batch whose worker dies is reclaimed by another worker once the lease expires.
+    The batch size is fixed, or adjusted to the SA API's latency by an optional AIMDController.
+    """
+
+    def __init__(self, worker=None, batch_size=1000, lease=timedelta(minutes=5), tuner=None):
+        self.local_db = DBHandler()
+        self.worker = worker or f'{socket.gethostname()}-{os.getpid()}'
+        self.batch_size = batch_size
+        self.lease = lease
+        self.tuner = tuner
+        self.consecutive_failures = 0
+
+        self.sa_api = f'http://{os.environ["SA_API_HOST"]}/prediction/'
+        self.sa_api_key = {'Authorization': os.environ['SA_API_KEY']}
+        self.sa = dependency('SA', timeout=60, max_concurrent=8)
+
+    def calculate_sentiments(self, posts):
+        """
+        :param posts:
+        {
+            id        : integer,
+            text      : string,
+        }
+        """
+        # Extract the post contents
+        id_list = []
+        content_list = []
+        for id, content in posts.items():
+            id_list.append(id)
+            content_list.append(content)
+
+        # Call the SentimentAnalysis API
+        start = perf_counter()
+        try:
+            predictions = json.loads(self.sa.request('post', self.sa_api, json=dict(data=content_list)).text)
+        except ResilienceError as e:
+            logging.getLogger().warning(f'SentimentWorker.calculate_sentiments: SA API unavailable: {e}')
+            return []
+        except Exception as e:
+            print(f'SentimentWorker.calculate_sentiments: Exception encountered with SA API: {e}')
+            traceback.print_exc()
+            # TODO: Handle SA API exceptions
+            if self.tuner:
+                self.tuner.record(perf_counter() - start, error=True)
+            return []
+
+        if self.tuner:
+            self.tuner.record(perf_counter() - start)
+
+        # Combine predictions with posts
+        results = [{'id': id_list[i],
+                    'sentiment': predictions['predictions'][i]} for i in range(0, len(predictions['predictions']))]
+
+        return results
+
+    def current_batch_size(self):
+        return self.tuner.value if self.tuner else self.batch_size
+
+    def score_batch(self):
+        """
+        Claims, scores and stores one batch of posts.
+        Posts SA did not score are released, and counted in consecutive_failures, so callers can back off.
+        Returns the number of posts claimed.
+        """
+        posts = self.local_db.claim_new_posts(self.worker, self.current_batch_size(), self.lease)
+        if posts:
+            sentiments = self.calculate_sentiments(dict(posts))
+            updated = self.local_db.complete_claimed_posts(self.worker, sentiments)
+            logging.getLogger().info(f'{self.worker}: scored {updated} of {len(posts)} claimed posts')
+
+            if len(sentiments) < len(posts):
+                self.local_db.release_claimed_posts(self.worker, [post_id for post_id, _ in posts])
+                self.consecutive_failures += 1
+            else:
+                self.consecutive_failures = 0
+
+        return len(posts)
+
+    def run(self, idle_sleep=5, max_backoff=300):
+        while True:
+            try:
+                if self.score_batch() and not self.consecutive_failures:
+                    continue
+            except Exception as e:
+                logging.getLogger().error(f'{self.worker}: Exception encountered while scoring posts: {e}')
+                traceback.print_exc()
+                self.consecutive_failures += 1
+
+            # Sleep while idle, backing off exponentially while SA or the database fails
+            sleep(min(idle_sleep * 2 ** self.consecutive_failures, max_backoff))
+
+
+def run_worker(batch_size, latency_target):
+    tuner = AIMDController('SA batch size', initial=batch_size, minimum=10, maximum=10000,
+                           latency_target=latency_target, increase=100, window=3) if latency_target else None
+    SentimentWorker(batch_size=batch_size, tuner=tuner).run()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s:%(levelname)s:%(message)s', level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Run sentiment workers against the shared database.')
+    parser.add_argument('--processes', type=int, default=1, help='number of local worker processes')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--latency-target', type=float, default=None,
+                        help='adjust the batch size to keep SA requests within this many seconds')
+    args = parser.parse_args()
+
+    processes = [Process(target=run_worker, args=[args.batch_size, args.latency_target], name=f'Sentiment Worker {i}')
+                 for i in range(args.processes)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
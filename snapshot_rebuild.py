@@ -0,0 +1,134 @@
+import argparse
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from time import time
+
+from dbhandler import DBHandler
+from snapshots.categories import SENTIMENT_CATEGORIES
+from snapshots.kwe import KWE_SAMPLE_SIZE, KeywordCache, KeywordExtractor, PostSetFingerprint, sample_seed
+from snapshots.rebuild import KeywordStore, bucket_statistics, extract_arrays
+from snapshots.snapshot import Snapshot
+from util.streaming import HashSample
+
+
+class SnapshotRebuilder:
+    """
+    Regenerates the historical snapshots of all synonyms, e.g. after the sentiment categories
+    or the snapshot interval changed.
+    The scored posts are read once into columnar arrays, and the mean sentiment and category
+    counts of every (synonym, interval) are computed at once. Keywords are kept in a local
+    keyword store with a fingerprint of the posts they were extracted from, so KWE only runs
+    for the buckets whose posts changed since the previous rebuild.
+    """
+
+    def __init__(self, from_time, to_time, interval, categories=SENTIMENT_CATEGORIES, store='keywords.db',
+                 sample_size=KWE_SAMPLE_SIZE, kwe_workers=4, kwe_cache=None):
+        self.local_db = DBHandler()
+        self.kwe = KeywordExtractor(cache=KeywordCache(kwe_cache) if kwe_cache else None)
+        self.store = KeywordStore(store)
+        self.from_time = from_time
+        self.to_time = to_time
+        self.interval = interval
+        self.categories = categories
+        self.sample_size = sample_size
+        self.kwe_workers = kwe_workers
+
+    def _extract_keywords(self, synonym, spans_from, categories):
+        """ Runs KWE on a sample of the posts of each of the given categories in one interval. """
+        seed = sample_seed(synonym, spans_from)
+        samples = {sc['category']: HashSample(self.sample_size, seed) for sc in categories}
+        fingerprints = {sc['category']: PostSetFingerprint(sc['category'], self.sample_size, seed) for sc in categories}
+        posts = self.local_db.iter_kwe_posts(synonym, spans_from, spans_from + self.interval)
+        for post_id, content, sentiment in posts:
+            for sc in categories:
+                if sc['upper_limit'] >= sentiment >= sc['lower_limit']:
+                    samples[sc['category']].add(post_id, content)
+                    fingerprints[sc['category']].add(post_id)
+
+        return {category: self.kwe.extract(sample.items, fingerprints[category].hexdigest())
+                if sample.items else [] for category, sample in samples.items()}
+
+    def _build_snapshot(self, names, statistics, bucket):
+        """ Returns the number of categories KWE ran for, and the snapshot of a bucket. """
+        synonym_id = int(statistics['synonym_id'][bucket])
+        spans_from = self.from_time + self.interval * int(statistics['interval'][bucket])
+
+        snapshot_statistics = {}
+        changed = []
+        for sc in self.categories:
+            counts, fingerprints = statistics['categories'][sc['category']]
+            keywords = self.store.get(synonym_id, spans_from, sc['category'], fingerprints[bucket])
+            if counts[bucket] and keywords is None:
+                changed.append(sc)
+                keywords = []
+
+            snapshot_statistics[sc['category']] = {'keywords': keywords or [], 'posts': int(counts[bucket])}
+
+        if changed:
+            extracted = self._extract_keywords(names[synonym_id], spans_from, changed)
+            for sc in changed:
+                fingerprint = statistics['categories'][sc['category']][1][bucket]
+                self.store.put(synonym_id, spans_from, sc['category'], fingerprint, extracted[sc['category']])
+                snapshot_statistics[sc['category']]['keywords'] = extracted[sc['category']]
+
+        snapshot = Snapshot(spans_from=spans_from, spans_to=spans_from + self.interval,
+                            sentiment=float(statistics['sentiment'][bucket]), synonym=names[synonym_id],
+                            statistics=snapshot_statistics)
+
+        return len(changed), snapshot
+
+    def run(self, publish=False):
+        started = time()
+        names = self.local_db.get_synonym_names()
+        arrays = extract_arrays(self.local_db.iter_snapshot_rows(self.from_time, self.to_time), self.from_time)
+        logging.getLogger().info(f'Read {len(arrays)} scored posts in {time() - started:.1f}s')
+
+        statistics = bucket_statistics(arrays, self.categories, int(self.interval.total_seconds()))
+        buckets = len(statistics['posts'])
+        logging.getLogger().info(f'Computed {buckets} snapshots in {time() - started:.1f}s')
+
+        published = 0
+        existing = 0
+        kwe_requests = 0
+        with ThreadPoolExecutor(max_workers=self.kwe_workers) as executor:
+            for changed, snapshot in executor.map(lambda bucket: self._build_snapshot(names, statistics, bucket),
+                                                  range(buckets)):
+                kwe_requests += changed
+                if publish:
+                    # The snapshot API does not replace a snapshot that already exists
+                    status_code = snapshot.post()
+                    published += status_code == Snapshot.CREATED
+                    existing += status_code == Snapshot.EXISTS
+
+        logging.getLogger().info(f'Rebuilt {buckets} snapshots in {time() - started:.1f}s, KWE ran for '
+                                 f'{kwe_requests} of {buckets * len(self.categories)} categories')
+        if existing:
+            logging.getLogger().warning(f'{existing} rebuilt snapshots already existed and were not replaced')
+        self.store.close()
+
+        return published if publish else buckets
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s:%(levelname)s:%(message)s', level=logging.INFO)
+
+    date = lambda value: datetime.strptime(value, '%Y-%m-%d')
+    parser = argparse.ArgumentParser(description='Rebuild historical snapshots of all synonyms.')
+    parser.add_argument('--from', dest='from_time', type=date, required=True, help='UTC start date, YYYY-MM-DD')
+    parser.add_argument('--to', dest='to_time', type=date, required=True, help='UTC end date, YYYY-MM-DD')
+    parser.add_argument('--interval', type=float, default=1, help='snapshot interval in hours')
+    parser.add_argument('--categories', type=argparse.FileType(), default=None,
+                        help='JSON file with a list of {category, upper_limit, lower_limit}')
+    parser.add_argument('--store', default='keywords.db', help='keyword store of previous rebuilds')
+    parser.add_argument('--kwe-workers', type=int, default=4, help='maximum concurrent KWE requests')
+    parser.add_argument('--kwe-cache', default=None, help='KWE response cache shared with the scheduler')
+    parser.add_argument('--publish', action='store_true', help='save the snapshots to the snapshot API')
+    args = parser.parse_args()
+
+    categories = json.load(args.categories) if args.categories else SENTIMENT_CATEGORIES
+
+    rebuilt = SnapshotRebuilder(args.from_time, args.to_time, timedelta(hours=args.interval), categories, args.store,
+                                kwe_workers=args.kwe_workers, kwe_cache=args.kwe_cache).run(args.publish)
+    print(f'{rebuilt} snapshots {"published" if args.publish else "rebuilt"}')
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+SENTIMENT_CATEGORIES = [{'category': 'positive', 'upper_limit': 1, 'lower_limit': 0.55},
+                        {'category': 'negative', 'upper_limit': 0.45, 'lower_limit': 0},
+                        {'category': 'neutral', 'upper_limit': 0.55, 'lower_limit': 0.45}]
+
+# Rollup category covering every post, used for the mean sentiment of a snapshot
+ALL_POSTS = 'all'
+
+ROLLUP_GRANULARITIES = ['hour', 'day', 'week']
+BUCKET_SIZES = {'hour': timedelta(hours=1), 'day': timedelta(days=1), 'week': timedelta(weeks=1)}
+
+
+def categories_of(sentiment, categories=SENTIMENT_CATEGORIES):
+    """ Returns the names of the categories containing the sentiment, including ALL_POSTS. """
+    return [ALL_POSTS] + [sc['category'] for sc in categories if sc['upper_limit'] >= sentiment >= sc['lower_limit']]
+
+
+def bucket_start(date, granularity):
+    """ Truncates the datetime to the start of its hour, day or week (starting Monday). """
+    if granularity == 'hour':
+        return date.replace(minute=0, second=0, microsecond=0)
+
+    day = datetime(date.year, date.month, date.day)
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+
+    raise ValueError(f'Unknown rollup granularity {granularity}')
+
+
+def rollup_spans(from_time, to_time, granularities=ROLLUP_GRANULARITIES):
+    """
+    Covers the time span with the coarsest rollup buckets that fit in it, and finer buckets for
+    its unaligned edges. Returns a list of (granularity, start, end), where the buckets of the
+    granularity starting within [start, end) add up to that part of the span.
+    from_time and to_time must be whole hours.
+    """
+    granularity = granularities[-1]
+    if len(granularities) == 1:
+        return [(granularity, from_time, to_time)] if from_time < to_time else []
+
+    start = bucket_start(from_time, granularity)
+    if start < from_time:
+        start += BUCKET_SIZES[granularity]
+    end = bucket_start(to_time, granularity)
+    if start >= end:
+        return rollup_spans(from_time, to_time, granularities[:-1])
+
+    return rollup_spans(from_time, start, granularities[:-1]) + [(granularity, start, end)] + \
+        rollup_spans(end, to_time, granularities[:-1])
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import sqlite3
+from threading import Lock
+from time import time
+
+from util.resilience import dependency
+
+# Maximum number of posts per sentiment category sent to the KWE API
+KWE_SAMPLE_SIZE = 5000
+
+
+def sample_seed(synonym, spans_from):
+    """ Seed of the post samples sent to KWE for a snapshot, so every run picks the same posts. """
+    return f'{synonym}@{spans_from.isoformat()}'
+
+
+class PostSetFingerprint:
+    """
+    Fingerprint of the set of posts a KWE request is sampled from, independent of the order of the posts.
+    It is built incrementally from a sum of per-post digests, so the post ids are not kept in memory.
+    The sample size and seed are part of the fingerprint, as they decide which of the posts are sent to KWE.
+    Post ids may be hex strings or binary digests, see database.POST_ID_FORMAT.
+    """
+
+    def __init__(self, category, sample_size, seed=''):
+        self.namespace = json.dumps([category, sample_size, seed])
+        self.count = 0
+        self.total = 0
+
+    def add(self, post_id):
+        post_id = bytes.fromhex(post_id) if isinstance(post_id, str) else bytes(post_id)
+        self.total = (self.total + int.from_bytes(hashlib.sha256(post_id).digest(), 'big')) % (1 << 256)
+        self.count += 1
+
+    def hexdigest(self):
+        return hashlib.sha256(f'{self.namespace}:{self.count}:{self.total:064x}'.encode('utf8')).hexdigest()
+
+
+class KeywordCache:
+    """
+    Persistent cache of KWE responses in an SQLite file, keyed by post set fingerprint.
+    Holds at most max_entries responses, evicting the least recently used ones.
+    """
+
+    def __init__(self, path, max_entries=100000):
+        self.max_entries = max_entries
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS keywords (fingerprint TEXT PRIMARY KEY, keywords TEXT, '
+                                'last_used REAL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS ix_keywords_last_used ON keywords (last_used)')
+        self.entries = self.connection.execute('SELECT COUNT(*) FROM keywords').fetchone()[0]
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, fingerprint):
+        """ Returns the cached keywords of the post set, or None. """
+        with self.lock:
+            row = self.connection.execute('SELECT keywords FROM keywords WHERE fingerprint = ?',
+                                          (fingerprint,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.connection.execute('UPDATE keywords SET last_used = ? WHERE fingerprint = ?', (time(), fingerprint))
+            self.connection.commit()
+
+            return json.loads(row[0])
+
+    def put(self, fingerprint, keywords):
+        with self.lock:
+            inserted = self.connection.execute('INSERT OR IGNORE INTO keywords VALUES (?, ?, ?)',
+                                               (fingerprint, json.dumps(keywords), time())).rowcount
+            self.entries += inserted
+
+            if self.entries > self.max_entries:
+                evicted = self.connection.execute('DELETE FROM keywords WHERE fingerprint IN (SELECT fingerprint '
+                                                  'FROM keywords ORDER BY last_used LIMIT ?)',
+                                                  (self.entries - self.max_entries,)).rowcount
+                self.entries -= evicted
+                self.evictions += evicted
+
+            self.connection.commit()
+
+    def metrics(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'name': 'KWE cache', 'entries': self.entries, 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else None, 'evictions': self.evictions}
+
+    def close(self):
+        self.connection.close()
+
+
+class KeywordExtractor:
+    """
+    Client for the KeywordExtraction API.
+    Concurrent requests can be limited with an AdaptiveLimiter, and responses can be cached in a
+    KeywordCache so that identical post sets are not sent to the API again.
+    """
+
+    def __init__(self, api=None, api_key=None, limiter=None, cache=None):
+        self.api = api or f'http://{os.environ["KWE_API_HOST"]}/'
+        self.api_key = {'Authorization': api_key or os.environ['KWE_API_KEY']}
+        self.limiter = limiter
+        self.cache = cache
+        self.dependency = dependency('KWE', timeout=120, max_concurrent=30)
+
+    def _extract(self, posts):
+        response = self.dependency.request('post', self.api, json=dict(posts=posts), headers=self.api_key)
+        # Error responses may have a JSON body too, they must not be taken (and cached) as no keywords
+        response.raise_for_status()
+        return response.json().get('keywords', [])
+
+    def _request(self, posts):
+        if self.limiter is None:
+            return self._extract(posts)
+
+        with self.limiter.slot():
+            return self._extract(posts)
+
+    def extract(self, posts, fingerprint=None):
+        """
+        Returns the keywords of a list of post texts.
+        If the fingerprint of the post set is given, cached keywords are returned without calling the API.
+        Raises an exception if the API cannot be reached or answers with an error status, or a ResilienceError
+        if it is unavailable. Only successful responses are cached.
+        """
+        if self.cache is None or fingerprint is None:
+            return self._request(posts)
+
+        keywords = self.cache.get(fingerprint)
+        if keywords is None:
+            keywords = self._request(posts)
+            self.cache.put(fingerprint, keywords)
+
+        return keywords
@@ -0,0 +1,110 @@
+import json
+import sqlite3
+from threading import Lock
+
+import numpy as np
+
+ROW_DTYPE = np.dtype([('synonym_id', np.int64), ('seconds', np.int64), ('sentiment', np.float64),
+                      ('post_hash', np.uint64)])
+
+
+def post_hash(post_id):
+    """ 64-bit hash of a post id (hex or binary MD5 digest), 0 is reserved for near-duplicates. """
+    digest = bytes.fromhex(post_id[:16]) if isinstance(post_id, str) else bytes(post_id[:8])
+    return int.from_bytes(digest, 'little') or 1
+
+
+def extract_arrays(rows, from_time, chunk_size=100000):
+    """
+    Collects (synonym_id, date, sentiment, post id, is_representative) rows into a columnar
+    NumPy record array, with dates as seconds since from_time.
+    Near-duplicates get a post hash of 0, so they are counted but not part of any KWE fingerprint.
+    """
+    chunks = []
+    chunk = []
+    for synonym_id, date, sentiment, post_id, is_representative in rows:
+        chunk.append((synonym_id, int((date - from_time).total_seconds()), sentiment,
+                      post_hash(post_id) if is_representative else 0))
+
+        if len(chunk) == chunk_size:
+            chunks.append(np.array(chunk, dtype=ROW_DTYPE))
+            chunk = []
+
+    chunks.append(np.array(chunk, dtype=ROW_DTYPE))
+    return np.concatenate(chunks)
+
+
+def bucket_statistics(arrays, categories, interval_seconds):
+    """
+    Computes the snapshot statistics of every non-empty (synonym, interval) bucket at once.
+    Returns a dict of arrays aligned by bucket:
+    {
+        synonym_id : synonym of each bucket,
+        interval   : interval index of each bucket, counted from the start of the rebuild,
+        posts      : number of posts,
+        sentiment  : mean sentiment,
+        categories : { category : (number of posts, fingerprint of the representative post set) }
+    }
+    """
+    intervals = arrays['seconds'] // interval_seconds
+    num_intervals = int(intervals.max()) + 1 if len(intervals) else 1
+    keys = arrays['synonym_id'] * num_intervals + intervals
+
+    buckets, inverse = np.unique(keys, return_inverse=True)
+    posts = np.bincount(inverse, minlength=len(buckets))
+    sums = np.bincount(inverse, weights=arrays['sentiment'], minlength=len(buckets))
+
+    statistics = {'synonym_id': buckets // num_intervals, 'interval': buckets % num_intervals, 'posts': posts,
+                  'sentiment': sums / np.maximum(posts, 1), 'categories': {}}
+
+    sentiment = arrays['sentiment']
+    for sc in categories:
+        mask = (sentiment <= sc['upper_limit']) & (sentiment >= sc['lower_limit'])
+        counts = np.bincount(inverse[mask], minlength=len(buckets))
+
+        # Order independent fingerprint of the post set: the wrapping sum of the post hashes
+        fingerprints = np.zeros(len(buckets), dtype=np.uint64)
+        np.add.at(fingerprints, inverse[mask], arrays['post_hash'][mask])
+
+        statistics['categories'][sc['category']] = (counts, fingerprints)
+
+    return statistics
+
+
+class KeywordStore:
+    """
+    Keywords extracted by previous rebuilds, per synonym, interval start and category,
+    along with the fingerprint of the post set they were extracted from.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = Lock()
+        self.connection.execute('CREATE TABLE IF NOT EXISTS keywords (synonym_id INTEGER, spans_from TEXT, '
+                                'category TEXT, fingerprint TEXT, keywords TEXT, '
+                                'PRIMARY KEY (synonym_id, spans_from, category))')
+
+    def get(self, synonym_id, spans_from, category, fingerprint):
+        """ Returns the stored keywords if they were extracted from the same post set, otherwise None. """
+        with self.lock:
+            row = self.connection.execute('SELECT fingerprint, keywords FROM keywords '
+                                          'WHERE synonym_id = ? AND spans_from = ? AND category = ?',
+                                          (synonym_id, spans_from.isoformat(), category)).fetchone()
+        if row is None or row[0] != str(fingerprint):
+            return None
+
+        try:
+            return json.loads(row[1])
+        except ValueError:
+            # Stored by an earlier version as newline separated keywords, extracted again
+            return None
+
+    def put(self, synonym_id, spans_from, category, fingerprint, keywords):
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO keywords VALUES (?, ?, ?, ?, ?)',
+                                    (synonym_id, spans_from.isoformat(), category, str(fingerprint),
+                                     json.dumps(keywords)))
+            self.connection.commit()
+
+    def close(self):
+        self.connection.close()
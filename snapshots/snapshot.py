@@ -1,12 +1,14 @@
 import json
 from logging import getLogger
 
-import requests
+from util.resilience import ResilienceError, dependency
 
 
 class Snapshot:
     ISO_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
-    VALID_STATUS_CODES = {201, 409}
+    # 409: a snapshot of the interval already exists, the API does not replace it
+    CREATED, EXISTS = 201, 409
+    VALID_STATUS_CODES = {CREATED, EXISTS}
 
     def __init__(self, spans_from, spans_to, statistics, sentiment, synonym):
         self.spans_from = spans_from
@@ -16,6 +18,11 @@ class Snapshot:
         self.synonym = synonym
 
     def save_remotely(self):
+        """ Returns whether the snapshot is stored remotely, either by this call or an earlier one. """
+        return self.post() in self.VALID_STATUS_CODES
+
+    def post(self):
+        """ Posts the snapshot to the snapshot API, returning the status code, or None if it could not be reached. """
         data = {'from': self.spans_from.strftime(self.ISO_FORMAT),
                 'to': self.spans_to.strftime(self.ISO_FORMAT),
                 'statistics': json.dumps(self.statistics),
@@ -23,13 +30,16 @@ class Snapshot:
                 'synonym': self.synonym}
 
         try:
-            result = requests.post('http://172.28.198.101:8003/api/snapshots', json=data)
+            result = dependency('SNAPSHOT', timeout=10, max_concurrent=30).\
+                request('post', 'http://172.28.198.101:8003/api/snapshots', json=data)
 
-            if result.status_code in self.VALID_STATUS_CODES:
-                return True
-            else:
+            if result.status_code not in self.VALID_STATUS_CODES:
                 getLogger().info(f'Received status code {result.status_code} while saving snapshot for {self.synonym}.')
+
+            return result.status_code
+        except ResilienceError as e:
+            getLogger().warning(f'Snapshot API unavailable, snapshot for {self.synonym} not saved ({e}).')
         except Exception as e:
             print(f'Could not establish server contact ({e}).')
 
-        return False
+        return None
@@ -0,0 +1,105 @@
+from logging import getLogger
+from time import time
+
+import requests
+
+from util.resilience import dependency
+
+
+class SynonymSync:
+    """
+    Keeps a local copy of the gateway's synonym map up to date with conditional requests.
+    Every poll sends the ETag of the last response as If-None-Match and the last synonym
+    version as `since`, so the gateway can answer 304 Not Modified or with only the changes:
+    {
+        version : opaque version of the synonym map,
+        added   : { synonym : value },
+        removed : [ synonym ]
+    }
+    A gateway answering with the full { synonym : value } map is supported as well, the
+    changes are then computed locally.
+    Polling backs off exponentially while nothing changes or the gateway fails, and returns
+    to min_interval as soon as a change is received.
+    """
+
+    def __init__(self, api, api_key, min_interval=5.0, max_interval=300.0, session=None):
+        self.api = api
+        self.api_key = api_key
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.session = session or requests.Session()
+        self.dependency = dependency('GATEWAY', timeout=10, max_concurrent=4)
+
+        self.synonyms = {}
+        self.etag = None
+        self.version = None
+        self.interval = min_interval
+        self.next_poll = 0.0
+
+    def reset(self, synonyms):
+        """
+        Forgets the ETag and version, so that the next poll fetches the full synonym map
+        and reports its differences from the given synonyms, and makes the next poll due.
+        """
+        self.synonyms = {synonym: None for synonym in synonyms}
+        self.etag = None
+        self.version = None
+        self.interval = self.min_interval
+        self.next_poll = 0.0
+
+    def due(self):
+        return time() >= self.next_poll
+
+    def _request(self):
+        headers = dict(self.api_key)
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        params = {'since': self.version} if self.version is not None else {}
+
+        return self.dependency.call(self.session.get, self.api, headers=headers, params=params)
+
+    def _changes(self, body):
+        """ Returns the (added, removed) synonyms of a delta or full synonym map response. """
+        if 'added' in body or 'removed' in body:
+            added = body.get('added') or {}
+            removed = set(body.get('removed') or []) & set(self.synonyms)
+            self.version = body.get('version', self.version)
+        else:
+            added = {synonym: value for synonym, value in body.items() if self.synonyms.get(synonym) != value}
+            removed = set(self.synonyms) - set(body)
+
+        return added, removed
+
+    def poll(self, force=False):
+        """
+        Fetches the changes since the previous poll if the next poll is due.
+        Returns the (added, removed) synonyms, where added maps new or changed synonyms to their
+        value and removed is a set, or None if the synonyms did not change or could not be fetched.
+        """
+        if not force and not self.due():
+            return None
+
+        changes = None
+        try:
+            response = self._request()
+            if response.status_code != 304:
+                response.raise_for_status()
+                changes = self._changes(response.json())
+                self.etag = response.headers.get('ETag', self.etag)
+        except Exception as e:
+            getLogger().warning(f'SynonymSync.poll: Exception encountered with synonym api: {e}')
+
+        if changes and (changes[0] or changes[1]):
+            added, removed = changes
+            self.synonyms.update(added)
+            for synonym in removed:
+                del self.synonyms[synonym]
+
+            self.interval = self.min_interval
+        else:
+            changes = None
+            self.interval = min(self.interval * 2, self.max_interval)
+
+        self.next_poll = time() + self.interval
+
+        return changes
@@ -1,12 +1,16 @@
+from dbhandler import DBHandler
 from scrapers.trustpilot_crawler import TrustPilotCrawler
 from time import sleep
 
 if __name__ == "__main__":
     cr = TrustPilotCrawler()
+    # Posts are tagged with the database ids of the synonyms
+    local_db = DBHandler()
+    local_db.commit_synonyms(['apple', 'google', 'dsb', 'samsung'])
 
     # TODO: Bind the following to a "begin_crawl" endpoint.
     # To begin the crawler (should really only be done once), enter seed URLs like this:
-    cr.begin_crawl(['apple', 'google', 'dsb'])
+    cr.begin_crawl(local_db.get_synonym_ids(['apple', 'google', 'dsb']))
     # ... or by using the add_synonym method before calling begin_crawl.
 
     # TODO: Bind the following to a "track_new_synonym" endpoint.
@@ -14,7 +18,7 @@ if __name__ == "__main__":
     # The thread accesses a global synonym queue in the main thread that we can add elements
     # to whenever we want like this:
     sleep(5)
-    cr.add_synonym('samsung')
+    cr.add_synonym('samsung', local_db.get_synonym_ids(['samsung'])['samsung'])
 
     # TODO: Bind the following to a "get_crawled_data" enpoint.
     # Use the following method to retrieve all text data that has been crawled for a given
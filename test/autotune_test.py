@@ -0,0 +1,113 @@
+import threading
+import time
+import unittest
+
+from util.autotune import AIMDController, AdaptiveLimiter
+
+
+class LatencyStub:
+    """
+    Local stand-in for an external service, whose latency grows linearly with the batch size
+    and the number of concurrent calls beyond its capacity.
+    """
+
+    def __init__(self, base=0.1, per_item=0.001, capacity=4, per_extra_call=0.5, fail_above=None):
+        self.base = base
+        self.per_item = per_item
+        self.capacity = capacity
+        self.per_extra_call = per_extra_call
+        self.fail_above = fail_above
+
+    def latency(self, size=1, concurrency=1):
+        return self.base + self.per_item * size + self.per_extra_call * max(0, concurrency - self.capacity)
+
+    def fails(self, size):
+        return self.fail_above is not None and size > self.fail_above
+
+
+class AIMDControllerTestCase(unittest.TestCase):
+
+    def run_batches(self, controller, stub, calls=300):
+        values = []
+        for _ in range(calls):
+            controller.record(stub.latency(size=controller.value), error=stub.fails(controller.value))
+            values.append(controller.value)
+
+        return values
+
+    def test_batch_size_converges_under_target(self):
+        # 2s target with 0.1s + 1ms per post: about 1900 posts per batch
+        controller = AIMDController('SA batch size', initial=100, minimum=10, maximum=10000, latency_target=2,
+                                    increase=100, window=3)
+        values = self.run_batches(controller, LatencyStub())
+
+        settled = values[-60:]
+        self.assertLessEqual(max(settled), 2000)
+        self.assertGreaterEqual(sum(settled) / len(settled), 1000)
+        self.assertGreater(controller.metrics()['decreases'], 0)
+
+    def test_errors_decrease(self):
+        controller = AIMDController('SA batch size', initial=1000, minimum=10, maximum=10000, latency_target=60,
+                                    increase=100, window=3)
+        values = self.run_batches(controller, LatencyStub(fail_above=500))
+
+        self.assertLessEqual(max(values[-30:]), 600)
+        self.assertGreater(controller.metrics()['errors'], 0)
+
+    def test_bounds(self):
+        controller = AIMDController('KWE concurrency', initial=2, minimum=1, maximum=4, latency_target=1, window=1)
+        for _ in range(10):
+            controller.record(0.1)
+        self.assertEqual(controller.value, 4)
+
+        for _ in range(10):
+            controller.record(5)
+        self.assertEqual(controller.value, 1)
+
+    def test_concurrency_converges_to_capacity(self):
+        stub = LatencyStub(capacity=8, per_extra_call=1)
+        controller = AIMDController('KWE concurrency', initial=30, minimum=1, maximum=100, latency_target=1,
+                                    window=1)
+        for _ in range(200):
+            controller.record(stub.latency(concurrency=controller.value))
+
+        self.assertLessEqual(controller.value, 9)
+        self.assertGreaterEqual(controller.value, 4)
+
+    def test_measure_counts_exceptions(self):
+        controller = AIMDController('Snapshot workers', initial=10, minimum=1, maximum=30, latency_target=1, window=1)
+        with self.assertRaises(ValueError):
+            with controller.measure():
+                raise ValueError()
+
+        self.assertEqual(controller.value, 5)
+        self.assertEqual(controller.metrics()['errors'], 1)
+
+
+class AdaptiveLimiterTestCase(unittest.TestCase):
+
+    def test_limits_concurrency(self):
+        limiter = AdaptiveLimiter(AIMDController('KWE concurrency', initial=3, minimum=1, maximum=3,
+                                                 latency_target=10))
+        lock = threading.Lock()
+        in_flight = []
+        peak = []
+
+        def call():
+            with limiter.slot():
+                with lock:
+                    in_flight.append(1)
+                    peak.append(len(in_flight))
+                time.sleep(0.01)
+                with lock:
+                    in_flight.pop()
+
+        threads = [threading.Thread(target=call) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertLessEqual(max(peak), 3)
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertEqual(limiter.controller.metrics()['calls'], 12)
@@ -0,0 +1,36 @@
+import os
+import tempfile
+import unittest
+
+from util.bloomfilter import BloomFilter
+
+
+class BloomFilterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.bloom = BloomFilter(capacity=10000, error_rate=0.01)
+
+    def test_add_contains(self):
+        self.assertTrue(self.bloom.add('a3f1'))
+        self.assertFalse(self.bloom.add('a3f1'))
+        self.assertIn('a3f1', self.bloom)
+        self.assertEqual(len(self.bloom), 1)
+
+    def test_false_positive_rate(self):
+        for i in range(10000):
+            self.bloom.add(f'post-{i}')
+
+        false_positives = sum(f'other-{i}' in self.bloom for i in range(10000))
+        self.assertLess(false_positives, 200)
+
+    def test_save_load(self):
+        for i in range(100):
+            self.bloom.add(f'post-{i}')
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'seen.bloom')
+            self.bloom.save(path)
+            loaded = BloomFilter.load(path)
+
+        self.assertEqual(len(loaded), 100)
+        self.assertTrue(all(f'post-{i}' in loaded for i in range(100)))
@@ -0,0 +1,28 @@
+import unittest
+from datetime import datetime
+
+from snapshots.categories import *
+
+
+class RollupSpansTestCase(unittest.TestCase):
+
+    def test_aligned_span(self):
+        self.assertEqual(rollup_spans(datetime(2019, 1, 7), datetime(2019, 1, 14)),
+                         [('week', datetime(2019, 1, 7), datetime(2019, 1, 14))])
+        self.assertEqual(rollup_spans(datetime(2019, 1, 1, 5), datetime(2019, 1, 1, 6)),
+                         [('hour', datetime(2019, 1, 1, 5), datetime(2019, 1, 1, 6))])
+
+    def test_unaligned_edges(self):
+        # A week long span starting mid-day on a Wednesday cannot use the weekly buckets
+        self.assertEqual(rollup_spans(datetime(2019, 1, 2, 12), datetime(2019, 1, 9, 12)),
+                         [('hour', datetime(2019, 1, 2, 12), datetime(2019, 1, 3)),
+                          ('day', datetime(2019, 1, 3), datetime(2019, 1, 9)),
+                          ('hour', datetime(2019, 1, 9), datetime(2019, 1, 9, 12))])
+
+    def test_spans_cover_the_span(self):
+        spans = rollup_spans(datetime(2019, 1, 1, 5), datetime(2019, 1, 20, 3))
+        self.assertEqual([granularity for granularity, _, _ in spans], ['hour', 'day', 'week', 'day', 'hour'])
+        self.assertEqual(spans[0][1], datetime(2019, 1, 1, 5))
+        self.assertEqual(spans[-1][2], datetime(2019, 1, 20, 3))
+        for (_, _, end), (_, start, _) in zip(spans, spans[1:]):
+            self.assertEqual(end, start)
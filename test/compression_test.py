@@ -0,0 +1,27 @@
+import unittest
+
+from util.compression import *
+
+
+class TextCodecTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.text = 'The battery died after two days. ' * 20 + 'Ærligt talt, aldrig igen! 🙃'
+
+    def test_zlib_roundtrip(self):
+        codec = TextCodec('zlib')
+        compressed = codec.compress(self.text)
+        self.assertTrue(compressed.startswith(ZLIB))
+        self.assertLess(len(compressed), len(self.text))
+        self.assertEqual(codec.decompress(compressed), self.text)
+
+    def test_short_text_stored_raw(self):
+        codec = TextCodec('zlib')
+        compressed = codec.compress('lol')
+        self.assertEqual(compressed, RAW + b'lol')
+        self.assertEqual(codec.decompress(compressed), 'lol')
+
+    @unittest.skipIf(zstandard is None, 'zstandard is not installed')
+    def test_zstd_reads_zlib(self):
+        compressed = TextCodec('zlib').compress(self.text)
+        self.assertEqual(TextCodec('zstd').decompress(compressed), self.text)
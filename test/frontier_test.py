@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+
+from util.frontier import *
+
+
+class CrawlFrontierTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.frontier = CrawlFrontier()
+        self.frontier.add_synonym('apple', priority=2, urls=['a1', 'a2'])
+        self.frontier.add_synonym('google', urls=['g1'])
+
+    def test_queue_is_unique_fifo(self):
+        queue = FrontierQueue(['x', 'y'])
+        self.assertFalse(queue.put('x'))
+        self.assertEqual(queue.get(), 'x')
+        self.assertTrue(queue.put('x'))
+        self.assertEqual(list(queue), ['y', 'x'])
+
+    def test_priorities(self):
+        visits = [self.frontier.next_synonym() for _ in range(30)]
+        self.assertEqual(visits.count('apple'), 2 * visits.count('google'))
+
+    def test_remove_synonym(self):
+        self.frontier.remove_synonym('google')
+        self.assertEqual({self.frontier.next_synonym() for _ in range(5)}, {'apple'})
+        self.assertIsNone(self.frontier.get('google'))
+
+    def test_readded_synonym_keeps_its_share(self):
+        # The removed synonym's heap entry is left behind while the others move on
+        self.frontier.remove_synonym('google')
+        for _ in range(30):
+            self.frontier.next_synonym()
+        self.frontier.add_synonym('google', urls=['g1'])
+
+        visits = [self.frontier.next_synonym() for _ in range(30)]
+        self.assertEqual(visits.count('apple'), 2 * visits.count('google'))
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'frontier.sqlite')
+            self.frontier.save(path)
+            restored = CrawlFrontier.load(path)
+
+        self.assertEqual(restored.synonyms(), {'apple', 'google'})
+        self.assertEqual(restored.get('apple'), 'a1')
+        self.assertEqual(restored.get('apple'), 'a2')
+        self.assertIsNone(restored.get('apple'))
+        self.assertEqual(restored.priorities['apple'], 2)
@@ -0,0 +1,108 @@
+import json
+import os
+import tempfile
+import unittest
+
+import requests
+
+from snapshots.kwe import *
+
+
+class StubExtractor(KeywordExtractor):
+    """ KeywordExtractor counting its API calls instead of making them. """
+
+    def __init__(self, cache):
+        super().__init__(api='http://localhost/', api_key='key', cache=cache)
+        self.calls = 0
+
+    def _extract(self, posts):
+        self.calls += 1
+        return sorted(set(' '.join(posts).split()))[:5]
+
+
+class FakeDependency:
+    """ Answers every request with the given status code and JSON body. """
+
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def request(self, method, url, **kwargs):
+        response = requests.Response()
+        response.status_code = self.status_code
+        response._content = json.dumps(self.body).encode('utf8')
+        response.url = url
+        return response
+
+
+class KeywordCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'kwe_cache.sqlite')
+
+    def fingerprint(self, ids, category='positive', sample_size=5000, seed='apple@2019-01-01T00:00:00'):
+        fingerprint = PostSetFingerprint(category, sample_size, seed)
+        for post_id in ids:
+            fingerprint.add(post_id)
+
+        return fingerprint.hexdigest()
+
+    def test_fingerprint(self):
+        ids = ['a' * 32, 'b' * 32, 'c' * 32]
+        self.assertEqual(self.fingerprint(ids), self.fingerprint(reversed(ids)))
+        self.assertEqual(self.fingerprint(ids), self.fingerprint([bytes.fromhex(post_id) for post_id in ids]))
+        self.assertNotEqual(self.fingerprint(ids), self.fingerprint(ids, category='negative'))
+        self.assertNotEqual(self.fingerprint(ids), self.fingerprint(ids[:2]))
+        # Samples of a different size or seed are different KWE inputs
+        self.assertNotEqual(self.fingerprint(ids), self.fingerprint(ids, sample_size=1000))
+        self.assertNotEqual(self.fingerprint(ids), self.fingerprint(ids, seed='google@2019-01-01T00:00:00'))
+
+    def test_extract_cached(self):
+        extractor = StubExtractor(KeywordCache(self.path))
+        fingerprint = self.fingerprint(['a' * 32])
+
+        keywords = extractor.extract(['great battery'], fingerprint)
+        self.assertEqual(extractor.extract(['great battery'], fingerprint), keywords)
+        self.assertEqual(extractor.calls, 1)
+
+        extractor.extract(['great battery'])
+        self.assertEqual(extractor.calls, 2)
+
+        metrics = extractor.cache.metrics()
+        self.assertEqual((metrics['hits'], metrics['misses'], metrics['entries']), (1, 1, 1))
+
+    def test_error_not_cached(self):
+        extractor = KeywordExtractor(api='http://localhost/', api_key='key', cache=KeywordCache(self.path))
+        extractor.dependency = FakeDependency(503, {'error': 'overloaded'})
+        fingerprint = self.fingerprint(['a' * 32])
+
+        with self.assertRaises(requests.HTTPError):
+            extractor.extract(['great battery'], fingerprint)
+        self.assertIsNone(extractor.cache.get(fingerprint))
+
+        extractor.dependency = FakeDependency(200, {'keywords': ['battery']})
+        self.assertEqual(extractor.extract(['great battery'], fingerprint), ['battery'])
+        self.assertEqual(extractor.cache.get(fingerprint), ['battery'])
+
+    def test_persistent(self):
+        cache = KeywordCache(self.path)
+        cache.put('fingerprint', ['battery', 'screen'])
+        cache.close()
+
+        cache = KeywordCache(self.path)
+        self.assertEqual(cache.get('fingerprint'), ['battery', 'screen'])
+        self.assertEqual(cache.metrics()['entries'], 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = KeywordCache(self.path, max_entries=2)
+        cache.put('first', ['a'])
+        cache.put('second', ['b'])
+        cache.get('first')
+        cache.put('third', ['c'])
+
+        self.assertIsNone(cache.get('second'))
+        self.assertEqual(cache.get('first'), ['a'])
+        self.assertEqual(cache.get('third'), ['c'])
+        self.assertEqual(cache.metrics()['evictions'], 1)
+        self.assertEqual(cache.metrics()['entries'], 2)
+
@@ -0,0 +1,51 @@
+import datetime
+import unittest
+from threading import Event
+
+from scrapers.parsing import *
+
+
+class ParsingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.raw = {'id': 't1_abc', 'created_utc': 0, 'subreddit': 'all', 'author': 'theuser',
+                    'body': '<div class="md"><p>My new <b>Google</b> phone, is great!</p></div>'}
+
+    def test_match_synonyms(self):
+        res = match_synonyms('I love my Google, phone.', {'google', 'apple'})
+        self.assertEqual(res, {'google'})
+
+    def test_parse_reddit_entry(self):
+        res = parse_reddit_entry(self.raw, {'google': 3, 'apple': 7})
+        self.assertEqual(res.synonym_ids, (3,))
+        self.assertEqual(res.text, 'My new Google phone, is great!')
+        self.assertEqual(res.date, datetime.datetime(1970, 1, 1))
+
+    def test_parse_reddit_entry_no_match(self):
+        self.assertIsNone(parse_reddit_entry(self.raw, {'apple': 7}))
+
+    def test_parsing_pool_batch(self):
+        pool = ParsingPool(workers=2, batch_size=2)
+        done = Event()
+        results = []
+
+        def callback(records):
+            results.extend(records)
+            done.set()
+
+        pool.submit_reddit_batch([self.raw, dict(self.raw, id='t1_def', body='<p>apple</p>')], {'google': 3}, callback)
+        self.assertTrue(done.wait(30))
+        pool.shutdown()
+
+        self.assertEqual([record.id for record in results], ['t1_abc'])
+
+    def test_parsing_pool_failed_batch(self):
+        pool = ParsingPool(workers=1, batch_size=1, retries=1)
+        results = []
+
+        # An entry without a body fails in the worker, is retried, and is then reported
+        handled = pool.submit_reddit_batch([{'id': 't1_bad'}], {'google': 3}, results.extend)
+        self.assertRaises(KeyError, handled.result, 30)
+        pool.shutdown()
+
+        self.assertEqual(results, [])
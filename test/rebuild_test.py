@@ -0,0 +1,55 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+from snapshots.categories import SENTIMENT_CATEGORIES
+from snapshots.rebuild import *
+
+
+class RebuildTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.start = datetime.datetime(2019, 1, 1)
+        hour = datetime.timedelta(hours=1)
+        self.rows = [(1, self.start, 0.9, 'a' * 32, True),
+                     (1, self.start + hour / 2, 0.1, 'b' * 32, True),
+                     (1, self.start + hour / 2, 0.1, 'c' * 32, False),
+                     (2, self.start, 0.5, 'd' * 32, True),
+                     (1, self.start + hour * 2, 0.7, 'e' * 32, True)]
+
+    def statistics(self, rows):
+        return bucket_statistics(extract_arrays(rows, self.start), SENTIMENT_CATEGORIES, 3600)
+
+    def test_bucket_statistics(self):
+        statistics = self.statistics(self.rows)
+        buckets = list(zip(statistics['synonym_id'], statistics['interval'], statistics['posts']))
+        self.assertEqual(buckets, [(1, 0, 3), (1, 2, 1), (2, 0, 1)])
+        self.assertAlmostEqual(statistics['sentiment'][0], 1.1 / 3)
+
+        positive, _ = statistics['categories']['positive']
+        negative, _ = statistics['categories']['negative']
+        neutral, _ = statistics['categories']['neutral']
+        self.assertEqual(list(positive), [1, 1, 0])
+        self.assertEqual(list(negative), [2, 0, 0])
+        self.assertEqual(list(neutral), [0, 0, 1])
+
+    def test_fingerprint_ignores_duplicates_and_order(self):
+        _, before = self.statistics(self.rows)['categories']['negative']
+        _, after = self.statistics(list(reversed(self.rows[:2])))['categories']['negative']
+        self.assertEqual(before[0], after[0])
+
+        _, changed = self.statistics(self.rows[:1] + [(1, self.start, 0.1, 'f' * 32, True)])['categories']['negative']
+        self.assertNotEqual(before[0], changed[0])
+
+    def test_keyword_store(self):
+        path = os.path.join(tempfile.mkdtemp(), 'keywords.db')
+        store = KeywordStore(path)
+        store.put(1, self.start, 'positive', 42, ['battery', 'screen\nsize'])
+        self.assertEqual(store.get(1, self.start, 'positive', 42), ['battery', 'screen\nsize'])
+        store.put(1, self.start, 'neutral', 42, [])
+        self.assertEqual(store.get(1, self.start, 'neutral', 42), [])
+        self.assertIsNone(store.get(1, self.start, 'positive', 43))
+        self.assertIsNone(store.get(1, self.start, 'negative', 42))
+        store.close()
+
@@ -0,0 +1,52 @@
+import os
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+
+from scrapers.reddit_scraper import *
+
+
+class FakeParsingPool:
+    """ Parses batches synchronously, recording their sizes. """
+    batch_size = 3
+
+    def __init__(self):
+        self.batches = []
+
+    def submit_reddit_batch(self, raws, synonyms, callback):
+        self.batches.append(len(raws))
+        callback([raw['id'] for raw in raws])
+
+        handled = Future()
+        handled.set_result(len(raws))
+        return handled
+
+
+class RedditScraperTestCase(unittest.TestCase):
+
+    def setUp(self):
+        with mock.patch.dict(os.environ, {'REDDIT_CLIENT_ID': 'id', 'REDDIT_CLIENT_SECRET': 'secret'}):
+            self.scraper = RedditScraper(parser=FakeParsingPool())
+
+    def raw(self, id):
+        return {'id': id, 'created_utc': 0, 'subreddit': 'all', 'author': 'theuser', 'body': 'google'}
+
+    def test_full_batches_are_shipped(self):
+        for i in range(4):
+            self.scraper._process_raw(self.raw(f't1_{i}'))
+
+        self.assertEqual(self.scraper.parser.batches, [3])
+        self.assertEqual(self.scraper.pending, [self.raw('t1_3')])
+
+    def test_pending_entries_are_flushed(self):
+        self.scraper._process_raw(self.raw('t1_a'))
+
+        # A quiet stream is flushed once the oldest pending entry is old enough
+        self.assertEqual(self.scraper.get_buffer_contents(), [])
+        self.scraper.pending_since -= RedditScraper.PENDING_MAX_AGE
+        self.assertEqual(self.scraper.get_buffer_contents(), ['t1_a'])
+
+        # Stopping flushes whatever is pending
+        self.scraper._process_raw(self.raw('t1_b'))
+        self.scraper.stop()
+        self.assertEqual(self.scraper.get_buffer_contents(), ['t1_b'])
@@ -0,0 +1,61 @@
+import asyncio
+import unittest
+
+from scrapers.reddit_stream import AsyncRedditIngestor
+
+
+class FakeStreamSource:
+    """ Local stream source serving pages of entries, optionally dropping the connection once. """
+
+    def __init__(self, pages, fail_at=None):
+        self.pages = pages
+        self.fail_at = fail_at
+        self.calls = []
+
+    async def fetch(self, before):
+        self.calls.append(before)
+
+        if len(self.calls) == self.fail_at:
+            raise ConnectionError('stream dropped')
+
+        return self.pages.pop(0) if self.pages else []
+
+
+def entry(fullname):
+    return {'id': fullname[3:], 'fullname': fullname}
+
+
+class AsyncRedditIngestorTestCase(unittest.TestCase):
+
+    def run_ingestor(self, sources, processed, polls):
+        ingestor = AsyncRedditIngestor(sources, processed.append, poll_interval=0, max_delay=0)
+
+        async def stop_after_polls():
+            while any(len(source.calls) < polls for source in sources.values()):
+                await asyncio.sleep(0)
+            ingestor.stop()
+
+        async def main():
+            await asyncio.gather(ingestor.run(), stop_after_polls())
+
+        asyncio.run(main())
+        return ingestor
+
+    def test_dedupes_across_shards(self):
+        processed = []
+        sources = {'all': FakeStreamSource([[entry('t1_a'), entry('t1_b')]]),
+                   'apple': FakeStreamSource([[entry('t1_b'), entry('t1_c')]])}
+
+        ingestor = self.run_ingestor(sources, processed, polls=3)
+
+        self.assertEqual(sorted(raw['fullname'] for raw in processed), ['t1_a', 't1_b', 't1_c'])
+        self.assertEqual(ingestor.duplicates, 1)
+
+    def test_resumes_from_last_fullname(self):
+        processed = []
+        source = FakeStreamSource([[entry('t1_a'), entry('t1_b')], [entry('t1_c')]], fail_at=2)
+
+        self.run_ingestor({'all': source}, processed, polls=4)
+
+        self.assertEqual([raw['fullname'] for raw in processed], ['t1_a', 't1_b', 't1_c'])
+        self.assertEqual(source.calls[:4], [None, 't1_b', 't1_b', 't1_c'])
@@ -0,0 +1,79 @@
+import datetime
+import unittest
+from unittest import mock
+
+from rescore import Rescorer
+
+
+class FakeDB:
+    """ Keeps posts and rescore checkpoints in memory, with the keyset semantics of DBHandler. """
+
+    def __init__(self, posts):
+        self.posts = posts
+        self.sentiments = {}
+        self.checkpoints = {}
+
+    def count_unscored(self, limit):
+        return 0
+
+    def get_rescore_checkpoint(self, job):
+        return self.checkpoints.get(job, (None, 0))
+
+    def get_rescore_chunk(self, from_time, to_time, after=None, limit=1000):
+        posts = sorted((post for post in self.posts if from_time <= post[1] < to_time),
+                       key=lambda post: (post[1], post[0]))
+        if after is not None:
+            posts = [post for post in posts if (post[1], post[0]) > after]
+
+        return posts[:limit]
+
+    def rescore_sentiments(self, job, sentiments, last_key):
+        for item in sentiments:
+            self.sentiments[item['id']] = item['sentiment']
+
+        self.checkpoints[job] = (last_key, self.checkpoints.get(job, (None, 0))[1] + len(sentiments))
+
+    def rebuild_rollups(self, from_time, to_time):
+        pass
+
+
+class FakeSentimentWorker:
+
+    def __init__(self):
+        self.scored = []
+
+    def calculate_sentiments(self, posts):
+        self.scored.extend(posts)
+        return [{'id': post_id, 'sentiment': 0.5} for post_id in posts]
+
+
+class RescoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        start = datetime.datetime(2019, 1, 1)
+        # Ids are deliberately not in date order, so a swapped (id, date) key breaks paging
+        self.posts = [(f'{9 - i:032x}', start + datetime.timedelta(hours=i // 2), f'post {i}') for i in range(10)]
+        self.db = FakeDB(self.posts)
+        self.from_time = start
+        self.to_time = start + datetime.timedelta(days=1)
+
+    def rescorer(self, job='job'):
+        with mock.patch('rescore.DBHandler', return_value=self.db), \
+                mock.patch('rescore.SentimentWorker', return_value=FakeSentimentWorker()):
+            return Rescorer(job, self.from_time, self.to_time, chunk_size=3, concurrency=2)
+
+    def test_pages_through_chunks(self):
+        rescorer = self.rescorer()
+        self.assertEqual(rescorer.run(), 10)
+        self.assertEqual(sorted(rescorer.sentiment_worker.scored), sorted(post[0] for post in self.posts))
+
+        last = max(self.posts, key=lambda post: (post[1], post[0]))
+        self.assertEqual(self.db.checkpoints['job'], ((last[1], last[0]), 10))
+
+    def test_resumes_from_checkpoint(self):
+        ordered = sorted(self.posts, key=lambda post: (post[1], post[0]))
+        self.db.checkpoints['job'] = ((ordered[3][1], ordered[3][0]), 4)
+
+        rescorer = self.rescorer()
+        self.assertEqual(rescorer.run(), 10)
+        self.assertEqual(rescorer.sentiment_worker.scored, [post[0] for post in ordered[4:]])
@@ -0,0 +1,98 @@
+import threading
+import unittest
+
+from util.resilience import *
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeResponse:
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+def fail(timeout):
+    raise IOError('connection refused')
+
+
+class DependencyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.dependency = Dependency('KWE', timeout=5, max_concurrent=2, max_wait=0, failure_threshold=3,
+                                     recovery_timeout=30, clock=self.clock)
+
+    def test_passes_timeout(self):
+        self.assertEqual(self.dependency.call(lambda timeout: timeout), 5)
+        self.assertEqual(self.dependency.call(lambda timeout: timeout, timeout=1), 1)
+
+    def test_connection_pool_fits_bulkhead(self):
+        dependency = Dependency('KWE', max_concurrent=30)
+        adapter = dependency.session.get_adapter('http://localhost/')
+        self.assertEqual(adapter.poolmanager.connection_pool_kw['maxsize'], 30)
+
+    def test_circuit_opens_and_recovers(self):
+        for _ in range(3):
+            with self.assertRaises(IOError):
+                self.dependency.call(fail)
+        self.assertEqual(self.dependency.breaker.state, CircuitBreaker.OPEN)
+
+        with self.assertRaises(CircuitOpenError):
+            self.dependency.call(lambda timeout: FakeResponse(200))
+
+        # A failed probe reopens the circuit
+        self.clock.now = 30
+        with self.assertRaises(IOError):
+            self.dependency.call(fail)
+        with self.assertRaises(CircuitOpenError):
+            self.dependency.call(lambda timeout: FakeResponse(200))
+
+        self.clock.now = 60
+        self.assertEqual(self.dependency.call(lambda timeout: FakeResponse(200)).status_code, 200)
+        self.assertEqual(self.dependency.breaker.state, CircuitBreaker.CLOSED)
+
+        metrics = self.dependency.metrics()
+        self.assertEqual(metrics['failures'], 4)
+        self.assertEqual(metrics['rejected_open'], 2)
+
+    def test_server_errors_count_as_failures(self):
+        for _ in range(3):
+            self.assertEqual(self.dependency.call(lambda timeout: FakeResponse(503)).status_code, 503)
+        self.assertEqual(self.dependency.breaker.state, CircuitBreaker.OPEN)
+
+    def test_client_errors_do_not_open(self):
+        for _ in range(5):
+            self.dependency.call(lambda timeout: FakeResponse(409))
+        self.assertEqual(self.dependency.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_bulkhead(self):
+        started = threading.Barrier(3)
+        release = threading.Event()
+
+        def hang(timeout):
+            started.wait()
+            release.wait()
+
+        threads = [threading.Thread(target=self.dependency.call, args=[hang]) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        started.wait()
+
+        with self.assertRaises(BulkheadFullError):
+            self.dependency.call(lambda timeout: None)
+        self.assertEqual(self.dependency.metrics()['in_flight'], 2)
+
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.dependency.metrics()['rejected_full'], 1)
+        self.assertEqual(self.dependency.breaker.state, CircuitBreaker.CLOSED)
+
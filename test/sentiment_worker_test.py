@@ -0,0 +1,124 @@
+import datetime
+import os
+import threading
+import unittest
+import uuid
+from unittest import mock
+
+from sentiment_worker import SentimentWorker
+
+
+class FakeDB:
+    """ Leases posts in memory like DBHandler.claim_new_posts, one batch at a time. """
+
+    def __init__(self, posts):
+        self.unclaimed = dict(posts)
+        self.leases = {}
+        self.scored = {}
+        self.lock = threading.Lock()
+
+    def claim_new_posts(self, worker, limit, lease):
+        with self.lock:
+            claimed = list(self.unclaimed.items())[:limit]
+            for post_id, _ in claimed:
+                del self.unclaimed[post_id]
+                self.leases[post_id] = worker
+
+            return claimed
+
+    def complete_claimed_posts(self, worker, sentiments):
+        with self.lock:
+            completed = [item for item in sentiments if self.leases.get(item['id']) == worker]
+            for item in completed:
+                self.scored[item['id']] = worker
+                del self.leases[item['id']]
+
+            return len(completed)
+
+    def release_claimed_posts(self, worker, post_ids):
+        with self.lock:
+            for post_id in post_ids:
+                if self.leases.get(post_id) == worker:
+                    del self.leases[post_id]
+                    self.unclaimed[post_id] = 'released'
+
+
+class SentimentWorkerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.db = FakeDB((f'{i:032x}', f'post {i}') for i in range(10))
+
+    def worker(self, name, sentiments):
+        with mock.patch('sentiment_worker.DBHandler', return_value=self.db), \
+                mock.patch.dict(os.environ, {'SA_API_HOST': 'localhost', 'SA_API_KEY': 'key'}):
+            worker = SentimentWorker(worker=name, batch_size=3)
+
+        worker.calculate_sentiments = lambda posts: sentiments(posts)
+        return worker
+
+    def test_failed_batch_is_released(self):
+        worker = self.worker('a', lambda posts: [])
+
+        self.assertEqual(worker.score_batch(), 3)
+        self.assertEqual(worker.consecutive_failures, 1)
+        self.assertEqual(self.db.leases, {})
+        self.assertEqual(len(self.db.unclaimed), 10)
+
+    def test_success_resets_failures(self):
+        worker = self.worker('a', lambda posts: [{'id': post_id, 'sentiment': 0.5} for post_id in posts])
+        worker.consecutive_failures = 2
+
+        self.assertEqual(worker.score_batch(), 3)
+        self.assertEqual(worker.consecutive_failures, 0)
+        self.assertEqual(len(self.db.scored), 3)
+
+
+@unittest.skipUnless(os.environ.get('CLAIM_TEST_DATABASE'),
+                     'set CLAIM_TEST_DATABASE to run against the scratch database configured by DB_HOST etc.')
+class ClaimNewPostsTestCase(unittest.TestCase):
+    """ Two workers claiming concurrently from Postgres get disjoint batches. """
+
+    def setUp(self):
+        from dbhandler import DBHandler
+
+        self.db = DBHandler()
+        self.synonym = f'claim-test-{uuid.uuid4().hex[:8]}'
+        self.db.commit_synonyms([self.synonym])
+        synonym_id = self.db.get_synonym_ids([self.synonym])[self.synonym]
+
+        self.ids = set()
+        for i in range(50):
+            unique_id = f'{self.synonym}-{i}'
+            self.db.commit_reddit(unique_id, (synonym_id,), f'post {i}', 'theuser', 'all', datetime.datetime.utcnow())
+            self.ids.add(self.db.hash_identifier(unique_id))
+
+    def tearDown(self):
+        from database import Post, RedditPost, Synonym, SynonymPostAssociation, session_scope
+
+        with session_scope() as session:
+            session.query(SynonymPostAssociation).filter(SynonymPostAssociation.post_id.in_(self.ids)).\
+                delete(synchronize_session=False)
+            session.query(RedditPost).filter(RedditPost.id.in_(self.ids)).delete(synchronize_session=False)
+            session.query(Post).filter(Post.id.in_(self.ids)).delete(synchronize_session=False)
+            session.query(Synonym).filter(Synonym.name == self.synonym).delete(synchronize_session=False)
+
+    def test_claims_are_disjoint(self):
+        claims = {'a': [], 'b': []}
+        start = threading.Barrier(2)
+
+        def claim(worker):
+            start.wait()
+            while True:
+                posts = self.db.claim_new_posts(worker, 5)
+                if not posts:
+                    return
+                claims[worker] += [post_id for post_id, _ in posts if post_id in self.ids]
+
+        threads = [threading.Thread(target=claim, args=[worker]) for worker in claims]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertFalse(set(claims['a']) & set(claims['b']))
+        self.assertEqual(set(claims['a']) | set(claims['b']), self.ids)
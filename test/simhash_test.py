@@ -0,0 +1,42 @@
+import unittest
+
+from util.simhash import *
+
+
+class SimHashTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.text = 'Ordered a new phone from this store and the battery broke after two days, never again'
+
+    def test_simhash_near_duplicate(self):
+        distance = bin(simhash(self.text) ^ simhash(self.text.upper() + '!!')).count('1')
+        self.assertEqual(distance, 0)
+
+    def test_simhash_empty(self):
+        self.assertIsNone(simhash('!!! ...'))
+
+    def test_index_find(self):
+        index = SimHashIndex(max_distance=3)
+        index.add(simhash(self.text), 'representative')
+
+        self.assertEqual(index.find(simhash(self.text) ^ 0b101), 'representative')
+        self.assertIsNone(index.find(simhash('Great support, they refunded my order within an hour')))
+
+    def test_index_tags(self):
+        index = SimHashIndex(max_distance=3)
+        index.add(simhash(self.text), 'apple', tags=[1])
+        index.add(simhash(self.text), 'apple and tesla', tags=[1, 2])
+
+        self.assertIn(index.find(simhash(self.text), [1]), {'apple', 'apple and tesla'})
+        self.assertEqual(index.find(simhash(self.text), [2]), 'apple and tesla')
+        self.assertIsNone(index.find(simhash(self.text), [3]))
+
+    def test_index_eviction(self):
+        index = SimHashIndex(max_size=2)
+        fingerprints = [0x00000000FFFFFFFF, 0xFFFFFFFF00000000, 0xFFFF0000FFFF0000]
+        for key, fingerprint in enumerate(fingerprints):
+            index.add(fingerprint, key)
+
+        self.assertEqual(len(index), 2)
+        self.assertIsNone(index.find(fingerprints[0]))
+        self.assertEqual(index.find(fingerprints[2]), 2)
@@ -0,0 +1,27 @@
+import random
+import unittest
+
+from util.streaming import *
+
+
+class HashSampleTestCase(unittest.TestCase):
+
+    def sample(self, keys, seed='apple@2019-01-01T00:00:00'):
+        sample = HashSample(10, seed)
+        for key in keys:
+            sample.add(key, f'post {key}')
+
+        return sample
+
+    def test_independent_of_order(self):
+        keys = [f'{i:032x}' for i in range(100)]
+        shuffled = random.Random(1).sample(keys, len(keys))
+
+        sample = self.sample(keys)
+        self.assertEqual(sample.items, self.sample(shuffled).items)
+        self.assertEqual(len(sample.items), 10)
+        self.assertEqual(sample.count, 100)
+
+    def test_seed_changes_sample(self):
+        keys = [f'{i:032x}' for i in range(100)]
+        self.assertNotEqual(self.sample(keys).items, self.sample(keys, 'apple@2019-01-01T01:00:00').items)
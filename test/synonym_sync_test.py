@@ -0,0 +1,84 @@
+import unittest
+
+from synonym_sync import SynonymSync
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, body=None, etag=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = {'ETag': etag} if etag else {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise IOError(f'HTTP {self.status_code}')
+
+    def json(self):
+        return self.body
+
+
+class FakeSession:
+    """ Replays a list of responses and records the headers and parameters of each request. """
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers, params, timeout):
+        self.requests.append((headers, params))
+        return self.responses.pop(0)
+
+
+class SynonymSyncTestCase(unittest.TestCase):
+
+    def sync(self, *responses):
+        self.session = FakeSession(responses)
+        return SynonymSync('http://gateway/api/synonyms', {'Authorization': 'key'}, min_interval=1,
+                           max_interval=8, session=self.session)
+
+    def test_full_map(self):
+        sync = self.sync(FakeResponse(200, {'apple': 1, 'tesla': 2}, etag='"a"'),
+                         FakeResponse(200, {'apple': 1, 'google': 3}, etag='"b"'))
+
+        self.assertEqual(sync.poll(), ({'apple': 1, 'tesla': 2}, set()))
+        self.assertEqual(sync.poll(force=True), ({'google': 3}, {'tesla'}))
+        self.assertEqual(self.session.requests[1][0]['If-None-Match'], '"a"')
+
+    def test_delta(self):
+        sync = self.sync(FakeResponse(200, {'version': 7, 'added': {'apple': 1, 'tesla': 2}, 'removed': []}),
+                         FakeResponse(200, {'version': 8, 'added': {}, 'removed': ['tesla', 'unknown']}))
+
+        sync.poll()
+        self.assertEqual(sync.poll(force=True), ({}, {'tesla'}))
+        self.assertEqual(self.session.requests[1][1], {'since': 7})
+        self.assertEqual(sync.synonyms, {'apple': 1})
+
+    def test_backoff(self):
+        sync = self.sync(FakeResponse(200, {'apple': 1}, etag='"a"'), FakeResponse(304), FakeResponse(304),
+                         FakeResponse(500), FakeResponse(304), FakeResponse(200, {'tesla': 2}))
+
+        sync.poll()
+        self.assertEqual(sync.interval, 1)
+        self.assertFalse(sync.due())
+        self.assertIsNone(sync.poll())
+
+        intervals = []
+        for _ in range(4):
+            self.assertIsNone(sync.poll(force=True))
+            intervals.append(sync.interval)
+        self.assertEqual(intervals, [2, 4, 8, 8])
+
+        self.assertEqual(sync.poll(force=True), ({'tesla': 2}, {'apple'}))
+        self.assertEqual(sync.interval, 1)
+
+    def test_reset(self):
+        sync = self.sync(FakeResponse(200, {'apple': 1, 'tesla': 2}, etag='"a"'))
+        sync.etag = '"old"'
+        sync.reset({'apple', 'google'})
+
+        self.assertTrue(sync.due())
+        added, removed = sync.poll()
+        self.assertNotIn('If-None-Match', self.session.requests[0][0])
+        self.assertEqual(removed, {'google'})
+        self.assertIn('tesla', added)
@@ -8,10 +8,13 @@ class TrustPilotTestCase(unittest.TestCase):
         self.crawler = TrustPilotCrawler()
 
     def test_use_synonyms(self):
-        synonyms = ['hello', 'google', 'apple', 'andy']
+        synonyms = {'hello': 1, 'google': 2, 'apple': 3, 'andy': 4}
         self.crawler.use_synonyms(synonyms)
         self.assertTrue(len(self.crawler.synonyms) > 0)
-        self.assertEqual(len(self.crawler.synonyms), len(self.crawler.synonym_queue.queue))
+        self.assertEqual(len(self.crawler.synonyms), len(self.crawler.frontier))
+
+    def test_use_synonyms_requires_ids(self):
+        self.assertRaises(TypeError, self.crawler.use_synonyms, ['hello', 'google'])
 
     def test_can_ping_yet(self):
         self.crawler.host_timer = time.time()
@@ -71,6 +74,9 @@ class TrustPilotTestCase(unittest.TestCase):
                   'review_count': 123
                   }
 
+        self.crawler.use_synonyms({'synonym': 4})
         self.crawler._process_entry('synonym', review)
         self.assertTrue(len(self.crawler.buffer) > 0)
-        self.assertEqual(self.crawler.buffer[0]['id'], "trustpilot-theuser-['1994', '05', '03']-123")
+        self.assertEqual(self.crawler.buffer[0].id, "trustpilot-theuser-['1994', '05', '03']-123")
+        self.assertEqual(self.crawler.buffer[0].synonym_ids, (4,))
+        self.assertEqual(self.crawler.buffer[0].text, 'this is the body')
@@ -0,0 +1,121 @@
+from contextlib import contextmanager
+from logging import getLogger
+from threading import Condition, Lock
+from time import perf_counter
+
+
+class AIMDController:
+    """
+    Feedback controller for a batch size or concurrency limit of an external service call.
+    The latency and outcome of every call are recorded, and once per window of calls the value is
+    increased additively while the mean latency stays under the target and few calls fail,
+    and decreased multiplicatively otherwise (additive increase, multiplicative decrease).
+    The value converges to the largest one the service handles within the latency target.
+    """
+
+    def __init__(self, name, initial, minimum, maximum, latency_target, increase=1, decrease=0.5,
+                 max_error_rate=0.1, window=5):
+        """
+        :param name: name of the tuned value in logs and metrics
+        :param latency_target: target mean latency of a call in seconds
+        :param increase: added to the value after a window within target
+        :param decrease: factor the value is multiplied by after a window over target or with failures
+        :param max_error_rate: fraction of failed calls in a window above which the value is decreased
+        :param window: number of calls between adjustments
+        """
+        self.name = name
+        self.value = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.increase = increase
+        self.decrease = decrease
+        self.max_error_rate = max_error_rate
+        self.window = window
+
+        self.lock = Lock()
+        self.latencies = []
+        self.errors = 0
+
+        self.calls = 0
+        self.failed_calls = 0
+        self.increases = 0
+        self.decreases = 0
+        self.last_latency = None
+        self.last_error_rate = None
+
+    def record(self, latency, error=False):
+        """ Records the latency in seconds and outcome of a call, adjusting the value at the end of a window. """
+        with self.lock:
+            self.calls += 1
+            self.failed_calls += error
+            self.latencies.append(latency)
+            self.errors += error
+
+            if len(self.latencies) >= self.window:
+                self._adjust()
+
+    def _adjust(self):
+        latency = sum(self.latencies) / len(self.latencies)
+        error_rate = self.errors / len(self.latencies)
+        self.latencies = []
+        self.errors = 0
+        self.last_latency = latency
+        self.last_error_rate = error_rate
+
+        old = self.value
+        if error_rate > self.max_error_rate or latency > self.latency_target:
+            self.value = max(self.minimum, int(self.value * self.decrease))
+            self.decreases += self.value != old
+        else:
+            self.value = min(self.maximum, self.value + self.increase)
+            self.increases += self.value != old
+
+        if self.value != old:
+            getLogger().info(f'{self.name}: {old} -> {self.value} (mean latency {latency:.2f}s, '
+                             f'target {self.latency_target:.2f}s, {error_rate:.0%} errors)')
+
+    @contextmanager
+    def measure(self):
+        """ Times the enclosed call, which counts as failed if it raises an exception. """
+        start = perf_counter()
+        try:
+            yield
+        except Exception:
+            self.record(perf_counter() - start, error=True)
+            raise
+
+        self.record(perf_counter() - start)
+
+    def metrics(self):
+        with self.lock:
+            return {'name': self.name, 'value': self.value, 'calls': self.calls, 'errors': self.failed_calls,
+                    'increases': self.increases, 'decreases': self.decreases, 'latency': self.last_latency,
+                    'error_rate': self.last_error_rate, 'latency_target': self.latency_target}
+
+
+class AdaptiveLimiter:
+    """
+    Limits the number of concurrent calls to a service to the value of an AIMDController,
+    which is fed the latency of every call made through the limiter.
+    """
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.in_flight = 0
+        self.condition = Condition()
+
+    @contextmanager
+    def slot(self):
+        """ Blocks until fewer calls than the current limit are in flight, then times the enclosed call. """
+        with self.condition:
+            self.condition.wait_for(lambda: self.in_flight < self.controller.value)
+            self.in_flight += 1
+
+        try:
+            with self.controller.measure():
+                yield
+        finally:
+            with self.condition:
+                self.in_flight -= 1
+                self.condition.notify_all()
@@ -0,0 +1,84 @@
+import hashlib
+import math
+import os
+import struct
+
+
+class BloomFilter:
+    """
+    Compact probabilistic set of string keys.
+    Membership tests never give false negatives, and give false positives with
+    a probability of roughly error_rate as long as no more than capacity keys are added.
+    """
+    _header = struct.Struct('<4sQQQQd')
+    _magic = b'BLM1'
+
+    def __init__(self, capacity=10000000, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _indexes(self, key):
+        # Double hashing over the two halves of a single digest
+        digest = hashlib.md5(key.encode('utf8') if isinstance(key, str) else key).digest()
+        h1, h2 = struct.unpack('<QQ', digest)
+        h2 |= 1
+
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, key):
+        """ Adds the key, returning False if it was (probably) present already. """
+        new = False
+        for index in self._indexes(key):
+            byte, bit = divmod(index, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                new = True
+
+        if new:
+            self.count += 1
+
+        return new
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[index >> 3] & (1 << (index & 7)) for index in self._indexes(key))
+
+    def __len__(self):
+        return self.count
+
+    def is_full(self):
+        return self.count >= self.capacity
+
+    def save(self, path):
+        """ Writes the filter to disk, replacing the file atomically. """
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(self._header.pack(self._magic, self.capacity, self.num_bits, self.num_hashes, self.count,
+                                      self.error_rate))
+            f.write(self.bits)
+
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            magic, capacity, num_bits, num_hashes, count, error_rate = cls._header.unpack(f.read(cls._header.size))
+            if magic != cls._magic:
+                raise ValueError(f'{path} is not a bloom filter snapshot')
+
+            bloom = cls.__new__(cls)
+            bloom.capacity = capacity
+            bloom.error_rate = error_rate
+            bloom.num_bits = num_bits
+            bloom.num_hashes = num_hashes
+            bloom.count = count
+            bloom.bits = bytearray(f.read())
+
+        if len(bloom.bits) != (num_bits + 7) // 8:
+            raise ValueError(f'{path} is truncated')
+
+        return bloom
@@ -0,0 +1,68 @@
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Every compressed value starts with a byte naming its codec, so codecs can be mixed in one column
+RAW = b'r'
+ZLIB = b'z'
+ZSTD = b's'
+
+
+class TextCodec:
+    """
+    Compresses texts with zlib, or zstd (optionally with a trained dictionary) if the
+    zstandard package is installed. Texts that do not get smaller are stored raw.
+    """
+
+    def __init__(self, codec='zlib', level=None, dictionary=None):
+        self.codec = codec
+
+        if codec == 'zstd':
+            if zstandard is None:
+                raise RuntimeError('The zstd codec requires the zstandard package.')
+
+            dictionary = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            self._compressor = zstandard.ZstdCompressor(level=level or 3, dict_data=dictionary)
+            self._decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+        elif codec == 'zlib':
+            self.level = 6 if level is None else level
+        else:
+            raise ValueError(f'Unknown codec {codec}')
+
+    def compress(self, text):
+        data = text.encode('utf8')
+
+        if self.codec == 'zstd':
+            header, compressed = ZSTD, self._compressor.compress(data)
+        else:
+            header, compressed = ZLIB, zlib.compress(data, self.level)
+
+        if len(compressed) >= len(data):
+            return RAW + data
+
+        return header + compressed
+
+    def decompress(self, value):
+        header, data = value[:1], value[1:]
+
+        if header == RAW:
+            return data.decode('utf8')
+        if header == ZLIB:
+            return zlib.decompress(data).decode('utf8')
+        if header == ZSTD:
+            if self.codec != 'zstd':
+                raise RuntimeError('Value is zstd compressed, but the codec is not zstd.')
+            return self._decompressor.decompress(data).decode('utf8')
+
+        raise ValueError(f'Unknown compression header {header}')
+
+
+def train_dictionary(samples, size=112640):
+    """ Trains a zstd dictionary on a list of sample texts, returning its bytes. """
+    if zstandard is None:
+        raise RuntimeError('Training a dictionary requires the zstandard package.')
+
+    return zstandard.train_dictionary(size, [sample.encode('utf8') for sample in samples]).as_bytes()
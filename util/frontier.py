@@ -0,0 +1,174 @@
+import heapq
+import os
+import sqlite3
+from collections import deque
+from threading import Lock
+
+
+class FrontierQueue:
+    """
+    FIFO queue of unique URLs backed by a deque and a set, with the same semantics
+    as OrderedSetQueue (putting a queued URL again is a no-op) but without a
+    three-element list per URL.
+    """
+    __slots__ = ('urls', 'queued')
+
+    def __init__(self, urls=()):
+        self.urls = deque()
+        self.queued = set()
+        for url in urls:
+            self.put(url)
+
+    def put(self, url):
+        if url in self.queued:
+            return False
+
+        self.urls.append(url)
+        self.queued.add(url)
+        return True
+
+    def get(self):
+        url = self.urls.popleft()
+        self.queued.discard(url)
+        return url
+
+    def empty(self):
+        return not self.urls
+
+    def __len__(self):
+        return len(self.urls)
+
+    def __contains__(self, url):
+        return url in self.queued
+
+    def __iter__(self):
+        return iter(self.urls)
+
+
+class CrawlFrontier:
+    """
+    Per-synonym URL queues, visited in proportion to the priority of each synonym
+    (stride scheduling: a synonym with priority 2 is visited twice as often as one with priority 1).
+    The frontier can be checkpointed to and restored from an SQLite file.
+    """
+
+    def __init__(self):
+        self.queues = {}  # synonym --> FrontierQueue
+        self.priorities = {}  # synonym --> priority
+        self.passes = {}  # synonym --> virtual time of its next visit
+        # synonym --> number of times it was added, entries of earlier additions are stale
+        self.generations = {}
+        self.schedule = []  # heap of (pass, synonym, generation), may contain stale entries
+        self.lock = Lock()
+
+    def add_synonym(self, synonym, priority=1, urls=()):
+        with self.lock:
+            if synonym in self.queues:
+                return False
+
+            # New synonyms start at the current virtual time, so they do not starve the others.
+            # Stale entries are dropped first, a removed synonym's entry would start it in the past.
+            self._drop_stale()
+            start = self.schedule[0][0] if self.schedule else 0.0
+            self.queues[synonym] = FrontierQueue(urls)
+            self.priorities[synonym] = priority
+            self.passes[synonym] = start
+            self.generations[synonym] = self.generations.get(synonym, 0) + 1
+            heapq.heappush(self.schedule, (start, synonym, self.generations[synonym]))
+            return True
+
+    def remove_synonym(self, synonym):
+        with self.lock:
+            self.queues.pop(synonym, None)
+            self.priorities.pop(synonym, None)
+            self.passes.pop(synonym, None)
+
+    def set_priority(self, synonym, priority):
+        with self.lock:
+            if synonym in self.priorities:
+                self.priorities[synonym] = priority
+
+    def put(self, synonym, url):
+        with self.lock:
+            queue = self.queues.get(synonym)
+            return queue.put(url) if queue is not None else False
+
+    def _is_stale(self, entry):
+        """ Whether the heap entry is of a removed synonym, or left over from before it was removed and added again. """
+        _, synonym, generation = entry
+        return synonym not in self.queues or self.generations[synonym] != generation
+
+    def _drop_stale(self):
+        while self.schedule and self._is_stale(self.schedule[0]):
+            heapq.heappop(self.schedule)
+
+    def next_synonym(self):
+        """ Returns the synonym to visit next and advances its schedule, or None if there are no synonyms. """
+        with self.lock:
+            self._drop_stale()
+            if not self.schedule:
+                return None
+
+            current, synonym, generation = heapq.heappop(self.schedule)
+            self.passes[synonym] = current + 1 / self.priorities[synonym]
+            heapq.heappush(self.schedule, (self.passes[synonym], synonym, generation))
+            return synonym
+
+    def get(self, synonym):
+        """ Returns the next URL of the synonym, or None if its queue is empty. """
+        with self.lock:
+            queue = self.queues.get(synonym)
+            return queue.get() if queue else None
+
+    def synonyms(self):
+        return set(self.queues)
+
+    def __contains__(self, synonym):
+        return synonym in self.queues
+
+    def __len__(self):
+        return len(self.queues)
+
+    def save(self, path):
+        """ Checkpoints the frontier to an SQLite file, replacing it atomically. """
+        temp_path = f'{path}.tmp'
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        with self.lock:
+            synonyms = [(synonym, self.priorities[synonym], self.passes[synonym]) for synonym in self.queues]
+            urls = [(synonym, position, url) for synonym, queue in self.queues.items()
+                    for position, url in enumerate(queue)]
+
+        connection = sqlite3.connect(temp_path)
+        try:
+            connection.execute('CREATE TABLE synonym (synonym TEXT PRIMARY KEY, priority REAL, pass REAL)')
+            connection.execute('CREATE TABLE url (synonym TEXT, position INTEGER, url TEXT)')
+            connection.executemany('INSERT INTO synonym VALUES (?, ?, ?)', synonyms)
+            connection.executemany('INSERT INTO url VALUES (?, ?, ?)', urls)
+            connection.commit()
+        finally:
+            connection.close()
+
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        frontier = cls()
+
+        connection = sqlite3.connect(path)
+        try:
+            for synonym, priority, current in connection.execute('SELECT synonym, priority, pass FROM synonym'):
+                frontier.queues[synonym] = FrontierQueue()
+                frontier.priorities[synonym] = priority
+                frontier.passes[synonym] = current
+                frontier.generations[synonym] = 1
+                frontier.schedule.append((current, synonym, 1))
+
+            for synonym, url in connection.execute('SELECT synonym, url FROM url ORDER BY synonym, position'):
+                frontier.queues[synonym].put(url)
+        finally:
+            connection.close()
+
+        heapq.heapify(frontier.schedule)
+        return frontier
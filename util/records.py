@@ -0,0 +1,57 @@
+class PostRecord:
+    """
+    A scraped post on its way from a scraper buffer to the database.
+    Records are slotted, so a buffered post costs its field values plus a few pointers
+    rather than a dict. Synonyms are held as a tuple of synonym ids, see synonym_ids.
+    """
+    __slots__ = ('id', 'synonym_ids', 'text', 'author', 'date', 'scraped_at')
+
+    def __init__(self, id, synonym_ids, text, author, date, scraped_at=None):
+        self.id = id
+        self.synonym_ids = synonym_ids
+        self.text = text
+        self.author = author
+        self.date = date
+        self.scraped_at = scraped_at
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {self.id}>'
+
+
+class RedditRecord(PostRecord):
+    __slots__ = ('subreddit',)
+
+    def __init__(self, id, synonym_ids, text, author, date, subreddit, scraped_at=None):
+        super().__init__(id, synonym_ids, text, author, date, scraped_at)
+        self.subreddit = subreddit
+
+
+class TrustpilotRecord(PostRecord):
+    __slots__ = ('num_ratings',)
+
+    def __init__(self, id, synonym_ids, text, author, date, num_ratings, scraped_at=None):
+        super().__init__(id, synonym_ids, text, author, date, scraped_at)
+        self.num_ratings = num_ratings
+
+
+class KwePost:
+    """ A scored post read for keyword extraction. """
+    __slots__ = ('id', 'content', 'sentiment')
+
+    def __init__(self, id, content, sentiment):
+        self.id = id
+        self.content = content
+        self.sentiment = sentiment
+
+
+def synonym_ids(synonyms):
+    """
+    Returns a copy of the dict of synonym name -> synonym id that posts are tagged with.
+    Names must be resolved to their database ids first, see DBHandler.get_synonym_ids, as posts
+    are committed under these ids. Raises a TypeError for bare synonym names.
+    """
+    if not isinstance(synonyms, dict):
+        raise TypeError(f'Expected a dict of synonym name -> synonym id, got {type(synonyms).__name__}; '
+                        f'resolve the names with DBHandler.get_synonym_ids')
+
+    return dict(synonyms)
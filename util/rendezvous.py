@@ -0,0 +1,13 @@
+import hashlib
+
+
+def _weight(node, key):
+    return hashlib.md5(f'{node}:{key}'.encode('utf8')).digest()
+
+
+def rendezvous_owner(key, nodes):
+    """
+    Returns the node owning the key using rendezvous (highest random weight) hashing.
+    When a node joins or leaves, only the keys it gains or loses change owner.
+    """
+    return max(nodes, key=lambda node: _weight(node, key), default=None)
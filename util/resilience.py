@@ -0,0 +1,191 @@
+import os
+from logging import getLogger
+from threading import BoundedSemaphore, Lock
+from time import monotonic
+
+import requests
+import requests.adapters
+
+
+class ResilienceError(Exception):
+    """ A call was rejected without reaching the dependency. """
+
+
+class CircuitOpenError(ResilienceError):
+    pass
+
+
+class BulkheadFullError(ResilienceError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast after failure_threshold consecutive failures (open), and lets a single
+    probe call through after recovery_timeout seconds (half open). A successful probe closes
+    the circuit again, a failed one reopens it.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30.0, clock=monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.clock = clock
+
+        self.lock = Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def allow(self):
+        """ Returns whether a call may be made now, claiming the probe if the circuit is half open. """
+        with self.lock:
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.recovery_timeout:
+                self._transition(self.HALF_OPEN)
+
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+
+            return False
+
+    def release_probe(self):
+        """ Hands back the probe of a half open circuit when the call could not be made. """
+        with self.lock:
+            self.probing = False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.probing = False
+            if self.state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+                if self.state != self.OPEN:
+                    self._transition(self.OPEN)
+
+    def _transition(self, state):
+        getLogger().warning(f'{self.name}: circuit {self.state} -> {state}')
+        self.state = state
+
+
+class Dependency:
+    """
+    Guards the calls to one external service with a per-call timeout, a bulkhead bounding the
+    number of concurrent calls, and a circuit breaker.
+    A call raising an exception or returning a response with a 5xx status counts as a failure.
+    Calls rejected by the circuit breaker or a full bulkhead raise a ResilienceError.
+    """
+
+    def __init__(self, name, timeout=30.0, max_concurrent=10, max_wait=None, failure_threshold=5,
+                 recovery_timeout=30.0, clock=monotonic):
+        """
+        :param timeout: seconds passed as the timeout of every call
+        :param max_concurrent: maximum number of calls in flight
+        :param max_wait: seconds to wait for a free slot in the bulkhead, None waits for the call timeout
+        """
+        self.name = name
+        self.timeout = timeout
+        self.max_concurrent = max_concurrent
+        self.max_wait = timeout if max_wait is None else max_wait
+        self.breaker = CircuitBreaker(name, failure_threshold, recovery_timeout, clock)
+        self.bulkhead = BoundedSemaphore(max_concurrent)
+        # The connection pool holds a connection for every call the bulkhead lets through
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_concurrent)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.lock = Lock()
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.rejected_open = 0
+        self.rejected_full = 0
+
+    def _count(self, counter, change=1):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + change)
+
+    def call(self, func, *args, **kwargs):
+        """ Calls func(*args, timeout=..., **kwargs) through the circuit breaker and bulkhead. """
+        if not self.breaker.allow():
+            self._count('rejected_open')
+            raise CircuitOpenError(f'{self.name} circuit is open')
+
+        if not self.bulkhead.acquire(timeout=self.max_wait):
+            self.breaker.release_probe()
+            self._count('rejected_full')
+            raise BulkheadFullError(f'{self.name} has {self.max_concurrent} calls in flight')
+
+        kwargs.setdefault('timeout', self.timeout)
+        self._count('in_flight')
+        self._count('calls')
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self._count('failures')
+            self.breaker.record_failure()
+            raise
+        finally:
+            self._count('in_flight', -1)
+            self.bulkhead.release()
+
+        if getattr(result, 'status_code', 0) >= 500:
+            self._count('failures')
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+        return result
+
+    def request(self, method, url, **kwargs):
+        """ Makes an HTTP request to the dependency, returning the response. """
+        return self.call(self.session.request, method, url, **kwargs)
+
+    def metrics(self):
+        with self.lock:
+            return {'name': self.name, 'state': self.breaker.state, 'in_flight': self.in_flight,
+                    'calls': self.calls, 'failures': self.failures, 'rejected_open': self.rejected_open,
+                    'rejected_full': self.rejected_full}
+
+
+_dependencies = {}
+_dependencies_lock = Lock()
+
+
+def dependency(name, **defaults):
+    """
+    Returns the Dependency shared by every caller of the named service, creating it on first use.
+    The defaults can be overridden with the environment variables <NAME>_TIMEOUT,
+    <NAME>_MAX_CONCURRENT, <NAME>_FAILURE_THRESHOLD and <NAME>_RECOVERY_TIMEOUT.
+    """
+    with _dependencies_lock:
+        if name not in _dependencies:
+            settings = dict(defaults)
+            for setting, parse in [('timeout', float), ('max_concurrent', int), ('failure_threshold', int),
+                                   ('recovery_timeout', float)]:
+                value = os.environ.get(f'{name}_{setting.upper()}')
+                if value:
+                    settings[setting] = parse(value)
+
+            _dependencies[name] = Dependency(name, **settings)
+
+        return _dependencies[name]
+
+
+def dependency_metrics():
+    with _dependencies_lock:
+        return [guarded.metrics() for guarded in _dependencies.values()]
@@ -0,0 +1,103 @@
+import hashlib
+import string
+from collections import OrderedDict
+
+_remove_table = str.maketrans({key: None for key in string.punctuation})
+
+# Maps a byte to an integer holding each of its bits in a separate 16-bit lane
+_spread = [sum(((byte >> bit) & 1) << (16 * bit) for bit in range(8)) for byte in range(256)]
+_MAX_FEATURES = 0xFFFF
+
+
+def _features(text, shingle_size):
+    tokens = [token for token in text.translate(_remove_table).lower().split() if token]
+    if len(tokens) < shingle_size:
+        return tokens
+
+    return [' '.join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)]
+
+
+def simhash(text, shingle_size=3):
+    """
+    Returns the 64-bit SimHash fingerprint of the normalized text, built from word shingles.
+    Texts differing in a few words get fingerprints differing in a few bits.
+    Returns None if the text is too short to fingerprint.
+    """
+    features = _features(text, shingle_size)
+    if not features:
+        return None
+
+    # Per-bit counters are packed into 16-bit lanes of one integer, so that each
+    # feature is counted with eight table lookups rather than 64 bit tests
+    features = features[:_MAX_FEATURES]
+    lanes = 0
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode('utf8'), digest_size=8).digest()
+        for byte_index, byte in enumerate(digest):
+            lanes += _spread[byte] << (128 * byte_index)
+
+    counts = [(lanes >> (16 * bit)) & 0xFFFF for bit in range(64)]
+    threshold = len(features) / 2
+    return sum(1 << bit for bit in range(64) if counts[bit] > threshold)
+
+
+class SimHashIndex:
+    """
+    Index of SimHash fingerprints answering "is there a stored fingerprint within
+    max_distance bits of this one?".
+    Fingerprints are split into bands; by the pigeonhole principle two fingerprints within
+    max_distance < bands bits share at least one band, so only those candidates are compared.
+    Fingerprints can be stored with tags, e.g. the synonym ids of a post, and a lookup then only
+    matches fingerprints stored with at least the given tags.
+    The oldest fingerprints are evicted once max_size is reached.
+    """
+
+    def __init__(self, max_distance=3, bands=4, max_size=1000000):
+        if max_distance >= bands:
+            raise ValueError('max_distance must be smaller than the number of bands')
+
+        self.max_distance = max_distance
+        self.bands = bands
+        self.band_bits = 64 // bands
+        self.max_size = max_size
+
+        self.entries = OrderedDict()  # key --> fingerprint
+        self.tags = {}  # key --> frozenset of tags
+        self.buckets = [dict() for _ in range(bands)]  # band value --> set of keys
+
+    def _band_values(self, fingerprint):
+        mask = (1 << self.band_bits) - 1
+        return [(fingerprint >> (band * self.band_bits)) & mask for band in range(self.bands)]
+
+    def find(self, fingerprint, tags=()):
+        """ Returns the key of a stored fingerprint within max_distance bits that has all the tags, or None. """
+        tags = frozenset(tags)
+        for band, value in enumerate(self._band_values(fingerprint)):
+            for key in self.buckets[band].get(value, ()):
+                if bin(self.entries[key] ^ fingerprint).count('1') <= self.max_distance and tags <= self.tags[key]:
+                    return key
+
+        return None
+
+    def add(self, fingerprint, key, tags=()):
+        if key in self.entries:
+            return
+
+        self.entries[key] = fingerprint
+        self.tags[key] = frozenset(tags)
+        for band, value in enumerate(self._band_values(fingerprint)):
+            self.buckets[band].setdefault(value, set()).add(key)
+
+        if len(self.entries) > self.max_size:
+            self._remove(*self.entries.popitem(last=False))
+
+    def _remove(self, key, fingerprint):
+        del self.tags[key]
+        for band, value in enumerate(self._band_values(fingerprint)):
+            bucket = self.buckets[band][value]
+            bucket.discard(key)
+            if not bucket:
+                del self.buckets[band][value]
+
+    def __len__(self):
+        return len(self.entries)
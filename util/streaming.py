@@ -0,0 +1,39 @@
+import hashlib
+import heapq
+
+
+class HashSample:
+    """
+    Sample of at most size items from a stream of unknown length, made of the items whose keys
+    hash lowest. The sample only depends on the keys and the seed, not on the order of the stream,
+    so every run and replica sampling the same items picks the same ones.
+    count holds the total number of items added.
+    """
+
+    def __init__(self, size, seed=''):
+        self.size = size
+        self.count = 0
+        self._seeded = hashlib.blake2b(seed.encode('utf8'), digest_size=8)
+        # Max-heap of (-rank, key, item), the root is the sampled item hashing highest
+        self._heap = []
+
+    def _rank(self, key):
+        digest = self._seeded.copy()
+        digest.update(key.encode('utf8') if isinstance(key, str) else bytes(key))
+
+        return int.from_bytes(digest.digest(), 'big')
+
+    def add(self, key, item):
+        """ Adds an item identified by a unique str or bytes key. """
+        self.count += 1
+
+        entry = (-self._rank(key), key, item)
+        if len(self._heap) < self.size:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+
+    @property
+    def items(self):
+        """ The sampled items, in the order of their hashes. """
+        return [item for _, _, item in sorted(self._heap, reverse=True)]